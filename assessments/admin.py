@@ -1,10 +1,11 @@
 # assessments/admin.py
 from django.contrib import admin
-from .models import Assessment, Question, StudentAnswer, AssessmentSummary
+from django.db.models import Count, Sum
+from .models import Assessment, Question, StudentAnswer, AssessmentSummary, GradingCacheEntry, UserProgress
 
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
-    list_display = ('topic', 'question_text_preview', 'difficulty', 'is_active', 'created_at')
+    list_display = ('topic', 'question_text_preview', 'difficulty', 'is_active', 'grading_cache_hit_rate', 'created_at')
     list_filter = ('topic', 'difficulty', 'is_active')
     search_fields = ('question_text', 'model_answer', 'topic__name')
     ordering = ('topic', 'difficulty', '-created_at')
@@ -14,6 +15,19 @@ class QuestionAdmin(admin.ModelAdmin):
         return obj.question_text[:50] + '...' if len(obj.question_text) > 50 else obj.question_text
     question_text_preview.short_description = 'Question'
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            cache_entries=Count('grading_cache_entries'),
+            cache_hits=Sum('grading_cache_entries__hit_count')
+        )
+
+    def grading_cache_hit_rate(self, obj):
+        # Every cache entry was created by one graded (missed) answer
+        hits = obj.cache_hits or 0
+        lookups = hits + obj.cache_entries
+        return f"{hits / lookups:.0%} ({hits}/{lookups})" if lookups else '-'
+    grading_cache_hit_rate.short_description = 'Grading cache hits'
+
     fieldsets = (
         ('Question Details', {
             'fields': ('topic', 'question_text', 'model_answer', 'difficulty')
@@ -46,11 +60,11 @@ class AssessmentAdmin(admin.ModelAdmin):
 
 @admin.register(StudentAnswer)
 class StudentAnswerAdmin(admin.ModelAdmin):
-    list_display = ('assessment', 'question_preview', 'score', 'submitted_at')
-    list_filter = ('score', 'submitted_at')
+    list_display = ('assessment', 'question_preview', 'status', 'score', 'submitted_at')
+    list_filter = ('status', 'score', 'submitted_at')
     search_fields = ('assessment__user__email', 'question__question_text')
     ordering = ('-submitted_at',)
-    readonly_fields = ('submitted_at',)
+    readonly_fields = ('submitted_at', 'graded_at', 'grading_attempts', 'last_error')
 
     def question_preview(self, obj):
         return obj.question.question_text[:50] + '...' if len(obj.question.question_text) > 50 else obj.question.question_text
@@ -61,10 +75,10 @@ class StudentAnswerAdmin(admin.ModelAdmin):
             'fields': ('assessment', 'question', 'answer_text')
         }),
         ('Evaluation', {
-            'fields': ('score', 'feedback')
+            'fields': ('status', 'score', 'feedback', 'grading_attempts', 'last_error')
         }),
         ('Timestamp', {
-            'fields': ('submitted_at',),
+            'fields': ('submitted_at', 'graded_at'),
             'classes': ('collapse',)
         })
     )
@@ -86,4 +100,21 @@ class AssessmentSummaryAdmin(admin.ModelAdmin):
         ('Timestamps', {
             'fields': ('last_attempt_date',)
         })
-    )
\ No newline at end of file
+    )
+
+@admin.register(GradingCacheEntry)
+class GradingCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ('question', 'normalized_answer', 'score', 'hit_count', 'last_hit_at')
+    list_filter = ('question__topic',)
+    search_fields = ('question__question_text', 'normalized_answer')
+    ordering = ('-hit_count',)
+    readonly_fields = ('question', 'model_answer_hash', 'answer_hash', 'normalized_answer', 'hit_count',
+                       'created_at', 'last_hit_at')
+
+
+@admin.register(UserProgress)
+class UserProgressAdmin(admin.ModelAdmin):
+    list_display = ('user', 'topics_attempted', 'total_attempts', 'average_score', 'updated_at')
+    search_fields = ('user__email',)
+    exclude = ('attempted_topics',)
+    readonly_fields = ('user', 'topics_attempted', 'total_attempts', 'average_score', 'topic_stats', 'updated_at')
@@ -0,0 +1,189 @@
+# assessments/grading.py
+from openai import OpenAI
+import os
+import logging
+import re
+import json
+
+client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+
+logger = logging.getLogger(__name__)
+
+GRADING_MODEL = "gpt-4"
+
+
+GRADING_GUIDELINES = """
+    1. Evaluation Process:
+       - First, analyze the model answer to identify:
+          * Core concepts that must be understood
+          * Key supporting details that enhance understanding
+          * Alternative valid explanations or approaches
+       - Then, compare the student's answer to identify:
+          * Whether they've grasped the core concepts, even if expressed differently
+          * Which key points they've included, even if phrased simply
+          * Any valid alternatives they've provided that aren't in the model answer
+
+    2. Scoring Guidelines:
+       - 1.0 (100%): 
+          * Shows clear understanding of core concepts from the model answer
+          * May use different but valid examples or explanations
+          * Doesn't need to match the model answer word-for-word
+       - 0.75 (75%):
+          * Demonstrates understanding of main concepts
+          * Might miss some supporting details
+          * Uses correct but simplified explanations
+       - 0.5 (50%):
+          * Shows partial understanding
+          * Misses significant details but has some correct points
+       - 0.0 (0%):
+          * Completely incorrect or irrelevant
+
+        3. Consider that students may:
+           - Use simple language but still demonstrate understanding
+           - Give partial answers that are technically correct
+           - Miss some details while grasping the main concept
+"""
+
+FEEDBACK_GUIDELINES = """
+    1. A score that reflects understanding, not just completeness
+    2. Specific, encouraging feedback that:
+       - Acknowledges what they got right
+       - Suggests what could be added
+       - Provides an example or hint for improvement
+       - Uses grade-appropriate language
+"""
+
+
+def build_grading_prompt(question, answer_text):
+    """
+    Format the rubric prompt asking GPT-4 to grade a student's answer to a question.
+    """
+    return f"""
+    You are evaluating a Grade 6 student's answer to a science question.
+    Remember these key guidelines:
+    {GRADING_GUIDELINES}
+    Question: {question.question_text}
+    Model Answer: {question.model_answer}
+    Student's Answer: {answer_text}
+
+    Evaluate the answer considering the student's grade level and provide:
+    {FEEDBACK_GUIDELINES}
+    Return ONLY a JSON object in this exact format, with no other text:
+    {{
+        "score": (number between 0 and 1),
+        "feedback": "your feedback here"
+    }}
+    """
+
+
+def build_batch_grading_prompt(items):
+    """
+    Format one prompt grading several (question, answer_text) pairs, sending the rubric only once.
+    """
+    answers = "\n".join(f"""
+    Question ID: {question.id}
+    Question: {question.question_text}
+    Model Answer: {question.model_answer}
+    Student's Answer: {answer_text}
+    """ for question, answer_text in items)
+
+    return f"""
+    You are evaluating a Grade 6 student's answers to {len(items)} science questions.
+    Grade each answer on its own, remembering these key guidelines:
+    {GRADING_GUIDELINES}
+    The student's answers:
+    {answers}
+    Evaluate each answer considering the student's grade level and provide:
+    {FEEDBACK_GUIDELINES}
+    Return ONLY a JSON object in this exact format, with one result per question and no other text:
+    {{
+        "results": [
+            {{
+                "question_id": (the Question ID),
+                "score": (number between 0 and 1),
+                "feedback": "your feedback here"
+            }}
+        ]
+    }}
+    """
+
+
+def extract_json_from_response(content):
+    """
+    Extracts JSON from GPT response, handling various response formats.
+    """
+    # Try to find JSON content within markdown code blocks
+    json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', content, re.DOTALL)
+    if json_match:
+        content = json_match.group(1)
+
+    # Clean up the content and try to parse it
+    try:
+        # Remove any remaining markdown or unwanted characters
+        content = re.sub(r'```.*?```', '', content, flags=re.DOTALL)
+        content = content.strip()
+        return json.loads(content)
+    except json.JSONDecodeError as e:
+        logger.error(f"Failed to parse JSON from content: {content}")
+        raise ValueError(f"Invalid JSON response from GPT: {str(e)}")
+
+
+def parse_evaluation(content):
+    """
+    Parses and validates a GPT evaluation into a dict with a float score and feedback.
+    """
+    evaluation = extract_json_from_response(content)
+
+    if not isinstance(evaluation, dict) or 'score' not in evaluation or 'feedback' not in evaluation:
+        logger.error(f"Invalid evaluation structure: {evaluation}")
+        raise ValueError("Invalid evaluation format")
+
+    return {
+        'score': float(evaluation['score']),
+        'feedback': evaluation['feedback']
+    }
+
+
+def grade_answer(question, answer_text):
+    """
+    Grades a student's answer with GPT-4 and returns the parsed evaluation.
+    """
+    response = client.chat.completions.create(
+        model=GRADING_MODEL,
+        messages=[{"role": "user", "content": build_grading_prompt(question, answer_text)}],
+        temperature=0.3,
+    )
+
+    gpt_response = response.choices[0].message.content
+    logger.debug(f"GPT Response: {gpt_response}")
+    return parse_evaluation(gpt_response)
+
+
+def grade_answers_batch(items):
+    """
+    Grades several (question, answer_text) pairs in a single GPT-4 request.
+    Returns evaluations keyed by question id; answers missing or malformed in the response are left out.
+    """
+    response = client.chat.completions.create(
+        model=GRADING_MODEL,
+        messages=[{"role": "user", "content": build_batch_grading_prompt(items)}],
+        temperature=0.3,
+    )
+
+    gpt_response = response.choices[0].message.content
+    logger.debug(f"GPT Response: {gpt_response}")
+    parsed = extract_json_from_response(gpt_response)
+
+    question_ids = {question.id for question, _ in items}
+    evaluations = {}
+    for result in parsed.get('results', []) if isinstance(parsed, dict) else []:
+        try:
+            question_id = int(result['question_id'])
+            evaluation = {'score': float(result['score']), 'feedback': result['feedback']}
+        except (KeyError, TypeError, ValueError):
+            logger.warning(f"Skipping malformed batch evaluation: {result}")
+            continue
+        if question_id in question_ids:
+            evaluations[question_id] = evaluation
+
+    return evaluations
@@ -0,0 +1,79 @@
+# assessments/grading_cache.py
+import hashlib
+import logging
+import re
+import unicodedata
+
+from django.db import IntegrityError
+from django.db.models import F
+from django.utils import timezone
+
+from .grading import grade_answer
+from .models import GradingCacheEntry
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_answer(answer_text):
+    """
+    Folds case, punctuation and whitespace so trivially different answers share a cache entry.
+    """
+    text = unicodedata.normalize('NFKC', answer_text).casefold()
+    text = ''.join(' ' if unicodedata.category(char).startswith('P') else char for char in text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def hash_text(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def lookup_grade(question, answer_text):
+    """
+    Returns the cached evaluation for this answer to the question, or None on a miss.
+    """
+    entry = GradingCacheEntry.objects.filter(
+        question=question,
+        model_answer_hash=hash_text(question.model_answer),
+        answer_hash=hash_text(normalize_answer(answer_text))
+    ).first()
+    if entry is None:
+        return None
+
+    GradingCacheEntry.objects.filter(id=entry.id).update(
+        hit_count=F('hit_count') + 1,
+        last_hit_at=timezone.now()
+    )
+    logger.info(f"Grading cache hit for question {question.id}")
+    return {'score': float(entry.score), 'feedback': entry.feedback}
+
+
+def store_grade(question, answer_text, evaluation):
+    """
+    Caches an evaluation; when two workers grade the same answer at once the first one wins.
+    """
+    normalized = normalize_answer(answer_text)
+    try:
+        GradingCacheEntry.objects.get_or_create(
+            question=question,
+            model_answer_hash=hash_text(question.model_answer),
+            answer_hash=hash_text(normalized),
+            defaults={
+                'normalized_answer': normalized,
+                'score': evaluation['score'],
+                'feedback': evaluation['feedback']
+            }
+        )
+    except IntegrityError:
+        # The question was deleted while its answer was being graded
+        logger.warning(f"Could not cache grade for question {question.id}")
+
+
+def grade_answer_cached(question, answer_text):
+    """
+    Grades an answer, serving identical earlier answers to the same question from the cache.
+    """
+    evaluation = lookup_grade(question, answer_text)
+    if evaluation is None:
+        evaluation = grade_answer(question, answer_text)
+        store_grade(question, answer_text, evaluation)
+    return evaluation
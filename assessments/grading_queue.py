@@ -0,0 +1,230 @@
+# assessments/grading_queue.py
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .grading import grade_answer, grade_answers_batch
+from .grading_cache import grade_answer_cached, lookup_grade, store_grade
+from .models import StudentAnswer
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Returns the process-wide worker pool that grades submitted answers.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.GRADING_WORKERS,
+                    thread_name_prefix='grading'
+                )
+    return _executor
+
+
+def claimable_answers():
+    """
+    Answers a worker may claim for grading: pending and failed ones, and ones whose claim went stale because
+    the worker holding it died. A pending answer whose queued job was lost in a restart is simply claimed again.
+    """
+    stale = timezone.now() - settings.GRADING_CLAIM_TIMEOUT
+    return (
+        Q(status__in=[StudentAnswer.STATUS_PENDING, StudentAnswer.STATUS_FAILED])
+        | Q(status=StudentAnswer.STATUS_GRADING, claimed_at__lt=stale)
+        # Claims made before claimed_at was recorded
+        | Q(status=StudentAnswer.STATUS_GRADING, claimed_at__isnull=True)
+    )
+
+
+def enqueue_grading(answer_id):
+    """
+    Queues an answer for background grading once the current transaction commits.
+    """
+    transaction.on_commit(lambda: get_executor().submit(run_grading_job, answer_id))
+
+
+def submit_answer(assessment, question, answer_text):
+    """
+    Persists a submission as pending and queues it for grading, unless grading happens at completion.
+    Submissions are idempotent per (assessment, question): resubmitting the same answer returns
+    the existing record, while a changed answer (or one that failed grading) is graded again.
+    """
+    with transaction.atomic():
+        answer, created = StudentAnswer.objects.select_for_update().get_or_create(
+            assessment=assessment,
+            question=question,
+            defaults={'answer_text': answer_text, 'status': StudentAnswer.STATUS_PENDING}
+        )
+
+        if not created:
+            if answer.answer_text == answer_text and answer.status != StudentAnswer.STATUS_FAILED:
+                return answer
+
+            answer.answer_text = answer_text
+            answer.status = StudentAnswer.STATUS_PENDING
+            answer.score = None
+            answer.feedback = ''
+            answer.grading_attempts = 0
+            answer.last_error = ''
+            answer.graded_at = None
+            answer.claimed_at = None
+            answer.save()
+
+        # In grade-at-completion mode the answer waits for CompleteAssessmentView to grade it
+        if not settings.ASSESSMENT_GRADE_AT_COMPLETION:
+            enqueue_grading(answer.id)
+    return answer
+
+
+def save_evaluation(answer, evaluation):
+    """
+    Stores a grade for a claimed answer unless the answer text changed while it was being graded,
+    or the claim went stale and another worker took the answer over.
+    """
+    StudentAnswer.objects.filter(
+        id=answer.id,
+        answer_text=answer.answer_text,
+        status=StudentAnswer.STATUS_GRADING,
+        claimed_at=answer.claimed_at
+    ).update(
+        score=evaluation['score'],
+        feedback=evaluation['feedback'],
+        status=StudentAnswer.STATUS_GRADED,
+        grading_attempts=F('grading_attempts') + 1,
+        last_error='',
+        graded_at=timezone.now()
+    )
+
+
+def grade_student_answer(answer_id):
+    """
+    Grades a pending answer, retrying LLM failures with exponential backoff.
+    The answer is claimed with a conditional update so it is only ever graded by one live worker (a claim
+    older than GRADING_CLAIM_TIMEOUT is taken over), and the result is discarded if the student changed
+    the answer in the meantime.
+    """
+    claimed = StudentAnswer.objects.filter(claimable_answers(), id=answer_id).update(
+        status=StudentAnswer.STATUS_GRADING,
+        claimed_at=timezone.now()
+    )
+    if not claimed:
+        return
+
+    answer = StudentAnswer.objects.select_related('question').get(id=answer_id)
+
+    for attempt in range(1, settings.GRADING_MAX_ATTEMPTS + 1):
+        try:
+            evaluation = grade_answer_cached(answer.question, answer.answer_text)
+        except Exception as e:
+            logger.warning(f"Grading attempt {attempt} failed for answer {answer_id}: {str(e)}")
+            StudentAnswer.objects.filter(id=answer_id).update(
+                grading_attempts=F('grading_attempts') + 1,
+                last_error=str(e)
+            )
+            if attempt < settings.GRADING_MAX_ATTEMPTS:
+                time.sleep(settings.GRADING_RETRY_BACKOFF * 2 ** (attempt - 1))
+            continue
+
+        save_evaluation(answer, evaluation)
+        return
+
+    logger.error(f"Giving up on grading answer {answer_id} after {settings.GRADING_MAX_ATTEMPTS} attempts")
+    StudentAnswer.objects.filter(
+        id=answer_id,
+        answer_text=answer.answer_text,
+        status=StudentAnswer.STATUS_GRADING,
+        claimed_at=answer.claimed_at
+    ).update(status=StudentAnswer.STATUS_FAILED)
+
+
+def grade_assessment_answers(assessment):
+    """
+    Grades every pending or failed answer of an assessment, and any whose grading claim went stale, together.
+    Answers found in the grading cache are reused; the rest go to GPT-4 in one structured request
+    that carries the rubric once, and answers the batch response leaves out are graded
+    individually by a bounded parallel fan-out.
+    """
+    with transaction.atomic():
+        answers = list(StudentAnswer.objects.select_for_update(skip_locked=True).select_related('question').filter(
+            claimable_answers(),
+            assessment=assessment
+        ))
+        claimed_at = timezone.now()
+        StudentAnswer.objects.filter(id__in=[answer.id for answer in answers]).update(
+            status=StudentAnswer.STATUS_GRADING,
+            claimed_at=claimed_at
+        )
+        for answer in answers:
+            answer.claimed_at = claimed_at
+
+    if not answers:
+        return
+
+    evaluations = {}
+    for answer in answers:
+        cached = lookup_grade(answer.question, answer.answer_text)
+        if cached is not None:
+            evaluations[answer.question_id] = cached
+
+    ungraded = [answer for answer in answers if answer.question_id not in evaluations]
+    if ungraded:
+        try:
+            batch_evaluations = grade_answers_batch([(answer.question, answer.answer_text) for answer in ungraded])
+        except Exception as e:
+            logger.warning(f"Batch grading failed for assessment {assessment.id}: {str(e)}")
+            batch_evaluations = {}
+        for answer in ungraded:
+            if answer.question_id in batch_evaluations:
+                evaluations[answer.question_id] = batch_evaluations[answer.question_id]
+                store_grade(answer.question, answer.answer_text, batch_evaluations[answer.question_id])
+
+    remaining = [answer for answer in answers if answer.question_id not in evaluations]
+    if remaining:
+        logger.info(f"Grading {len(remaining)} answer(s) of assessment {assessment.id} individually")
+        with ThreadPoolExecutor(max_workers=settings.GRADING_FANOUT_WORKERS) as executor:
+            futures = {
+                answer.question_id: executor.submit(grade_answer, answer.question, answer.answer_text)
+                for answer in remaining
+            }
+        for answer in remaining:
+            try:
+                evaluations[answer.question_id] = futures[answer.question_id].result()
+                store_grade(answer.question, answer.answer_text, evaluations[answer.question_id])
+            except Exception as e:
+                logger.error(f"Failed to grade answer {answer.id}: {str(e)}")
+                StudentAnswer.objects.filter(
+                    id=answer.id, status=StudentAnswer.STATUS_GRADING, claimed_at=answer.claimed_at
+                ).update(
+                    status=StudentAnswer.STATUS_FAILED,
+                    grading_attempts=F('grading_attempts') + 1,
+                    last_error=str(e)
+                )
+
+    for answer in answers:
+        if answer.question_id in evaluations:
+            save_evaluation(answer, evaluations[answer.question_id])
+
+
+def run_grading_job(answer_id):
+    """
+    Entry point for worker threads, which manage their own database connections.
+    """
+    close_old_connections()
+    try:
+        grade_student_answer(answer_id)
+    except Exception as e:
+        logger.error(f"Error grading answer {answer_id}: {str(e)}")
+    finally:
+        close_old_connections()
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from assessments.grading_queue import claimable_answers, grade_student_answer
+from assessments.models import StudentAnswer
+
+
+class Command(BaseCommand):
+    help = 'Grade answers left pending, failed or with a stale claim, e.g. after a worker restart dropped its queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset-stuck',
+            action='store_true',
+            help="Also regrade answers in 'grading' whose claim has not gone stale yet; only safe with no workers running",
+        )
+
+    def handle(self, *args, **options):
+        if options['reset_stuck']:
+            reset = StudentAnswer.objects.filter(status=StudentAnswer.STATUS_GRADING).update(
+                status=StudentAnswer.STATUS_PENDING
+            )
+            self.stdout.write(f'Reset {reset} stuck answer(s) to pending')
+
+        # Answers whose grading claim went stale are included without --reset-stuck
+        answer_ids = list(StudentAnswer.objects.filter(claimable_answers()).values_list('id', flat=True))
+
+        for answer_id in answer_ids:
+            grade_student_answer(answer_id)
+
+        graded = StudentAnswer.objects.filter(id__in=answer_ids, status=StudentAnswer.STATUS_GRADED).count()
+        self.stdout.write(self.style.SUCCESS(f'Graded {graded} of {len(answer_ids)} answer(s)'))
@@ -0,0 +1,27 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from assessments.progress import rebuild_user_progress
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized dashboard progress rows from assessment summaries, e.g. after a backfill'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'emails',
+            nargs='*',
+            help='Only rebuild progress for these users (default: all users)',
+        )
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.all()
+        if options['emails']:
+            users = users.filter(email__in=options['emails'])
+
+        rebuilt = 0
+        for user in users.iterator():
+            rebuild_user_progress(user)
+            rebuilt += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt progress for {rebuilt} user(s)'))
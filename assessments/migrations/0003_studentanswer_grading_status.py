@@ -0,0 +1,69 @@
+# Generated by Django 5.1.3 on 2026-10-18 02:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0002_assessment_questions"),
+    ]
+
+    operations = [
+        # Answers saved before background grading were graded in the request
+        migrations.AddField(
+            model_name="studentanswer",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("grading", "Grading"),
+                    ("graded", "Graded"),
+                    ("failed", "Failed"),
+                ],
+                default="graded",
+                max_length=10,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="studentanswer",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("grading", "Grading"),
+                    ("graded", "Graded"),
+                    ("failed", "Failed"),
+                ],
+                default="pending",
+                max_length=10,
+            ),
+        ),
+        migrations.AddField(
+            model_name="studentanswer",
+            name="grading_attempts",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="studentanswer",
+            name="last_error",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AddField(
+            model_name="studentanswer",
+            name="graded_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="studentanswer",
+            name="score",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=3, null=True
+            ),
+        ),
+        migrations.AlterField(
+            model_name="studentanswer",
+            name="feedback",
+            field=models.TextField(blank=True, default=""),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.3 on 2026-10-18 02:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0003_studentanswer_grading_status"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GradingCacheEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("model_answer_hash", models.CharField(max_length=64)),
+                ("answer_hash", models.CharField(max_length=64)),
+                ("normalized_answer", models.TextField()),
+                ("score", models.DecimalField(decimal_places=2, max_digits=3)),
+                ("feedback", models.TextField()),
+                ("hit_count", models.IntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("last_hit_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "question",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="grading_cache_entries",
+                        to="assessments.question",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "grading cache entries",
+                "ordering": ["question", "-hit_count"],
+                "unique_together": {("question", "model_answer_hash", "answer_hash")},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 03:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0005_userprogress"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="studentanswer",
+            name="claimed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,6 +1,7 @@
 # assessments/models.py
 from django.db import models
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from edugen_tutor_model.models import Topic
 
 
@@ -50,12 +51,29 @@ class Assessment(models.Model):
 
 
 class StudentAnswer(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_GRADING = 'grading'
+    STATUS_GRADED = 'graded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_GRADING, 'Grading'),
+        (STATUS_GRADED, 'Graded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
     assessment = models.ForeignKey(Assessment, on_delete=models.CASCADE, related_name='answers')
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     answer_text = models.TextField()
-    score = models.DecimalField(max_digits=3, decimal_places=2)  # 0.0 to 1.0
-    feedback = models.TextField()
+    score = models.DecimalField(max_digits=3, decimal_places=2, null=True, blank=True)  # 0.0 to 1.0, set once graded
+    feedback = models.TextField(blank=True, default='')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    grading_attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    # When a worker claimed the answer for grading; a claim older than GRADING_CLAIM_TIMEOUT is taken over
+    claimed_at = models.DateTimeField(null=True, blank=True)
     submitted_at = models.DateTimeField(auto_now_add=True)
+    graded_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ['assessment', 'submitted_at']
@@ -79,4 +97,60 @@ class AssessmentSummary(models.Model):
         unique_together = ['user', 'topic']
 
     def __str__(self):
-        return f"{self.user.email} - {self.topic.name} Summary"
\ No newline at end of file
+        return f"{self.user.email} - {self.topic.name} Summary"
+
+class GradingCacheEntry(models.Model):
+    """
+    Grade given to a normalized answer, reused for identical answers to the same question
+    """
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='grading_cache_entries')
+    model_answer_hash = models.CharField(max_length=64)
+    answer_hash = models.CharField(max_length=64)
+    normalized_answer = models.TextField()
+    score = models.DecimalField(max_digits=3, decimal_places=2)
+    feedback = models.TextField()
+    hit_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_hit_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['question', '-hit_count']
+        unique_together = ['question', 'model_answer_hash', 'answer_hash']
+        verbose_name_plural = 'grading cache entries'
+
+    def __str__(self):
+        return f"{self.question.question_text[:30]}... - {self.normalized_answer[:30]}"
+
+
+class UserProgress(models.Model):
+    """
+    Denormalized dashboard figures for one user, updated whenever they complete an assessment
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='progress')
+    topics_attempted = models.IntegerField(default=0)
+    total_attempts = models.IntegerField(default=0)
+    average_score = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    # Per-topic summary figures and recent scores, keyed by topic id
+    topic_stats = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    # Bit n is set once the user has attempted topic n
+    attempted_topics = models.BinaryField(default=bytes)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'user progress'
+
+    def __str__(self):
+        return f"{self.user.email} Progress"
+
+    def has_attempted(self, topic_id):
+        bitmap = bytes(self.attempted_topics)
+        byte = topic_id // 8
+        return byte < len(bitmap) and bool(bitmap[byte] & (1 << topic_id % 8))
+
+    def mark_attempted(self, topic_id):
+        bitmap = bytearray(self.attempted_topics)
+        byte = topic_id // 8
+        if byte >= len(bitmap):
+            bitmap.extend(bytes(byte + 1 - len(bitmap)))
+        bitmap[byte] |= 1 << topic_id % 8
+        self.attempted_topics = bytes(bitmap)
@@ -0,0 +1,159 @@
+# assessments/progress.py
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import ExpressionWrapper, F, Value, Window
+from django.db.models.functions import Greatest, RowNumber
+
+from .models import Assessment, AssessmentSummary, UserProgress
+
+RECENT_ASSESSMENTS_PER_TOPIC = 5
+
+
+def record_summary_attempt(user_id, topic_id, score, attempted_at):
+    """
+    Adds an attempt to the user's summary for the topic with a single conditional UPDATE built from
+    F() expressions, so concurrent completions are applied by the database instead of read-modify-write
+    in Python. The first attempt creates the summary; if a concurrent completion created it first,
+    the attempt is applied to theirs. Returns the updated summary.
+    """
+    score = Decimal(score)
+    summaries = AssessmentSummary.objects.filter(user_id=user_id, topic_id=topic_id)
+    decimal_field = AssessmentSummary._meta.get_field('average_score')
+    update = {
+        'total_attempts': F('total_attempts') + 1,
+        'best_score': Greatest(F('best_score'), Value(score, output_field=decimal_field)),
+        'last_score': score,
+        'last_attempt_date': attempted_at,
+        'average_score': ExpressionWrapper(
+            (F('average_score') * F('total_attempts') + Value(score, output_field=decimal_field))
+            / (F('total_attempts') + 1),
+            output_field=decimal_field
+        ),
+    }
+
+    if not summaries.update(**update):
+        try:
+            # Savepoint, so a losing insert does not break the caller's transaction
+            with transaction.atomic():
+                AssessmentSummary.objects.create(
+                    user_id=user_id,
+                    topic_id=topic_id,
+                    total_attempts=1,
+                    best_score=score,
+                    last_score=score,
+                    last_attempt_date=attempted_at,
+                    average_score=score
+                )
+        except IntegrityError:
+            summaries.update(**update)
+    # Read back the row so the scores are rounded as stored
+    return summaries.get()
+
+
+def summary_stats(summary):
+    return {
+        'total_attempts': summary.total_attempts,
+        'best_score': float(summary.best_score),
+        'average_score': float(summary.average_score),
+        'last_attempt_date': summary.last_attempt_date,
+    }
+
+
+def assessment_stats(assessment):
+    return {
+        'id': assessment.id,
+        'score': float(assessment.total_score),
+        'date': assessment.end_time,
+    }
+
+
+def recent_completed_assessments(user, topic_ids, limit=RECENT_ASSESSMENTS_PER_TOPIC):
+    """
+    Returns {topic_id: [assessment, ...]} with the user's latest completed assessments per topic,
+    fetched with a single windowed query.
+    """
+    recent_by_topic = defaultdict(list)
+    assessments = Assessment.objects.filter(
+        user=user,
+        topic_id__in=topic_ids,
+        status='completed'
+    ).annotate(
+        recent_rank=Window(
+            expression=RowNumber(),
+            partition_by=[F('topic_id')],
+            order_by=F('end_time').desc()
+        )
+    ).filter(recent_rank__lte=limit).order_by('topic_id', 'recent_rank').only(
+        'id', 'topic_id', 'total_score', 'end_time'
+    )
+    for assessment in assessments:
+        recent_by_topic[assessment.topic_id].append(assessment)
+    return recent_by_topic
+
+
+def refresh_totals(progress):
+    """
+    Recomputes the user-wide figures from the per-topic stats.
+    """
+    topic_stats = progress.topic_stats.values()
+    progress.topics_attempted = len(topic_stats)
+    progress.total_attempts = sum(stats['total_attempts'] for stats in topic_stats)
+    if topic_stats:
+        average = sum(Decimal(str(stats['average_score'])) for stats in topic_stats) / len(topic_stats)
+        progress.average_score = average.quantize(Decimal('0.01'))
+    else:
+        progress.average_score = Decimal(0)
+
+
+def record_completed_assessment(assessment, summary):
+    """
+    Folds a just-completed assessment and its updated topic summary into the user's progress row.
+    Must run inside the transaction that completes the assessment; the row lock serializes
+    concurrent completions by the same user.
+    """
+    progress, _ = UserProgress.objects.select_for_update().get_or_create(user_id=assessment.user_id)
+
+    key = str(assessment.topic_id)
+    stats = progress.topic_stats.get(key, {'recent_assessments': []})
+    stats.update(summary_stats(summary))
+    stats['recent_assessments'] = (
+        [assessment_stats(assessment)] + stats['recent_assessments']
+    )[:RECENT_ASSESSMENTS_PER_TOPIC]
+
+    progress.topic_stats[key] = stats
+    progress.mark_attempted(assessment.topic_id)
+    refresh_totals(progress)
+    progress.save()
+    return progress
+
+
+def rebuild_user_progress(user):
+    """
+    Recomputes a user's progress row from their assessment summaries and completed assessments.
+    """
+    summaries = list(AssessmentSummary.objects.filter(user=user))
+    recent_by_topic = recent_completed_assessments(user, [summary.topic_id for summary in summaries])
+
+    progress = UserProgress(user=user)
+    for summary in summaries:
+        stats = summary_stats(summary)
+        stats['recent_assessments'] = [
+            assessment_stats(assessment) for assessment in recent_by_topic[summary.topic_id]
+        ]
+        progress.topic_stats[str(summary.topic_id)] = stats
+        progress.mark_attempted(summary.topic_id)
+    refresh_totals(progress)
+
+    UserProgress.objects.update_or_create(
+        user=user,
+        defaults={
+            'topics_attempted': progress.topics_attempted,
+            'total_attempts': progress.total_attempts,
+            'average_score': progress.average_score,
+            'topic_stats': progress.topic_stats,
+            'attempted_topics': progress.attempted_topics,
+        }
+    )
+    return UserProgress.objects.get(user=user)
@@ -0,0 +1,70 @@
+# assessments/sampling.py
+import random
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Question
+
+
+def pool_cache_key(topic_id):
+    return f'assessments:question_pool:{topic_id}'
+
+
+def get_question_pool(topic_id):
+    """
+    Returns the ids of a topic's active questions grouped by difficulty, cached between assessments.
+    """
+    key = pool_cache_key(topic_id)
+    pool = cache.get(key)
+    if pool is None:
+        pool = defaultdict(list)
+        for question_id, difficulty in Question.objects.filter(
+            topic_id=topic_id,
+            is_active=True
+        ).order_by().values_list('id', 'difficulty'):
+            pool[difficulty].append(question_id)
+        pool = dict(pool)
+        cache.set(key, pool, settings.QUESTION_POOL_CACHE_TIMEOUT)
+    return pool
+
+
+def invalidate_question_pool(topic_id):
+    cache.delete(pool_cache_key(topic_id))
+
+
+def allocate_by_difficulty(pool, count):
+    """
+    Splits count across difficulties in proportion to how many questions each has (largest remainder).
+    """
+    total = sum(len(ids) for ids in pool.values())
+    shares = {difficulty: count * len(ids) / total for difficulty, ids in pool.items()}
+    allocation = {difficulty: int(share) for difficulty, share in shares.items()}
+
+    by_remainder = sorted(pool, key=lambda difficulty: shares[difficulty] - allocation[difficulty], reverse=True)
+    for difficulty in by_remainder[:count - sum(allocation.values())]:
+        allocation[difficulty] += 1
+    return allocation
+
+
+def sample_question_ids(topic_id, count, stratify=True):
+    """
+    Picks up to count random question ids for a topic from the cached pool, without sorting the table.
+    With stratify, the sample mirrors the topic's mix of difficulties.
+    """
+    pool = get_question_pool(topic_id)
+    total = sum(len(ids) for ids in pool.values())
+    if total == 0:
+        return []
+    if total <= count:
+        return [question_id for ids in pool.values() for question_id in ids]
+
+    if not stratify:
+        return random.sample([question_id for ids in pool.values() for question_id in ids], count)
+
+    selected = []
+    for difficulty, size in allocate_by_difficulty(pool, count).items():
+        selected.extend(random.sample(pool[difficulty], size))
+    random.shuffle(selected)
+    return selected
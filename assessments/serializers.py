@@ -14,7 +14,7 @@ class QuestionSerializer(serializers.ModelSerializer):
 
 
 class AssessmentSerializer(serializers.ModelSerializer):
-    questions = QuestionSerializer(many=True, read_only=True)
+    questions = serializers.SerializerMethodField()
     topic_name = serializers.CharField(source='topic.name', read_only=True)
     topic_id = serializers.PrimaryKeyRelatedField(source='topic', read_only=True)
 
@@ -30,6 +30,13 @@ class AssessmentSerializer(serializers.ModelSerializer):
             'total_score'
         ]
 
+    def get_questions(self, instance):
+        # A view that already holds the assessment's questions passes them in context instead of a re-query
+        questions = self.context.get('questions')
+        if questions is None:
+            questions = instance.questions.all()
+        return QuestionSerializer(questions, many=True).data
+
     def to_representation(self, instance):
         # Add explicit validation of questions
         representation = super().to_representation(instance)
@@ -47,7 +54,8 @@ class StudentAnswerSerializer(serializers.ModelSerializer):
             'question',
             'answer_text',
             'score',
-            'feedback'
+            'feedback',
+            'status'
         ]
 
 
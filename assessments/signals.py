@@ -0,0 +1,24 @@
+# assessments/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import GradingCacheEntry, Question
+from .sampling import invalidate_question_pool
+
+
+@receiver(post_save, sender=Question)
+def invalidate_grading_cache(sender, instance, created, **kwargs):
+    """
+    Cached grades are only valid for the question text and model answer they were graded against.
+    """
+    if not created:
+        GradingCacheEntry.objects.filter(question=instance).delete()
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def refresh_question_pool(sender, instance, **kwargs):
+    """
+    Rebuild the topic's cached question pool on the next assessment start.
+    """
+    invalidate_question_pool(instance.topic_id)
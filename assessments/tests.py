@@ -1,3 +1,610 @@
-from django.test import TestCase
+import json
+import re
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from edugen_tutor_model.models import Subject, Topic
+from .grading import grade_answers_batch
+from .grading_cache import grade_answer_cached, normalize_answer
+from .grading_queue import grade_assessment_answers, run_grading_job, save_evaluation, submit_answer
+from .models import Assessment, AssessmentSummary, GradingCacheEntry, Question, StudentAnswer, UserProgress
+from .progress import rebuild_user_progress, record_summary_attempt
+from .sampling import allocate_by_difficulty, get_question_pool, sample_question_ids
+
+
+class CompleteAssessmentProgressTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='student@example.com',
+            password='password',
+            is_active=True
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.topic = Topic.objects.create(subject=Subject.objects.create(name='Science'), name='Plants')
+        self.question = Question.objects.create(topic=self.topic, question_text='What do plants need?', model_answer='Light')
+
+    def complete_assessment(self, score):
+        assessment = Assessment.objects.create(topic=self.topic, user=self.user)
+        assessment.questions.add(self.question)
+        StudentAnswer.objects.create(
+            assessment=assessment,
+            question=self.question,
+            answer_text='Light',
+            score=Decimal(score),
+            status=StudentAnswer.STATUS_GRADED
+        )
+        response = self.client.post(reverse('complete-assessment', args=[assessment.id]))
+        self.assertEqual(response.status_code, 200)
+        return assessment
+
+    def test_completion_updates_progress_incrementally(self):
+        first = self.complete_assessment('1.00')
+        second = self.complete_assessment('0.50')
+
+        progress = UserProgress.objects.get(user=self.user)
+        self.assertTrue(progress.has_attempted(self.topic.id))
+        self.assertEqual(progress.total_attempts, 2)
+        self.assertEqual(progress.average_score, Decimal('75.00'))
+        stats = progress.topic_stats[str(self.topic.id)]
+        self.assertEqual([assessment['id'] for assessment in stats['recent_assessments']], [second.id, first.id])
+
+        rebuilt = rebuild_user_progress(self.user)
+        self.assertEqual(rebuilt.total_attempts, progress.total_attempts)
+        self.assertEqual(rebuilt.average_score, progress.average_score)
+        self.assertEqual(rebuilt.topic_stats, progress.topic_stats)
+
+    def test_summary_attempts_are_accumulated(self):
+        first_date = timezone.now()
+        first = record_summary_attempt(self.user.id, self.topic.id, Decimal('80'), first_date)
+        self.assertEqual(
+            (first.total_attempts, first.best_score, first.last_score, first.average_score),
+            (1, Decimal('80.00'), Decimal('80.00'), Decimal('80.00'))
+        )
+
+        second_date = first_date + timedelta(minutes=1)
+        second = record_summary_attempt(self.user.id, self.topic.id, Decimal('50'), second_date)
+        self.assertEqual(second.id, first.id)
+        self.assertEqual(
+            (second.total_attempts, second.best_score, second.last_score, second.average_score),
+            (2, Decimal('80.00'), Decimal('50.00'), Decimal('65.00'))
+        )
+        self.assertEqual(second.last_attempt_date, second_date)
+        self.assertEqual(AssessmentSummary.objects.filter(user=self.user, topic=self.topic).count(), 1)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'needs row locking across concurrent connections')
+class ConcurrentCompletionTests(TransactionTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='student@example.com',
+            password='password',
+            is_active=True
+        )
+        self.topic = Topic.objects.create(subject=Subject.objects.create(name='Science'), name='Plants')
+        self.question = Question.objects.create(topic=self.topic, question_text='What do plants need?', model_answer='Light')
+
+    def create_graded_assessment(self, score):
+        assessment = Assessment.objects.create(topic=self.topic, user=self.user)
+        assessment.questions.add(self.question)
+        StudentAnswer.objects.create(
+            assessment=assessment,
+            question=self.question,
+            answer_text='Light',
+            score=score,
+            status=StudentAnswer.STATUS_GRADED
+        )
+        return assessment
+
+    def test_parallel_completions_keep_summary_totals(self):
+        scores = [Decimal(score) / 10 for score in range(1, 11)]
+        assessments = [self.create_graded_assessment(score) for score in scores]
+        barrier = threading.Barrier(len(assessments))
+        status_codes = []
+
+        def complete(assessment):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            try:
+                barrier.wait()
+                response = client.post(reverse('complete-assessment', args=[assessment.id]))
+                status_codes.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=complete, args=(assessment,)) for assessment in assessments]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(status_codes, [200] * len(assessments))
+        summary = AssessmentSummary.objects.get(user=self.user, topic=self.topic)
+        self.assertEqual(summary.total_attempts, len(scores))
+        self.assertEqual(summary.best_score, Decimal('100.00'))
+        # The running average is rounded to 2 decimal places after every attempt
+        self.assertAlmostEqual(float(summary.average_score), 55.0, delta=0.1)
+
+        progress = UserProgress.objects.get(user=self.user)
+        self.assertEqual(progress.total_attempts, len(scores))
+        self.assertEqual(len(progress.topic_stats[str(self.topic.id)]['recent_assessments']), 5)
+
+    def test_assessment_is_only_counted_once(self):
+        assessment = self.create_graded_assessment(Decimal('1.00'))
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        first = client.post(reverse('complete-assessment', args=[assessment.id]))
+        second = client.post(reverse('complete-assessment', args=[assessment.id]))
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 404)
+        self.assertEqual(AssessmentSummary.objects.get(user=self.user, topic=self.topic).total_attempts, 1)
+
+
+@override_settings(ASSESSMENT_GRADE_AT_COMPLETION=False, GRADING_MAX_ATTEMPTS=3, GRADING_RETRY_BACKOFF=2)
+class BackgroundGradingTests(TransactionTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='student@example.com',
+            password='password',
+            is_active=True
+        )
+        self.topic = Topic.objects.create(subject=Subject.objects.create(name='Science'), name='Plants')
+        self.question = Question.objects.create(topic=self.topic, question_text='What do plants need?', model_answer='Light')
+        self.assessment = Assessment.objects.create(topic=self.topic, user=self.user)
+        self.assessment.questions.add(self.question)
+
+    def submit(self, answer_text):
+        """
+        Submit an answer, returning it and the ids queued for grading instead of running them
+        """
+        queued = []
+        executor = mock.Mock()
+        executor.submit.side_effect = lambda job, answer_id: queued.append(answer_id)
+        with mock.patch('assessments.grading_queue.get_executor', return_value=executor):
+            answer = submit_answer(self.assessment, self.question, answer_text)
+        return answer, queued
+
+    @skipUnless(connection.vendor == 'postgresql', 'needs row locking across concurrent connections')
+    def test_double_submitted_answer_is_graded_once(self):
+        first, queued = self.submit('Light and water')
+        second, queued_again = self.submit('Light and water')
+        self.assertEqual(first.id, second.id)
+        self.assertEqual((queued, queued_again), ([first.id], []))
+
+        def slow_grade(question, answer_text):
+            time.sleep(0.1)
+            return {'score': 1.0, 'feedback': 'Well done'}
+
+        # Two workers picking up the same answer at once, as when a job is queued twice
+        barrier = threading.Barrier(2)
+
+        def work():
+            try:
+                barrier.wait()
+                run_grading_job(first.id)
+            finally:
+                connection.close()
+
+        with mock.patch('assessments.grading_cache.grade_answer', side_effect=slow_grade) as grade_answer:
+            threads = [threading.Thread(target=work) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(grade_answer.call_count, 1)
+        answer = StudentAnswer.objects.get(id=first.id)
+        self.assertEqual(answer.status, StudentAnswer.STATUS_GRADED)
+        self.assertEqual(answer.score, Decimal('1.00'))
+        self.assertEqual(answer.grading_attempts, 1)
+
+    def test_failed_grading_is_retried_with_backoff(self):
+        answer, _ = self.submit('Light')
+        evaluations = [RuntimeError('rate limited'), {'score': 0.5, 'feedback': 'Almost'}]
+
+        with mock.patch('assessments.grading_cache.grade_answer', side_effect=evaluations), \
+                mock.patch('assessments.grading_queue.time.sleep') as sleep:
+            run_grading_job(answer.id)
+
+        sleep.assert_called_once_with(2)
+        answer.refresh_from_db()
+        self.assertEqual(answer.status, StudentAnswer.STATUS_GRADED)
+        self.assertEqual(answer.score, Decimal('0.50'))
+        self.assertEqual(answer.grading_attempts, 2)
+        self.assertEqual(answer.last_error, '')
+
+    def test_answer_ends_failed_after_the_last_attempt(self):
+        answer, _ = self.submit('Light')
+
+        with mock.patch('assessments.grading_cache.grade_answer', side_effect=RuntimeError('model unavailable')), \
+                mock.patch('assessments.grading_queue.time.sleep') as sleep:
+            run_grading_job(answer.id)
+
+        self.assertEqual([call.args for call in sleep.call_args_list], [(2,), (4,)])
+        answer.refresh_from_db()
+        self.assertEqual(answer.status, StudentAnswer.STATUS_FAILED)
+        self.assertEqual(answer.grading_attempts, 3)
+        self.assertEqual(answer.last_error, 'model unavailable')
+        self.assertIsNone(answer.score)
+
+        # Resubmitting a failed answer queues it for grading again
+        resubmitted, queued = self.submit('Light')
+        self.assertEqual((resubmitted.status, queued), (StudentAnswer.STATUS_PENDING, [answer.id]))
+
+    def claim(self, answer, claimed_at):
+        StudentAnswer.objects.filter(id=answer.id).update(status=StudentAnswer.STATUS_GRADING, claimed_at=claimed_at)
+
+    @mock.patch('assessments.grading_cache.grade_answer', return_value={'score': 1.0, 'feedback': 'Correct'})
+    def test_stale_claims_are_taken_over(self, grade_answer):
+        answer, _ = self.submit('Light')
+
+        # A live worker's claim is left alone
+        self.claim(answer, timezone.now())
+        run_grading_job(answer.id)
+        self.assertEqual(grade_answer.call_count, 0)
+
+        # The worker died (e.g. in a deploy) and its claim went stale
+        self.claim(answer, timezone.now() - settings.GRADING_CLAIM_TIMEOUT - timedelta(seconds=1))
+        run_grading_job(answer.id)
+        self.assertEqual(grade_answer.call_count, 1)
+        self.assertEqual(StudentAnswer.objects.get(id=answer.id).status, StudentAnswer.STATUS_GRADED)
+
+    def test_worker_that_lost_its_claim_does_not_save(self):
+        answer, _ = self.submit('Light')
+        self.claim(answer, timezone.now() - timedelta(minutes=10))
+        answer.refresh_from_db()
+        # Another worker took the answer over in the meantime
+        self.claim(answer, timezone.now())
+
+        save_evaluation(answer, {'score': 0.0, 'feedback': 'Stale'})
+
+        self.assertEqual(StudentAnswer.objects.get(id=answer.id).status, StudentAnswer.STATUS_GRADING)
+
+    def test_completion_requeues_answers_whose_jobs_were_lost(self):
+        questions = [self.question] + [
+            Question.objects.create(topic=self.topic, question_text=f'Question {i}', model_answer='Light')
+            for i in range(3)
+        ]
+        self.assessment.questions.add(*questions)
+        answers = [
+            StudentAnswer.objects.create(assessment=self.assessment, question=question, answer_text='Light')
+            for question in questions
+        ]
+        pending, stale, live, failed = answers
+        self.claim(stale, timezone.now() - timedelta(hours=1))
+        self.claim(live, timezone.now())
+        StudentAnswer.objects.filter(id=failed.id).update(status=StudentAnswer.STATUS_FAILED)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        executor = mock.Mock()
+        with mock.patch('assessments.grading_queue.get_executor', return_value=executor):
+            response = client.post(reverse('complete-assessment', args=[self.assessment.id]))
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(len(response.data['pendingQuestionIds']), 4)
+        requeued = sorted(call.args[1] for call in executor.submit.call_args_list)
+        self.assertEqual(requeued, sorted([pending.id, stale.id, failed.id]))
+
+
+class FakeGradingClient:
+    """
+    Stands in for the OpenAI client: batch grading prompts get batch_reply (raised if it is an exception),
+    single-answer prompts get the score given for the student's answer. Records every prompt.
+    """
+
+    def __init__(self, batch_reply, scores=None):
+        self.batch_reply = batch_reply
+        self.scores = scores or {}
+        self.prompts = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, temperature):
+        prompt = messages[0]['content']
+        self.prompts.append(prompt)
+        if 'Question ID:' in prompt:
+            if isinstance(self.batch_reply, Exception):
+                raise self.batch_reply
+            content = self.batch_reply
+        else:
+            answer_text = re.search(r"Student's Answer: (.*)", prompt).group(1).strip()
+            content = json.dumps({'score': self.scores[answer_text], 'feedback': f"Graded {answer_text}"})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    def single_prompts(self):
+        return [prompt for prompt in self.prompts if 'Question ID:' not in prompt]
+
+
+@override_settings(GRADING_FANOUT_WORKERS=2)
+class BatchGradingTests(TransactionTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='student@example.com',
+            password='password',
+            is_active=True
+        )
+        self.topic = Topic.objects.create(subject=Subject.objects.create(name='Science'), name='Plants')
+        self.assessment = Assessment.objects.create(topic=self.topic, user=self.user)
+        self.answers = []
+        for number, answer_text in enumerate(['Light', 'Water', 'Roots'], start=1):
+            question = Question.objects.create(
+                topic=self.topic,
+                question_text=f'Question {number}?',
+                model_answer=answer_text
+            )
+            self.assessment.questions.add(question)
+            self.answers.append(StudentAnswer.objects.create(
+                assessment=self.assessment,
+                question=question,
+                answer_text=answer_text
+            ))
+
+    def batch_reply(self, *results):
+        return "```json\n" + json.dumps({'results': list(results)}) + "\n```"
+
+    def grade(self, client):
+        with mock.patch('assessments.grading.client', client):
+            grade_assessment_answers(self.assessment)
+        return {answer.answer_text: answer for answer in StudentAnswer.objects.filter(assessment=self.assessment)}
+
+    def test_batch_response_is_parsed_by_question_id(self):
+        light, water, roots = [answer.question for answer in self.answers]
+        client = FakeGradingClient(self.batch_reply(
+            {'question_id': water.id, 'score': 0.5, 'feedback': 'Half'},
+            {'question_id': str(light.id), 'score': '1', 'feedback': 'Full'},
+            {'question_id': roots.id, 'feedback': 'No score'},
+            {'question_id': 'roots', 'score': 1, 'feedback': 'Bad id'},
+            {'question_id': 999999, 'score': 1, 'feedback': 'Not asked'},
+        ))
+
+        with mock.patch('assessments.grading.client', client):
+            evaluations = grade_answers_batch([(question, 'answer') for question in (light, water, roots)])
+
+        self.assertEqual(evaluations, {
+            light.id: {'score': 1.0, 'feedback': 'Full'},
+            water.id: {'score': 0.5, 'feedback': 'Half'},
+        })
+
+    def test_answers_missing_from_the_batch_are_graded_individually(self):
+        light = self.answers[0]
+        client = FakeGradingClient(
+            self.batch_reply({'question_id': light.question_id, 'score': 1, 'feedback': 'Batch'}),
+            scores={'Water': 0.5, 'Roots': 0.75}
+        )
+
+        answers = self.grade(client)
+
+        self.assertEqual(len(client.single_prompts()), 2)
+        self.assertEqual(
+            {text: (answer.status, answer.score) for text, answer in answers.items()},
+            {
+                'Light': (StudentAnswer.STATUS_GRADED, Decimal('1.00')),
+                'Water': (StudentAnswer.STATUS_GRADED, Decimal('0.50')),
+                'Roots': (StudentAnswer.STATUS_GRADED, Decimal('0.75')),
+            }
+        )
+        self.assertEqual(answers['Light'].feedback, 'Batch')
+        self.assertEqual(answers['Water'].feedback, 'Graded Water')
+        self.assertEqual(GradingCacheEntry.objects.count(), 3)
+
+    def test_unparseable_batch_falls_back_to_individual_grading(self):
+        for batch_reply in ("I cannot grade these.", RuntimeError('rate limited')):
+            StudentAnswer.objects.update(status=StudentAnswer.STATUS_PENDING, score=None, claimed_at=None)
+            GradingCacheEntry.objects.all().delete()
+            client = FakeGradingClient(batch_reply, scores={'Light': 1, 'Water': 0.5, 'Roots': 0})
+
+            answers = self.grade(client)
+
+            self.assertEqual(len(client.single_prompts()), 3)
+            self.assertEqual({answer.status for answer in answers.values()}, {StudentAnswer.STATUS_GRADED})
+            self.assertEqual(answers['Roots'].score, Decimal('0.00'))
+
+    @skipUnless(connection.vendor == 'postgresql', 'needs row locking across concurrent connections')
+    def test_locked_and_claimed_answers_are_skipped(self):
+        light, water, roots = self.answers
+        StudentAnswer.objects.filter(id=water.id).update(
+            status=StudentAnswer.STATUS_GRADING,
+            claimed_at=timezone.now()
+        )
+        locked = threading.Event()
+        release = threading.Event()
+
+        def hold_lock():
+            # Another worker's claim transaction, still holding its row lock
+            try:
+                with transaction.atomic():
+                    StudentAnswer.objects.select_for_update().get(id=light.id)
+                    locked.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        try:
+            locked.wait(5)
+            client = FakeGradingClient(self.batch_reply(*[
+                {'question_id': answer.question_id, 'score': 1, 'feedback': 'Batch'} for answer in self.answers
+            ]))
+            answers = self.grade(client)
+        finally:
+            release.set()
+            thread.join()
+
+        self.assertEqual(len(client.prompts), 1)
+        self.assertIn(f"Question ID: {roots.question_id}", client.prompts[0])
+        self.assertNotIn(f"Question ID: {light.question_id}", client.prompts[0])
+        self.assertEqual(answers['Light'].status, StudentAnswer.STATUS_PENDING)
+        self.assertEqual(answers['Water'].status, StudentAnswer.STATUS_GRADING)
+        self.assertEqual(answers['Roots'].status, StudentAnswer.STATUS_GRADED)
+
+
+@override_settings(ASSESSMENT_GRADE_AT_COMPLETION=True)
+class AsyncSubmitAnswerViewTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='student@example.com',
+            password='password',
+            is_active=True
+        )
+        self.topic = Topic.objects.create(subject=Subject.objects.create(name='Science'), name='Plants')
+        self.question = Question.objects.create(topic=self.topic, question_text='What do plants need?', model_answer='Light')
+        self.assessment = Assessment.objects.create(topic=self.topic, user=self.user)
+        self.assessment.questions.add(self.question)
+        self.headers = {'Authorization': f"Bearer {AccessToken.for_user(self.user)}"}
+
+    async def post(self, data, headers=None, assessment_id=None):
+        return await self.async_client.post(
+            reverse('submit-answer-async', args=[assessment_id or self.assessment.id]),
+            data,
+            content_type='application/json',
+            headers=self.headers if headers is None else headers
+        )
+
+    async def test_authenticated_answer_is_accepted_for_grading(self):
+        response = await self.post({'questionId': self.question.id, 'answer': 'Light and water'})
+
+        self.assertEqual(response.status_code, 202)
+        body = response.json()
+        self.assertEqual((body['questionId'], body['status'], body['score']), (self.question.id, 'pending', None))
+        answer = await StudentAnswer.objects.aget(id=body['answerId'])
+        self.assertEqual(answer.answer_text, 'Light and water')
+
+    async def test_missing_or_invalid_token_is_rejected(self):
+        for headers in ({}, {'Authorization': 'Bearer not-a-token'}):
+            response = await self.post({'questionId': self.question.id, 'answer': 'Light'}, headers=headers)
+            self.assertEqual(response.status_code, 401)
+        self.assertFalse(await StudentAnswer.objects.aexists())
+
+    async def test_malformed_json_is_rejected(self):
+        response = await self.post('questionId=1')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Request body must be valid JSON'})
+
+    async def test_missing_fields_and_unknown_records_are_rejected(self):
+        response = await self.post({'questionId': self.question.id})
+        self.assertEqual(response.status_code, 400)
+
+        response = await self.post({'questionId': self.question.id + 1, 'answer': 'Light'})
+        self.assertEqual(response.json(), {'error': 'Question not found'})
+
+        other_user = await get_user_model().objects.acreate(email='other@example.com', is_active=True)
+        other_headers = {'Authorization': f"Bearer {AccessToken.for_user(other_user)}"}
+        response = await self.post({'questionId': self.question.id, 'answer': 'Light'}, headers=other_headers)
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(await StudentAnswer.objects.aexists())
+
+
+class GradingCacheTests(TestCase):
+    def setUp(self):
+        topic = Topic.objects.create(subject=Subject.objects.create(name='Science'), name='Plants')
+        self.question = Question.objects.create(topic=topic, question_text='What do plants need?', model_answer='Light')
+
+    def test_trivially_different_answers_normalize_alike(self):
+        self.assertEqual(normalize_answer('  Light, and WATER!\n'), normalize_answer('light and water'))
+        self.assertEqual(normalize_answer('Ｌｉｇｈｔ'), normalize_answer('light'))
+        self.assertNotEqual(normalize_answer('light'), normalize_answer('lights'))
+
+    @mock.patch('assessments.grading_cache.grade_answer', return_value={'score': 1.0, 'feedback': 'Correct'})
+    def test_equivalent_answers_share_one_entry(self, grade_answer):
+        first = grade_answer_cached(self.question, 'Light and water.')
+        second = grade_answer_cached(self.question, 'light, AND water')
+
+        self.assertEqual(grade_answer.call_count, 1)
+        self.assertEqual(first, second)
+        entry = GradingCacheEntry.objects.get(question=self.question)
+        self.assertEqual((entry.normalized_answer, entry.hit_count), ('light and water', 1))
+
+    @mock.patch('assessments.grading_cache.grade_answer', return_value={'score': 1.0, 'feedback': 'Correct'})
+    def test_editing_the_question_clears_its_cached_grades(self, grade_answer):
+        grade_answer_cached(self.question, 'Light')
+        self.assertTrue(GradingCacheEntry.objects.filter(question=self.question).exists())
+
+        self.question.model_answer = 'Light, water and carbon dioxide'
+        self.question.save()
+
+        self.assertFalse(GradingCacheEntry.objects.filter(question=self.question).exists())
+        grade_answer_cached(self.question, 'Light')
+        self.assertEqual(grade_answer.call_count, 2)
+
+
+@override_settings(ASSESSMENT_QUESTION_COUNT=5, ASSESSMENT_STRATIFY_BY_DIFFICULTY=True)
+class QuestionSamplingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.topic = Topic.objects.create(subject=Subject.objects.create(name='Science'), name='Plants')
+        self.questions = {
+            difficulty: [
+                Question.objects.create(
+                    topic=self.topic, question_text=f'{difficulty} question {i}', model_answer='Light',
+                    difficulty=difficulty
+                )
+                for i in range(size)
+            ]
+            for difficulty, size in (('easy', 5), ('medium', 3), ('hard', 2))
+        }
+
+    def test_allocation_follows_the_difficulty_mix(self):
+        pool = {'easy': [1, 2, 3, 4, 5], 'medium': [6, 7, 8], 'hard': [9, 10]}
+        # Shares are 2, 1.2 and 0.8; the largest remainder gets the last question
+        self.assertEqual(allocate_by_difficulty(pool, 4), {'easy': 2, 'medium': 1, 'hard': 1})
+        self.assertEqual(allocate_by_difficulty(pool, 10), {'easy': 5, 'medium': 3, 'hard': 2})
+        self.assertEqual(sum(allocate_by_difficulty(pool, 7).values()), 7)
+
+    def test_sample_is_stratified_and_skips_inactive_questions(self):
+        inactive = self.questions['easy'][0]
+        inactive.is_active = False
+        inactive.save()
+
+        question_ids = sample_question_ids(self.topic.id, 5)
+
+        self.assertEqual(len(set(question_ids)), 5)
+        self.assertNotIn(inactive.id, question_ids)
+        difficulties = Question.objects.filter(id__in=question_ids).values_list('difficulty', flat=True)
+        # 4 easy, 3 medium and 2 hard active questions split 5 as 2, 2 and 1
+        self.assertEqual(sorted(difficulties), ['easy', 'easy', 'hard', 'medium', 'medium'])
+
+    def test_small_pool_is_returned_whole(self):
+        question_ids = sample_question_ids(self.topic.id, 20, stratify=False)
+        self.assertEqual(sorted(question_ids), sorted(q.id for qs in self.questions.values() for q in qs))
+
+    def test_pool_is_cached_until_a_question_changes(self):
+        get_question_pool(self.topic.id)
+        with self.assertNumQueries(0):
+            get_question_pool(self.topic.id)
+
+        added = Question.objects.create(topic=self.topic, question_text='New', model_answer='Light', difficulty='hard')
+        self.assertIn(added.id, get_question_pool(self.topic.id)['hard'])
+
+    def test_start_assessment_returns_the_sampled_questions(self):
+        user = get_user_model().objects.create_user(email='student@example.com', password='password', is_active=True)
+        client = APIClient()
+        client.force_authenticate(user)
+
+        response = client.post(reverse('start-assessment', args=[self.topic.id]))
+
+        self.assertEqual(response.status_code, 200)
+        assessment = Assessment.objects.get(id=response.data['id'])
+        self.assertEqual(
+            sorted(question['id'] for question in response.data['questions']),
+            sorted(assessment.questions.values_list('id', flat=True)),
+        )
+        self.assertEqual(len(response.data['questions']), 5)
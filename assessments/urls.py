@@ -3,6 +3,8 @@ from django.urls import path
 from .views import (
     StartAssessmentView,
     SubmitAnswerView,
+    AsyncSubmitAnswerView,
+    AnswerStatusView,
     CompleteAssessmentView,
     AssessmentSummaryView,
     AssessmentResultView
@@ -23,6 +25,20 @@ urlpatterns = [
         name='submit-answer'
     ),
 
+    # Async variant of answer submission for ASGI deployments
+    path(
+        '<int:assessment_id>/submit/async/',
+        AsyncSubmitAnswerView.as_view(),
+        name='submit-answer-async'
+    ),
+
+    # Poll the grading result of a submitted answer
+    path(
+        '<int:assessment_id>/answers/<int:question_id>/',
+        AnswerStatusView.as_view(),
+        name='answer-status'
+    ),
+
     # Complete an assessment and get results
     path(
         '<int:assessment_id>/complete/',
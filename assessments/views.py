@@ -3,6 +3,9 @@ from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
 from django.utils import timezone
 from django.db import transaction
 from .models import Assessment, Question, StudentAnswer, AssessmentSummary
@@ -11,77 +14,78 @@ from .serializers import (
     StudentAnswerSerializer,
     AssessmentSummarySerializer
 )
+from .grading_queue import claimable_answers, enqueue_grading, grade_assessment_answers, submit_answer
+from .progress import record_completed_assessment, record_summary_attempt
+from .sampling import invalidate_question_pool, sample_question_ids
+from edugen.async_views import AsyncAPIView
 from edugen_tutor_model.models import Topic
-from openai import OpenAI
-import os
 import logging
-import re
-import json
-
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
 
 logger = logging.getLogger(__name__)
 
 
+def serialize_answer_status(answer):
+    """
+    Grading state of a submitted answer; score and feedback are only set once it is graded.
+    """
+    graded = answer.status == StudentAnswer.STATUS_GRADED
+    return {
+        'answerId': answer.id,
+        'questionId': answer.question_id,
+        'status': answer.status,
+        'isCorrect': float(answer.score) == 1.0 if graded else None,
+        'score': float(answer.score) * 100 if graded else None,
+        'feedback': answer.feedback if graded else None
+    }
+
+
 class StartAssessmentView(APIView):
     permission_classes = [IsAuthenticated]
 
+    def sample_questions(self, topic_id):
+        """
+        Loads a random sample of the topic's active questions.
+        A pool still listing questions another worker removed or deactivated is rebuilt once and sampled again;
+        questions added in another worker appear once this worker's pool expires (QUESTION_POOL_CACHE_TIMEOUT).
+        """
+        for _ in range(2):
+            question_ids = sample_question_ids(
+                topic_id,
+                settings.ASSESSMENT_QUESTION_COUNT,
+                stratify=settings.ASSESSMENT_STRATIFY_BY_DIFFICULTY
+            )
+            questions = list(Question.objects.filter(id__in=question_ids, topic_id=topic_id, is_active=True))
+            if len(questions) == len(question_ids):
+                break
+            invalidate_question_pool(topic_id)
+        return questions
+
     @transaction.atomic
     def post(self, request, topic_id):
         try:
             # Log the start of the process
             logger.info(f"Starting assessment for topic {topic_id} by user {request.user.id}")
 
-            # Get active questions first to ensure they exist
-            available_questions = Question.objects.filter(
-                topic_id=topic_id,
-                is_active=True
-            )
+            # Sample from the topic's cached question pool instead of ORDER BY RANDOM() over the table
+            questions = self.sample_questions(topic_id)
 
-            # Log available questions
-            logger.info(f"Found {available_questions.count()} available questions for topic {topic_id}")
-
-            if not available_questions.exists():
+            if not questions:
                 logger.error(f"No active questions found for topic {topic_id}")
                 return Response(
                     {'error': 'No questions available for this topic'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+            logger.info(f"Selected {len(questions)} questions for the assessment")
 
-            # Get 5 random questions
-            selected_questions = list(available_questions.order_by('?')[:5])
-            logger.info(f"Selected {len(selected_questions)} questions for the assessment")
-
-            # Create assessment with explicit transaction
             assessment = Assessment.objects.create(
                 topic_id=topic_id,
                 user=request.user,
                 status='in_progress'
             )
+            assessment.questions.add(*questions)
 
-            # Explicitly attach questions
-            assessment.questions.add(*selected_questions)
-
-            # Verify questions were attached
-            question_count = assessment.questions.count()
-            logger.info(f"Attached {question_count} questions to assessment {assessment.id}")
-
-            if question_count == 0:
-                logger.error(f"Failed to attach questions to assessment {assessment.id}")
-                raise ValueError("Failed to attach questions to assessment")
-
-            # Re-fetch the assessment to ensure we have the latest data
-            assessment.refresh_from_db()
-
-            # Serialize and verify response
-            serializer = AssessmentSerializer(assessment)
-            response_data = serializer.data
-
-            # Verify serialized data
-            if not response_data.get('questions'):
-                logger.error(f"Questions missing from serialized data for assessment {assessment.id}")
-                logger.error(f"Serialized data: {response_data}")
-                raise ValueError("Assessment serialization failed - missing questions")
+            # Serialize the questions already in memory rather than reading them back
+            response_data = AssessmentSerializer(assessment, context={'questions': questions}).data
 
             logger.info(
                 f"Successfully created assessment {assessment.id} with {len(response_data['questions'])} questions")
@@ -98,25 +102,6 @@ class StartAssessmentView(APIView):
 class SubmitAnswerView(APIView):
     permission_classes = [IsAuthenticated]
 
-    def extract_json_from_response(self, content):
-        """
-        Extracts JSON from GPT response, handling various response formats.
-        """
-        # Try to find JSON content within markdown code blocks
-        json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', content, re.DOTALL)
-        if json_match:
-            content = json_match.group(1)
-
-        # Clean up the content and try to parse it
-        try:
-            # Remove any remaining markdown or unwanted characters
-            content = re.sub(r'```.*?```', '', content, flags=re.DOTALL)
-            content = content.strip()
-            return json.loads(content)
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON from content: {content}")
-            raise ValueError(f"Invalid JSON response from GPT: {str(e)}")
-
     def post(self, request, assessment_id):
         try:
             # Log the incoming request
@@ -139,125 +124,107 @@ class SubmitAnswerView(APIView):
 
             question = Question.objects.get(id=question_id)
 
-            # Format the prompt for GPT-4
-            prompt = f"""
-            You are evaluating a Grade 6 student's answer to a science question.
-            Remember these key guidelines:
-            
-            1. Evaluation Process:
-               - First, analyze the model answer to identify:
-                  * Core concepts that must be understood
-                  * Key supporting details that enhance understanding
-                  * Alternative valid explanations or approaches
-               - Then, compare the student's answer to identify:
-                  * Whether they've grasped the core concepts, even if expressed differently
-                  * Which key points they've included, even if phrased simply
-                  * Any valid alternatives they've provided that aren't in the model answer
-
-            2. Scoring Guidelines:
-               - 1.0 (100%): 
-                  * Shows clear understanding of core concepts from the model answer
-                  * May use different but valid examples or explanations
-                  * Doesn't need to match the model answer word-for-word
-               - 0.75 (75%):
-                  * Demonstrates understanding of main concepts
-                  * Might miss some supporting details
-                  * Uses correct but simplified explanations
-               - 0.5 (50%):
-                  * Shows partial understanding
-                  * Misses significant details but has some correct points
-               - 0.0 (0%):
-                  * Completely incorrect or irrelevant
-        
-                3. Consider that students may:
-                   - Use simple language but still demonstrate understanding
-                   - Give partial answers that are technically correct
-                   - Miss some details while grasping the main concept
-
-            Question: {question.question_text}
-            Model Answer: {question.model_answer}
-            Student's Answer: {answer_text}
-
-            Evaluate the answer considering the student's grade level and provide:
-            1. A score that reflects understanding, not just completeness
-            2. Specific, encouraging feedback that:
-               - Acknowledges what they got right
-               - Suggests what could be added
-               - Provides an example or hint for improvement
-               - Uses grade-appropriate language
-
-            Return ONLY a JSON object in this exact format, with no other text:
-            {{
-                "score": (number between 0 and 1),
-                "feedback": "your feedback here"
-            }}
-            """
-
-            # Get GPT-4 evaluation
-            response = client.chat.completions.create(
-                model="gpt-4",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,
+            # Save the answer as pending; grading runs on the background worker pool
+            answer = submit_answer(assessment, question, answer_text)
+
+            return Response(
+                serialize_answer_status(answer),
+                status=status.HTTP_200_OK if answer.status == StudentAnswer.STATUS_GRADED else status.HTTP_202_ACCEPTED
             )
 
-            # Extract and parse the response
-            gpt_response = response.choices[0].message.content
-            logger.debug(f"GPT Response: {gpt_response}")
+        except Assessment.DoesNotExist:
+            return Response(
+                {'error': 'Assessment not found or already completed'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        except Question.DoesNotExist:
+            return Response(
+                {'error': 'Question not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        except Exception as e:
+            logger.error(f"Error processing answer submission: {str(e)}")
+            return Response(
+                {'error': 'Failed to process answer submission'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
 
-            try:
-                evaluation = self.extract_json_from_response(gpt_response)
-            except ValueError as e:
-                logger.error(f"Failed to parse GPT response: {str(e)}")
-                return Response(
-                    {'error': 'Invalid response format from evaluation system'},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
 
-            # Validate the evaluation structure
-            if not isinstance(evaluation, dict) or 'score' not in evaluation or 'feedback' not in evaluation:
-                logger.error(f"Invalid evaluation structure: {evaluation}")
-                return Response(
-                    {'error': 'Invalid evaluation format'},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
+class AsyncSubmitAnswerView(AsyncAPIView):
+    """
+    Async variant of SubmitAnswerView for ASGI deployments.
+    """
 
-            # Create the student answer record
-            student_answer = StudentAnswer.objects.create(
-                assessment=assessment,
-                question=question,
-                answer_text=answer_text,
-                score=float(evaluation['score']),
-                feedback=evaluation['feedback']
+    async def post(self, request, assessment_id):
+        try:
+            logger.info(f"Processing answer submission for assessment {assessment_id}")
+
+            assessment = await Assessment.objects.aget(
+                id=assessment_id,
+                user=request.user,
+                status='in_progress'
             )
 
-            return Response({
-                'isCorrect': float(evaluation['score']) == 1.0,
-                'score': float(evaluation['score']) * 100,
-                'feedback': evaluation['feedback']
-            })
+            question_id = request.data.get('questionId')
+            answer_text = request.data.get('answer')
+
+            if not question_id or not answer_text:
+                return JsonResponse(
+                    {'error': 'Question ID and answer are required'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            question = await Question.objects.aget(id=question_id)
+
+            answer = await sync_to_async(submit_answer)(assessment, question, answer_text)
+
+            return JsonResponse(
+                serialize_answer_status(answer),
+                status=status.HTTP_200_OK if answer.status == StudentAnswer.STATUS_GRADED else status.HTTP_202_ACCEPTED
+            )
 
         except Assessment.DoesNotExist:
-            return Response(
+            return JsonResponse(
                 {'error': 'Assessment not found or already completed'},
                 status=status.HTTP_404_NOT_FOUND
             )
         except Question.DoesNotExist:
-            return Response(
+            return JsonResponse(
                 {'error': 'Question not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
         except Exception as e:
             logger.error(f"Error processing answer submission: {str(e)}")
-            return Response(
+            return JsonResponse(
                 {'error': 'Failed to process answer submission'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
 
+class AnswerStatusView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, assessment_id, question_id):
+        """
+        Lets clients poll for the result of a submitted answer.
+        """
+        try:
+            answer = StudentAnswer.objects.get(
+                assessment_id=assessment_id,
+                assessment__user=request.user,
+                question_id=question_id
+            )
+            return Response(serialize_answer_status(answer))
+        except StudentAnswer.DoesNotExist:
+            return Response(
+                {'error': 'Answer not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+
 class CompleteAssessmentView(APIView):
     permission_classes = [IsAuthenticated]
 
-    @transaction.atomic
     def post(self, request, assessment_id):
         try:
             assessment = Assessment.objects.get(
@@ -266,39 +233,53 @@ class CompleteAssessmentView(APIView):
                 status='in_progress'
             )
 
-            # Calculate total score
-            answers = StudentAnswer.objects.filter(assessment=assessment)
-            total_score = sum(answer.score for answer in answers) / answers.count() * 100
-
-            # Update assessment
-            assessment.status = 'completed'
-            assessment.end_time = timezone.now()
-            assessment.total_score = total_score
-            assessment.save()
+            # Grade all outstanding answers together, outside the transaction below
+            if settings.ASSESSMENT_GRADE_AT_COMPLETION:
+                grade_assessment_answers(assessment)
+
+            answers = StudentAnswer.objects.filter(assessment=assessment).select_related('question')
+
+            # Every answer must be graded before the assessment can be scored
+            ungraded = [answer for answer in answers if answer.status != StudentAnswer.STATUS_GRADED]
+            if ungraded:
+                if not settings.ASSESSMENT_GRADE_AT_COMPLETION:
+                    # Grading jobs only live in this process's queue, so a restart can lose them: requeue failed
+                    # and pending answers and stale claims; a job whose answer is already claimed does nothing
+                    requeue = StudentAnswer.objects.filter(
+                        claimable_answers(), id__in=[answer.id for answer in ungraded]
+                    ).values_list('id', flat=True)
+                    for answer_id in requeue:
+                        enqueue_grading(answer_id)
+                return Response(
+                    {
+                        'error': 'Some answers are still being graded',
+                        'pendingQuestionIds': [answer.question_id for answer in ungraded]
+                    },
+                    status=status.HTTP_409_CONFLICT
+                )
 
-            # Update or create assessment summary
-            summary, created = AssessmentSummary.objects.get_or_create(
-                user=request.user,
-                topic=assessment.topic,
-                defaults={
-                    'total_attempts': 1,
-                    'best_score': total_score,
-                    'last_score': total_score,
-                    'last_attempt_date': timezone.now(),
-                    'average_score': total_score
-                }
-            )
+            with transaction.atomic():
+                # Calculate total score
+                total_score = sum(answer.score for answer in answers) / len(answers) * 100
+
+                # Update assessment, unless a concurrent request completed it first
+                assessment.status = 'completed'
+                assessment.end_time = timezone.now()
+                assessment.total_score = total_score
+                completed = Assessment.objects.filter(id=assessment.id, status='in_progress').update(
+                    status=assessment.status,
+                    end_time=assessment.end_time,
+                    total_score=assessment.total_score
+                )
+                if not completed:
+                    raise Assessment.DoesNotExist
 
-            if not created:
-                summary.total_attempts += 1
-                summary.best_score = max(summary.best_score, total_score)
-                summary.last_score = total_score
-                summary.last_attempt_date = timezone.now()
-                summary.average_score = (
-                        (summary.average_score * (summary.total_attempts - 1) + total_score) /
-                        summary.total_attempts
+                # Update or create assessment summary in a single upsert
+                summary = record_summary_attempt(
+                    assessment.user_id, assessment.topic_id, total_score, assessment.end_time
                 )
-                summary.save()
+
+                record_completed_assessment(assessment, summary)
 
             return Response({
                 'assessmentId': assessment.id,
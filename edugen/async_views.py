@@ -0,0 +1,45 @@
+"""
+Base class for async API views served through edugen.asgi.
+"""
+
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+
+class AsyncAPIView(View):
+    """
+    Async counterpart of APIView for endpoints that spend most of their time waiting on the LLM.
+    Authenticates the JWT bearer token and parses the JSON body into request.data before the
+    async handler runs, so an in-flight request does not hold a worker thread.
+    """
+    authentication = JWTAuthentication()
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        # Like APIView, rely on token authentication instead of CSRF cookies
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            user_auth = await sync_to_async(self.authentication.authenticate)(request)
+        except AuthenticationFailed as e:
+            detail = e.detail if isinstance(e.detail, dict) else {'detail': e.detail}
+            return JsonResponse(detail, status=401)
+
+        if user_auth is None:
+            return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+        request.user = user_auth[0]
+
+        try:
+            request.data = json.loads(request.body) if request.body else {}
+        except ValueError:
+            return JsonResponse({'error': 'Request body must be valid JSON'}, status=400)
+
+        return await super().dispatch(request, *args, **kwargs)
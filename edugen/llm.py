@@ -0,0 +1,41 @@
+"""
+Shared OpenAI clients for the LLM-bound parts of EduGen.
+"""
+
+import asyncio
+import os
+import weakref
+
+import httpx
+from dotenv import load_dotenv
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+load_dotenv()
+
+# One worker holds this many LLM requests in flight over a single connection pool
+MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', '500'))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('OPENAI_MAX_KEEPALIVE_CONNECTIONS', '100'))
+
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """
+    Return the AsyncOpenAI client for the running event loop.
+    Under ASGI there is one loop per worker, so every request shares one connection pool;
+    connections cannot be shared across loops, so each loop gets its own client.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS
+                )
+            )
+        )
+        _async_clients[loop] = client
+    return client
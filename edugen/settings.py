@@ -195,3 +195,36 @@ ALLOWED_HOSTS = [
 ]
 
 FRONTEND_URL = 'https://3377-41-90-178-0.ngrok-free.app'
+
+# Retrieval (RAG) configuration
+RAG_INDEX_PATH = os.path.join(BASE_DIR, 'edugen_tutor_model', 'rag_preprocessing', 'faiss_index')
+# Memory-mapped chunk store written next to corpus.csv; a corpus.csv path also works but is loaded per worker
+RAG_CORPUS_PATH = os.path.join(BASE_DIR, 'edugen_tutor_model', 'rag_preprocessing', 'corpus.chunks')
+# Load and warm up the retriever when a worker starts instead of on the first chat request
+RAG_PRELOAD = os.getenv('RAG_PRELOAD', 'True') == 'True'
+# How long a generated topic overview is served to students before it is regenerated
+TOPIC_OVERVIEW_CACHE_TTL = timedelta(days=7)
+# Semantic answer cache: reuse an earlier answer on the same topic when the questions are this similar (cosine)
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_SIMILARITY_THRESHOLD = 0.92
+ANSWER_CACHE_MAX_ENTRIES_PER_TOPIC = 200
+
+# Background grading of submitted answers
+GRADING_WORKERS = int(os.getenv('GRADING_WORKERS', '4'))
+GRADING_MAX_ATTEMPTS = 3
+GRADING_RETRY_BACKOFF = 2  # seconds, doubled after each failed attempt
+# A worker that has held an answer in 'grading' this long is presumed dead (e.g. killed by a deploy),
+# so another worker may claim the answer; longer than every grading attempt and backoff put together
+GRADING_CLAIM_TIMEOUT = timedelta(minutes=5)
+# Grade all of an assessment's answers in one request when it is completed instead of one by one on submission
+ASSESSMENT_GRADE_AT_COMPLETION = os.getenv('ASSESSMENT_GRADE_AT_COMPLETION', 'False') == 'True'
+# Parallel requests used for answers a batch grading response left out
+GRADING_FANOUT_WORKERS = 5
+
+# Assessment question sampling. Pools live in the default cache, which is per-process memory unless CACHES
+# configures a shared backend (e.g. Redis). With per-process memory, saving a question only refreshes the pool
+# of the worker that saved it: other workers pick up an added question when their copy expires, so the
+# timeout stays short. With a shared backend every worker sees the refresh at once and it can be raised.
+ASSESSMENT_QUESTION_COUNT = 5
+ASSESSMENT_STRATIFY_BY_DIFFICULTY = True
+QUESTION_POOL_CACHE_TIMEOUT = int(os.getenv('QUESTION_POOL_CACHE_TIMEOUT', '60'))
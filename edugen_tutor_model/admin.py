@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Subject, Topic, Chat
+from .models import Subject, Topic, Chat, TopicOverview, CachedAnswer
+from .overview_cache import invalidate_overviews
 
 @admin.register(Subject)
 class SubjectAdmin(admin.ModelAdmin):
@@ -14,6 +15,12 @@ class TopicAdmin(admin.ModelAdmin):
     list_editable = ('order', 'is_active')
     list_filter = ('subject',)
     search_fields = ('name', 'subject__name')
+    actions = ['clear_cached_overviews']
+
+    @admin.action(description='Clear cached overviews for selected topics')
+    def clear_cached_overviews(self, request, queryset):
+        deleted = invalidate_overviews(queryset)
+        self.message_user(request, f'Cleared {deleted} cached overview(s).')
 
 
 @admin.register(Chat)
@@ -22,3 +29,26 @@ class ChatAdmin(admin.ModelAdmin):
     list_filter = ('user', 'topic', 'timestamp')
     search_fields = ('user__email', 'topic__name', 'prompt', 'response')
 
+
+@admin.register(TopicOverview)
+class TopicOverviewAdmin(admin.ModelAdmin):
+    list_display = ('topic', 'corpus_version', 'prompt_version', 'generated_at')
+    list_filter = ('topic__subject', 'prompt_version')
+    search_fields = ('topic__name', 'content')
+    readonly_fields = ('topic', 'corpus_version', 'prompt_version', 'generated_at')
+    actions = ['clear_all_overviews']
+
+    @admin.action(description='Clear all cached overviews (e.g. after the corpus changes)')
+    def clear_all_overviews(self, request, queryset):
+        deleted = invalidate_overviews()
+        self.message_user(request, f'Cleared {deleted} cached overview(s).')
+
+
+@admin.register(CachedAnswer)
+class CachedAnswerAdmin(admin.ModelAdmin):
+    list_display = ('topic', 'prompt', 'hit_count', 'created_at', 'last_used_at')
+    list_filter = ('topic__subject', 'topic')
+    search_fields = ('topic__name', 'prompt', 'response')
+    ordering = ('-hit_count',)
+    exclude = ('embedding',)
+    readonly_fields = ('topic', 'prompt', 'hit_count', 'created_at', 'last_used_at')
@@ -0,0 +1,98 @@
+import logging
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CachedAnswer
+from .rag.retriever import get_retriever
+
+logger = logging.getLogger(__name__)
+
+
+class CacheStats:
+    """
+    Hit and miss counters for a cache in this process
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0
+        }
+
+
+stats = CacheStats()
+
+
+def embed_prompt(prompt, index_path, corpus_path):
+    """
+    Embed a prompt with the retriever's resident SBERT model as a normalized float32 vector
+    """
+    embedding = np.asarray(get_retriever(index_path, corpus_path).encode([prompt])[0], dtype=np.float32)
+    norm = np.linalg.norm(embedding)
+    return embedding / norm if norm else embedding
+
+
+def lookup_answer(topic, embedding):
+    """
+    Return the cached answer for the most similar earlier prompt on this topic,
+    or None if none is above ANSWER_CACHE_SIMILARITY_THRESHOLD
+    """
+    entries = [
+        (entry_id, np.frombuffer(vector, dtype=np.float32), response)
+        for entry_id, vector, response in CachedAnswer.objects.filter(topic=topic).values_list(
+            'id', 'embedding', 'response'
+        )
+    ]
+    # Skip entries embedded by a different model
+    entries = [entry for entry in entries if entry[1].shape == embedding.shape]
+
+    if entries:
+        similarities = np.stack([vector for _, vector, _ in entries]) @ embedding
+        best = int(np.argmax(similarities))
+        if similarities[best] >= settings.ANSWER_CACHE_SIMILARITY_THRESHOLD:
+            entry_id, _, response = entries[best]
+            CachedAnswer.objects.filter(id=entry_id).update(
+                hit_count=F('hit_count') + 1,
+                last_used_at=timezone.now()
+            )
+            stats.record(hit=True)
+            logger.info(f"Answer cache hit for topic {topic.id} (similarity {similarities[best]:.3f})")
+            return response
+
+    stats.record(hit=False)
+    return None
+
+
+def store_answer(topic, prompt, embedding, response):
+    """
+    Cache an answer, evicting the topic's least recently used entries beyond ANSWER_CACHE_MAX_ENTRIES_PER_TOPIC
+    """
+    CachedAnswer.objects.create(
+        topic=topic,
+        prompt=prompt,
+        embedding=embedding.astype(np.float32).tobytes(),
+        response=response
+    )
+
+    stale_ids = CachedAnswer.objects.filter(topic=topic).order_by('-last_used_at').values_list(
+        'id', flat=True
+    )[settings.ANSWER_CACHE_MAX_ENTRIES_PER_TOPIC:]
+    CachedAnswer.objects.filter(id__in=list(stale_ids)).delete()
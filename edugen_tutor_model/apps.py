@@ -1,6 +1,46 @@
+import logging
+import os
+import sys
+
 from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def is_serving_requests():
+    """
+    Whether this process will serve requests, as opposed to running a management command
+    """
+    if not sys.argv or not sys.argv[0].endswith('manage.py'):
+        return True
+    if len(sys.argv) < 2 or sys.argv[1] != 'runserver':
+        return False
+    # With the autoreloader only the child process (RUN_MAIN) serves requests
+    return '--noreload' in sys.argv or os.environ.get('RUN_MAIN') == 'true'
 
 
 class EdugenTutorModelConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "edugen_tutor_model"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        if not settings.RAG_PRELOAD or not is_serving_requests():
+            return
+
+        from .rag.reranker import RERANK_ENABLED, get_reranker
+        from .rag.retriever import get_retriever
+
+        try:
+            get_retriever(settings.RAG_INDEX_PATH, settings.RAG_CORPUS_PATH).warm_up()
+        except Exception as e:
+            # The retriever loads lazily on the first request if warm-up fails
+            logger.error(f"Failed to preload retriever: {str(e)}")
+
+        if RERANK_ENABLED:
+            try:
+                get_reranker().warm_up()
+            except Exception as e:
+                logger.error(f"Failed to preload reranker: {str(e)}")
@@ -0,0 +1,64 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from edugen_tutor_model.rag_preprocessing.ingest import source_defaults
+from edugen_tutor_model.rag_preprocessing.chunker import DEFAULT_MAX_TOKENS, DEFAULT_OVERLAP_TOKENS
+from edugen_tutor_model.rag_preprocessing.pdf_to_tsv import DEFAULT_PAGES_PER_TASK, convert_pdfs_to_tsv
+
+
+class Command(BaseCommand):
+    help = 'Extract every PDF in a directory into a chunk TSV per file, in parallel, ready for ingest.py'
+
+    def add_arguments(self, parser):
+        parser.add_argument('pdf_dir', help='Directory of PDF notes, e.g. grade_6_science.pdf')
+        parser.add_argument('--output-dir', help='Where to write the TSVs (default: the PDF directory)')
+        parser.add_argument('--workers', type=int, help='Extraction processes (default: one per core)')
+        parser.add_argument('--pages-per-task', type=int, default=DEFAULT_PAGES_PER_TASK)
+        parser.add_argument('--max-tokens', type=int, default=DEFAULT_MAX_TOKENS, help='Largest chunk, in tokens')
+        parser.add_argument('--overlap-tokens', type=int, default=DEFAULT_OVERLAP_TOKENS,
+                            help='Tokens of trailing sentences repeated at the start of the next chunk')
+        parser.add_argument('--subject', help='Subject for PDFs whose name does not give one')
+        parser.add_argument('--grade', help='Grade for PDFs whose name does not give one')
+
+    def handle(self, *args, **options):
+        pdf_dir = options['pdf_dir']
+        output_dir = options['output_dir'] or pdf_dir
+        if not os.path.isdir(pdf_dir):
+            raise CommandError(f'{pdf_dir} is not a directory')
+
+        names = sorted(name for name in os.listdir(pdf_dir) if name.lower().endswith('.pdf'))
+        if not names:
+            raise CommandError(f'No PDFs found in {pdf_dir}')
+        os.makedirs(output_dir, exist_ok=True)
+
+        jobs = []
+        for name in names:
+            defaults = source_defaults(name)
+            jobs.append((
+                os.path.join(pdf_dir, name),
+                os.path.join(output_dir, f'{os.path.splitext(name)[0]}.tsv'),
+                options['subject'] or defaults.get('subject'),
+                options['grade'] or defaults.get('grade'),
+            ))
+
+        if options['overlap_tokens'] >= options['max_tokens']:
+            raise CommandError('--overlap-tokens must be smaller than --max-tokens')
+
+        pages = chunks = 0
+        results = convert_pdfs_to_tsv(
+            jobs,
+            workers=options['workers'],
+            pages_per_task=options['pages_per_task'],
+            max_tokens=options['max_tokens'],
+            overlap_tokens=options['overlap_tokens'],
+        )
+        for result in results:
+            pages += result['pages']
+            chunks += result['chunks']
+            self.stdout.write(
+                f"{os.path.basename(result['pdf_path'])}: {result['pages']} page(s), {result['chunks']} chunk(s), "
+                f"{result['extract_seconds']}s extracting, {result['seconds']}s wall"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'Extracted {chunks} chunk(s) from {pages} page(s) in {len(jobs)} PDF(s)'))
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.3 on 2026-10-18 02:08
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        (
+            "edugen_tutor_model",
+            "0002_alter_subject_options_alter_topic_options_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TopicOverview",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("corpus_version", models.CharField(max_length=64)),
+                ("prompt_version", models.IntegerField()),
+                ("content", models.TextField()),
+                (
+                    "generated_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "topic",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="overviews",
+                        to="edugen_tutor_model.topic",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-generated_at"],
+                "unique_together": {("topic", "corpus_version", "prompt_version")},
+            },
+        ),
+    ]
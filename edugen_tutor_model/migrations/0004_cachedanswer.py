@@ -0,0 +1,49 @@
+# Generated by Django 5.1.3 on 2026-10-18 02:09
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("edugen_tutor_model", "0003_topicoverview"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CachedAnswer",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("prompt", models.TextField()),
+                ("embedding", models.BinaryField()),
+                ("response", models.TextField()),
+                ("hit_count", models.IntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "last_used_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "topic",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="cached_answers",
+                        to="edugen_tutor_model.topic",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["topic", "-last_used_at"],
+            },
+        ),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.conf import settings
 from django.db import models
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 
 
 def validate_image_size(image):
@@ -61,3 +62,41 @@ class Chat(models.Model):
 
     def __str__(self):
         return f'{self.user.email} - {self.topic.name} - {self.timestamp}'
+
+
+class TopicOverview(models.Model):
+    """
+    Cached topic overview, shared by every student opening the topic.
+    Keyed by the corpus and prompt versions it was generated from so stale overviews are never served.
+    """
+    topic = models.ForeignKey(Topic, on_delete=models.CASCADE, related_name='overviews')
+    corpus_version = models.CharField(max_length=64)
+    prompt_version = models.IntegerField()
+    content = models.TextField()
+    generated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-generated_at']
+        unique_together = ['topic', 'corpus_version', 'prompt_version']
+
+    def __str__(self):
+        return f'{self.topic.name} overview ({self.corpus_version}, v{self.prompt_version})'
+
+
+class CachedAnswer(models.Model):
+    """
+    Previously generated tutor answer, served again for semantically similar questions on the same topic
+    """
+    topic = models.ForeignKey(Topic, on_delete=models.CASCADE, related_name='cached_answers')
+    prompt = models.TextField()
+    embedding = models.BinaryField()  # float32 SBERT embedding of the prompt, L2-normalized
+    response = models.TextField()
+    hit_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['topic', '-last_used_at']
+
+    def __str__(self):
+        return f'{self.topic.name} - {self.prompt[:50]}'
@@ -0,0 +1,101 @@
+import logging
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .models import TopicOverview
+from .rag.combined_generator import OVERVIEW_PROMPT_VERSION, agenerate_topic_overview, generate_topic_overview
+from .rag.retriever import get_retriever
+
+logger = logging.getLogger(__name__)
+
+_topic_locks = {}
+_topic_locks_guard = threading.Lock()
+
+
+def _topic_lock(topic_id):
+    with _topic_locks_guard:
+        return _topic_locks.setdefault(topic_id, threading.Lock())
+
+
+def lookup_overview(topic, index_path, corpus_path):
+    """
+    Return the cached overview for a topic, or None if there is no fresh one for the current corpus
+    """
+    corpus_version = get_retriever(index_path, corpus_path).version
+    cutoff = timezone.now() - settings.TOPIC_OVERVIEW_CACHE_TTL
+
+    overview = TopicOverview.objects.filter(
+        topic=topic,
+        corpus_version=corpus_version,
+        prompt_version=OVERVIEW_PROMPT_VERSION,
+        generated_at__gte=cutoff
+    ).first()
+    return overview.content if overview else None
+
+
+def store_overview(topic, index_path, corpus_path, content):
+    """
+    Cache a generated overview and drop the topic's expired ones. Overviews for other corpus versions are
+    kept, since hosts can serve different builds while a new one rolls out.
+    """
+    corpus_version = get_retriever(index_path, corpus_path).version
+
+    overview, _ = TopicOverview.objects.update_or_create(
+        topic=topic,
+        corpus_version=corpus_version,
+        prompt_version=OVERVIEW_PROMPT_VERSION,
+        defaults={'content': content, 'generated_at': timezone.now()}
+    )
+    TopicOverview.objects.filter(
+        topic=topic,
+        generated_at__lt=timezone.now() - settings.TOPIC_OVERVIEW_CACHE_TTL
+    ).delete()
+    return overview
+
+
+def get_topic_overview(topic, index_path, corpus_path):
+    """
+    Return the topic overview from the cache, generating and caching it on a miss.
+    Concurrent misses for the same topic in this process wait for a single generation.
+    """
+    content = lookup_overview(topic, index_path, corpus_path)
+    if content is not None:
+        return content
+
+    with _topic_lock(topic.id):
+        content = lookup_overview(topic, index_path, corpus_path)
+        if content is not None:
+            return content
+
+        logger.info(f"Generating overview for topic {topic.id}")
+        content = generate_topic_overview(topic.name, index_path, corpus_path, subject_name=topic.subject.name)
+        store_overview(topic, index_path, corpus_path, content)
+        return content
+
+
+async def aget_topic_overview(topic, index_path, corpus_path):
+    """
+    Async version of get_topic_overview
+    """
+    content = await sync_to_async(lookup_overview)(topic, index_path, corpus_path)
+    if content is not None:
+        return content
+
+    logger.info(f"Generating overview for topic {topic.id}")
+    content = await agenerate_topic_overview(topic.name, index_path, corpus_path, subject_name=topic.subject.name)
+    await sync_to_async(store_overview)(topic, index_path, corpus_path, content)
+    return content
+
+
+def invalidate_overviews(topics=None):
+    """
+    Delete cached overviews for the given topics, or for every topic when none are given
+    """
+    overviews = TopicOverview.objects.all()
+    if topics is not None:
+        overviews = overviews.filter(topic__in=topics)
+    deleted, _ = overviews.delete()
+    return deleted
@@ -1,24 +1,75 @@
 from openai import OpenAI
-from .retriever_test import query_faiss
+from edugen.llm import get_async_client
+from .context_builder import DEFAULT_CONTEXT_TOKENS, build_context
+from .reranker import RERANK_CANDIDATES, RERANK_ENABLED, RERANK_TOP_K, get_reranker
+from .retriever import get_retriever
+import asyncio
+import logging
 import os
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 client = OpenAI(
     api_key=os.getenv("OPENAI_API_KEY"),
 )
 
+# Bump whenever the overview prompt changes so cached topic overviews are regenerated
+OVERVIEW_PROMPT_VERSION = 2
+
+# Chunks retrieved per prompt; the context token budget decides how many of them make it in
+RETRIEVAL_TOP_K = 8
+
 
-def generate_topic_overview(topic_name, index_path, corpus_path):
+def retrieve_context(query, index_path, corpus_path, topic_name=None, subject_name=None,
+                     context_tokens=DEFAULT_CONTEXT_TOKENS, rerank=RERANK_ENABLED):
     """
-    Generate an overview of the topic
+    Retrieve chunks for a query, restricted to the topic's chunks, and pack them into a token-budgeted context.
+    With rerank, RERANK_CANDIDATES chunks are retrieved and only the RERANK_TOP_K best by cross-encoder score
+    are packed; if reranking runs out of time the first RETRIEVAL_TOP_K chunks in retrieval order are packed.
+    The context dict also holds the time spent in each stage and whether the chunks were reranked.
+    """
+    started = time.perf_counter()
+    retrieved_results = get_retriever(index_path, corpus_path).search(
+        query, top_k=RERANK_CANDIDATES if rerank else RETRIEVAL_TOP_K, topic=topic_name, subject=subject_name
+    )
+    timings = {'retrieve_ms': (time.perf_counter() - started) * 1000}
+
+    reranked = False
+    results = retrieved_results[:RETRIEVAL_TOP_K]
+    if rerank:
+        reranking = get_reranker().rerank(query, retrieved_results, top_k=RERANK_TOP_K)
+        timings['rerank_ms'] = reranking['seconds'] * 1000
+        reranked = reranking['reranked']
+        if reranked:
+            results = reranking['results']
+
+    packing_started = time.perf_counter()
+    context = build_context(results, max_tokens=context_tokens)
+    timings['pack_ms'] = (time.perf_counter() - packing_started) * 1000
+    timings['total_ms'] = (time.perf_counter() - started) * 1000
+    context['timings'] = timings
+    context['reranked'] = reranked
+
+    logger.debug(
+        f"Prompt context: {context['tokens']} tokens from {len(context['chunk_ids'])} of {len(retrieved_results)} "
+        f"chunks ({context['duplicates']} duplicate, truncated={context['truncated']}, reranked={reranked}); "
+        + ", ".join(f"{stage} {ms:.1f}" for stage, ms in timings.items())
+    )
+    return context
+
+
+def build_overview_prompt(topic_name, index_path, corpus_path, subject_name=None):
+    """
+    Retrieve curriculum material for a topic and build the overview prompt
     """
     query = f"Give me an overview of the topic {topic_name}"
-    retrieved_results = query_faiss(query, index_path, corpus_path)
-    retrieved_text = "\n".join([f"{idx + 1}. {content}" for idx, (content, _) in enumerate(retrieved_results)])
+    retrieved_text = retrieve_context(query, index_path, corpus_path, topic_name, subject_name)['text']
 
-    prompt = (
+    return (
         "You are EduGen, a friendly and professional grade 6 science tutor. You specialize in making complex topics "
         "easy to understand for 11-12 year old students.\n\n"
         f"Based on the following curriculum material about {topic_name}:\n{retrieved_text}\n\n"
@@ -29,6 +80,52 @@ def generate_topic_overview(topic_name, index_path, corpus_path):
         "Keep your response friendly and conversational, suitable for a grade 6 student."
     )
 
+
+def build_response_prompt(query, index_path, corpus_path, topic_name=None, subject_name=None):
+    """
+    Retrieve curriculum material for a student's question and build the answer prompt
+    """
+    # Retrieve content using the resident FAISS retriever, within the prompt's context budget
+    retrieved_text = retrieve_context(query, index_path, corpus_path, topic_name, subject_name)['text']
+
+    context = f"about {topic_name}" if topic_name else ""
+
+    return (
+        "You are EduGen, a friendly and professional grade 6 science tutor. Your responses should be:\n"
+        "- Clear and easy to understand for 11-12 year olds\n"
+        "- Engaging and conversational\n"
+        "- Include relevant examples or analogies when possible\n"
+        "- Encourage curiosity and critical thinking\n\n"
+        f"Based on the following curriculum material {context}:\n{retrieved_text}\n\n"
+        f"Question: {query}\n\n"
+        "Respond in a friendly, encouraging way that helps the student understand the concept clearly."
+    )
+
+
+def stream_completion(prompt, **kwargs):
+    """
+    Yield the completion text for a prompt piece by piece as the tokens arrive
+    """
+    stream = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[{
+            "role": "user",
+            "content": prompt
+        }],
+        stream=True,
+        **kwargs
+    )
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def generate_topic_overview(topic_name, index_path, corpus_path, subject_name=None):
+    """
+    Generate an overview of the topic
+    """
+    prompt = build_overview_prompt(topic_name, index_path, corpus_path, subject_name=subject_name)
+
     response = client.chat.completions.create(
         model="gpt-4o-mini",
         messages=[{
@@ -40,29 +137,57 @@ def generate_topic_overview(topic_name, index_path, corpus_path):
     return response.choices[0].message.content
 
 
-def generate_response_with_retrieval(query, index_path, corpus_path, topic_name=None):
+async def agenerate_topic_overview(topic_name, index_path, corpus_path, subject_name=None):
     """
-    Generate a response to a student's question using a combination of retrieval and GPT-4o
+    Async version of generate_topic_overview; retrieval runs in a thread and the LLM call is awaited
     """
-    # Retrieve content using FAISS
-    retrieved_results = query_faiss(query, index_path, corpus_path)
-    retrieved_text = "\n".join([f"{idx + 1}. {content}" for idx, (content, _) in enumerate(retrieved_results)])
+    prompt = await asyncio.to_thread(build_overview_prompt, topic_name, index_path, corpus_path, subject_name)
+
+    response = await get_async_client().chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[{
+            "role": "user",
+            "content": prompt
+        }],
+        max_tokens=500
+    )
+    return response.choices[0].message.content
+
+
+def stream_topic_overview(topic_name, index_path, corpus_path, subject_name=None):
+    """
+    Stream an overview of the topic token by token
+    """
+    prompt = build_overview_prompt(topic_name, index_path, corpus_path, subject_name=subject_name)
+    yield from stream_completion(prompt, max_tokens=500)
 
-    context = f"about {topic_name}" if topic_name else ""
+
+def generate_response_with_retrieval(query, index_path, corpus_path, topic_name=None, subject_name=None):
+    """
+    Generate a response to a student's question using a combination of retrieval and GPT-4o
+    """
+    prompt = build_response_prompt(query, index_path, corpus_path, topic_name=topic_name, subject_name=subject_name)
 
     # Generate response using GPT
-    prompt = (
-        "You are EduGen, a friendly and professional grade 6 science tutor. Your responses should be:\n"
-        "- Clear and easy to understand for 11-12 year olds\n"
-        "- Engaging and conversational\n"
-        "- Include relevant examples or analogies when possible\n"
-        "- Encourage curiosity and critical thinking\n\n"
-        f"Based on the following curriculum material {context}:\n{retrieved_text}\n\n"
-        f"Question: {query}\n\n"
-        "Respond in a friendly, encouraging way that helps the student understand the concept clearly."
+    response = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[{
+            "role": "user",
+            "content": prompt
+        }],
+        max_tokens=800,
+        temperature=0.7
     )
+    return response.choices[0].message.content
 
-    response = client.chat.completions.create(
+
+async def agenerate_response_with_retrieval(query, index_path, corpus_path, topic_name=None, subject_name=None):
+    """
+    Async version of generate_response_with_retrieval; retrieval runs in a thread and the LLM call is awaited
+    """
+    prompt = await asyncio.to_thread(build_response_prompt, query, index_path, corpus_path, topic_name, subject_name)
+
+    response = await get_async_client().chat.completions.create(
         model="gpt-4o-mini",
         messages=[{
             "role": "user",
@@ -73,6 +198,14 @@ def generate_response_with_retrieval(query, index_path, corpus_path, topic_name=
     )
     return response.choices[0].message.content
 
+
+def stream_response_with_retrieval(query, index_path, corpus_path, topic_name=None, subject_name=None):
+    """
+    Stream a response to a student's question token by token as GPT-4o generates it
+    """
+    prompt = build_response_prompt(query, index_path, corpus_path, topic_name=topic_name, subject_name=subject_name)
+    yield from stream_completion(prompt, max_tokens=800, temperature=0.7)
+
 if __name__ == "__main__":
     query = "Explain the topic of animals."
     response = generate_response_with_retrieval(query, '../rag_preprocessing/faiss_index',
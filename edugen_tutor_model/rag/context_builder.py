@@ -0,0 +1,77 @@
+import re
+
+from edugen_tutor_model.rag_preprocessing.chunker import SENTENCE_PATTERN
+
+from .tokens import count_tokens
+
+# Retrieved material per prompt: about five 200-token chunks, enough for a grade 6 answer while
+# keeping prompt size, cost and completion latency the same whatever the chunks look like
+DEFAULT_CONTEXT_TOKENS = 1000
+
+# Lines are joined with a newline, which costs at most one token
+SEPARATOR_TOKENS = 1
+
+
+def normalize_sentence(sentence):
+    return re.sub(r'\s+', ' ', sentence).strip().casefold()
+
+
+def split_header(result):
+    """
+    Separate the "Topic > Section: " header path the chunker puts in front of a chunk from its text
+    """
+    section = (result.get('metadata') or {}).get('section')
+    content = result['content']
+    if section and content.startswith(f"{section}: "):
+        return f"{section}: ", content[len(section) + 2:]
+    return "", content
+
+
+def build_context(results, max_tokens=DEFAULT_CONTEXT_TOKENS):
+    """
+    Pack ranked retrieval results into numbered lines of at most max_tokens tokens, in rank order.
+    Sentences already packed from a higher-ranked chunk (such as the overlap between neighbouring chunks)
+    are left out, and a chunk whose sentences were all packed is skipped. The chunk that does not fit is
+    cut at a sentence boundary and packing stops there.
+    Returns a dict with the context text, its token count, the ids of the chunks used, how many chunks
+    were skipped as duplicates and whether the context was truncated.
+    """
+    lines = []
+    chunk_ids = []
+    seen = set()
+    used_tokens = 0
+    duplicates = 0
+    truncated = False
+
+    for result in results:
+        prefix, text = split_header(result)
+        sentences = [s for s in SENTENCE_PATTERN.split(text) if normalize_sentence(s) not in seen]
+        if not sentences:
+            duplicates += 1
+            continue
+
+        remaining = max_tokens - used_tokens - (SEPARATOR_TOKENS if lines else 0)
+        line_prefix = f"{len(lines) + 1}. {prefix}"
+        kept = list(sentences)
+        while kept and count_tokens(line_prefix + " ".join(kept)) > remaining:
+            kept.pop()
+            truncated = True
+        if not kept:
+            break
+
+        line = line_prefix + " ".join(kept)
+        lines.append(line)
+        chunk_ids.append(result['id'])
+        seen.update(normalize_sentence(s) for s in kept)
+        used_tokens += count_tokens(line) + (SEPARATOR_TOKENS if len(lines) > 1 else 0)
+        if truncated:
+            break
+
+    text = "\n".join(lines)
+    return {
+        'text': text,
+        'tokens': count_tokens(text),
+        'chunk_ids': chunk_ids,
+        'duplicates': duplicates,
+        'truncated': truncated,
+    }
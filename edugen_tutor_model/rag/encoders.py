@@ -0,0 +1,255 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ENCODER_BACKENDS = ('torch', 'onnx')
+# Which encoder the retriever uses; onnx needs an exported model directory (see export_onnx)
+ENCODER_BACKEND = os.getenv('RAG_ENCODER_BACKEND', 'torch')
+ONNX_ENCODER_PATH = os.getenv('RAG_ONNX_ENCODER_PATH', '')
+# ONNX Runtime threads per encode call; 0 lets ONNX Runtime use every core
+ONNX_INTRA_OP_THREADS = int(os.getenv('RAG_ONNX_INTRA_OP_THREADS', '0'))
+
+ENCODER_CONFIG = 'encoder.json'
+# Lowest cosine similarity to the PyTorch embeddings an exported model may have on any check text.
+# int8 weights move embeddings a little; anything below this would reorder retrieval results.
+DEFAULT_MIN_AGREEMENT = {False: 0.9999, True: 0.99}
+DEFAULT_BATCH_SIZE = 32
+
+
+def mean_pool(token_embeddings, attention_mask):
+    """
+    Average the token embeddings of each text over its non-padding tokens, as SentenceTransformer Pooling does
+    """
+    mask = attention_mask[:, :, np.newaxis].astype(token_embeddings.dtype)
+    counts = np.clip(mask.sum(axis=1), 1e-9, None)
+    return (token_embeddings * mask).sum(axis=1) / counts
+
+
+def l2_normalize(embeddings):
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.where(norms == 0, 1, norms)
+
+
+def cosine_agreement(reference, candidate):
+    """
+    Cosine similarity between corresponding rows of two embedding matrices
+    """
+    return np.sum(l2_normalize(reference) * l2_normalize(candidate), axis=1)
+
+
+class OnnxEncoder:
+    """
+    SentenceTransformer-compatible encoder running an exported transformer with ONNX Runtime.
+    Tokenization, mean pooling and normalization run in numpy, so serving does not import torch.
+    """
+
+    def __init__(self, path, intra_op_threads=ONNX_INTRA_OP_THREADS):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(path, ENCODER_CONFIG)) as f:
+            self.config = json.load(f)
+        self.model_name = self.config['model_name']
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(path, 'tokenizer.json'))
+        self.tokenizer.enable_truncation(max_length=self.config['max_seq_length'])
+        self.tokenizer.enable_padding(pad_id=self.config['pad_token_id'], pad_token=self.config['pad_token'])
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(path, self.config['model_file']), options, providers=['CPUExecutionProvider']
+        )
+        self._input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def get_sentence_embedding_dimension(self):
+        return self.config['dimension']
+
+    def _encode_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        inputs = {
+            'input_ids': np.array([e.ids for e in encodings], dtype='int64'),
+            'attention_mask': np.array([e.attention_mask for e in encodings], dtype='int64'),
+            'token_type_ids': np.array([e.type_ids for e in encodings], dtype='int64'),
+        }
+        (token_embeddings,) = self.session.run(None, {k: v for k, v in inputs.items() if k in self._input_names})
+        embeddings = mean_pool(token_embeddings, inputs['attention_mask'])
+        if self.config['normalize']:
+            embeddings = l2_normalize(embeddings)
+        return embeddings
+
+    def encode(self, texts, batch_size=DEFAULT_BATCH_SIZE, normalize_embeddings=False, **kwargs):
+        """
+        Encode texts into a float32 array, accepting the SentenceTransformer.encode arguments the repo uses
+        """
+        if isinstance(texts, str):
+            return self.encode([texts], batch_size, normalize_embeddings)[0]
+        if not texts:
+            return np.zeros((0, self.config['dimension']), dtype='float32')
+
+        # Sorting by length keeps padding, and so wasted compute, low within each batch
+        order = np.argsort([len(text) for text in texts])
+        embeddings = np.empty((len(texts), self.config['dimension']), dtype='float32')
+        for start in range(0, len(texts), batch_size):
+            positions = order[start:start + batch_size]
+            embeddings[positions] = self._encode_batch([texts[i] for i in positions])
+        if normalize_embeddings:
+            embeddings = l2_normalize(embeddings)
+        return embeddings
+
+
+def load_torch_encoder(model_name, path=None):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+
+def load_onnx_encoder(model_name, path=None):
+    if not path:
+        raise ValueError("The onnx encoder backend needs the path of an exported model (RAG_ONNX_ENCODER_PATH)")
+    encoder = OnnxEncoder(path)
+    # Query vectors must come from the model the index was built with
+    if encoder.model_name != model_name:
+        raise ValueError(f"ONNX encoder at {path} was exported from {encoder.model_name}, expected {model_name}")
+    return encoder
+
+
+ENCODER_LOADERS = {'torch': load_torch_encoder, 'onnx': load_onnx_encoder}
+
+
+def load_encoder(model_name, backend='torch', path=None):
+    """
+    Load the sentence encoder for a model with the given backend: PyTorch SentenceTransformer or ONNX Runtime
+    """
+    if backend not in ENCODER_LOADERS:
+        raise ValueError(f"Unknown encoder backend {backend!r}, expected one of {', '.join(ENCODER_BACKENDS)}")
+    return ENCODER_LOADERS[backend](model_name, path)
+
+
+def export_onnx(model_name, output_dir, quantize=False, check_texts=(), min_agreement=None):
+    """
+    Export a mean-pooling SentenceTransformer to ONNX, optionally with int8 dynamically quantized weights.
+    The export only replaces output_dir if its embeddings of check_texts agree with the PyTorch model's to
+    at least min_agreement cosine similarity, so vectors from either backend can query the same index.
+    Returns the agreement statistics.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device='cpu')
+    module_types = [type(module).__name__ for module in model]
+    pooling = next((module for module in model if type(module).__name__ == 'Pooling'), None)
+    pooling_mode = getattr(pooling, 'pooling_mode', None) or (pooling and pooling.get_pooling_mode_str())
+    if module_types[0] != 'Transformer' or pooling_mode != 'mean':
+        raise ValueError(f"Only Transformer + mean pooling models can be exported, {model_name} has {module_types}")
+
+    tmp_dir = f"{output_dir.rstrip(os.sep)}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    model.tokenizer.save_pretrained(tmp_dir)
+
+    class TokenEmbeddings(torch.nn.Module):
+        # The graph outputs only the token embeddings; pooling and normalization run in numpy
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.auto_model(
+                input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids
+            ).last_hidden_state
+
+    dummy = model.tokenizer(["an example sentence", "another"], padding=True, return_tensors='pt')
+    inputs = tuple(
+        dummy[name] if name in dummy else torch.zeros_like(dummy['input_ids'])
+        for name in ('input_ids', 'attention_mask', 'token_type_ids')
+    )
+    onnx_path = os.path.join(tmp_dir, 'model.onnx')
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in ('input_ids', 'attention_mask', 'token_type_ids')}
+    dynamic_axes['token_embeddings'] = {0: 'batch', 1: 'sequence'}
+    with torch.no_grad():
+        torch.onnx.export(
+            TokenEmbeddings(model[0].auto_model.eval()),
+            inputs,
+            onnx_path,
+            input_names=['input_ids', 'attention_mask', 'token_type_ids'],
+            output_names=['token_embeddings'],
+            dynamic_axes=dynamic_axes,
+            opset_version=17,
+            dynamo=False,
+        )
+
+    model_file = 'model.onnx'
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        model_file = 'model_quantized.onnx'
+        quantize_dynamic(onnx_path, os.path.join(tmp_dir, model_file), weight_type=QuantType.QInt8)
+        os.remove(onnx_path)
+
+    config = {
+        'model_name': model_name,
+        'model_file': model_file,
+        'quantized': quantize,
+        'dimension': model.get_sentence_embedding_dimension(),
+        'max_seq_length': model.max_seq_length,
+        'normalize': 'Normalize' in module_types,
+        'pad_token': model.tokenizer.pad_token,
+        'pad_token_id': model.tokenizer.pad_token_id,
+    }
+    with open(os.path.join(tmp_dir, ENCODER_CONFIG), 'w') as f:
+        json.dump(config, f, indent=2)
+
+    check_texts = list(check_texts) or ["What do plants need to make food?", "How does the heart pump blood?"]
+    reference = model.encode(check_texts, convert_to_numpy=True)
+    agreement = cosine_agreement(reference, OnnxEncoder(tmp_dir).encode(check_texts))
+    min_agreement = DEFAULT_MIN_AGREEMENT[quantize] if min_agreement is None else min_agreement
+    config['agreement'] = {
+        'texts': len(check_texts),
+        'min_cosine': float(agreement.min()),
+        'mean_cosine': float(agreement.mean()),
+        'threshold': min_agreement,
+    }
+    if agreement.min() < min_agreement:
+        shutil.rmtree(tmp_dir)
+        raise ValueError(
+            f"ONNX embeddings disagree with {model_name}: min cosine {agreement.min():.5f} < {min_agreement}"
+        )
+
+    with open(os.path.join(tmp_dir, ENCODER_CONFIG), 'w') as f:
+        json.dump(config, f, indent=2)
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.replace(tmp_dir, output_dir)
+    return config['agreement']
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export the SBERT encoder to ONNX and check it agrees with PyTorch",
+        epilog="Run from the repository root: python -m edugen_tutor_model.rag.encoders"
+    )
+    parser.add_argument('--model', default="all-MiniLM-L6-v2")
+    parser.add_argument('--output', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'onnx_encoder'))
+    parser.add_argument('--quantize', action='store_true', help="Dynamically quantize weights to int8")
+    parser.add_argument('--corpus', help="corpus.csv or chunk TSV whose content is used for the agreement check")
+    parser.add_argument('--check-size', type=int, default=200, help="Texts sampled from the corpus for the check")
+    parser.add_argument('--min-agreement', type=float, help="Lowest acceptable cosine (default 0.9999, 0.99 for int8)")
+    args = parser.parse_args()
+
+    texts = []
+    if args.corpus:
+        import pandas as pd
+
+        sep = '\t' if args.corpus.endswith('.tsv') else ','
+        contents = pd.read_csv(args.corpus, sep=sep)['content'].dropna()
+        texts = contents.sample(min(args.check_size, len(contents)), random_state=0).tolist()
+
+    logging.basicConfig(level=logging.INFO)
+    result = export_onnx(args.model, args.output, quantize=args.quantize, check_texts=texts,
+                         min_agreement=args.min_agreement)
+    print(f"Exported {args.model} to {args.output}: {result}")
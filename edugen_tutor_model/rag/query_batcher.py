@@ -0,0 +1,96 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# Searches encoded and run together at most; 1 turns batching off
+QUERY_BATCH_MAX_SIZE = int(os.getenv('RAG_QUERY_BATCH_MAX_SIZE', '32'))
+# How long a batch waits for more searches to arrive while the retriever is under concurrent load
+QUERY_BATCH_MAX_WAIT_MS = float(os.getenv('RAG_QUERY_BATCH_MAX_WAIT_MS', '5'))
+
+
+class QueryBatcher:
+    """
+    Collects searches submitted concurrently from request threads and runs them as one batch on a
+    worker thread: one model.encode call for all queries and one index search per set of filters.
+    A search submitted while the retriever is idle runs straight away; once batches of more than one
+    search are forming, the worker waits up to max_wait for the batch to fill.
+    """
+
+    def __init__(self, search_many, max_batch_size=QUERY_BATCH_MAX_SIZE, max_wait=QUERY_BATCH_MAX_WAIT_MS / 1000):
+        self._search_many = search_many
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._lock = threading.Lock()
+        self._queue = None
+        self._worker = None
+        self._worker_pid = None
+        self._pending = 0
+        self.batches = 0
+        self.searches = 0
+
+    def submit(self, request):
+        """
+        Queue a search and block until its batch has run; exceptions from the batch are re-raised here
+        """
+        future = Future()
+        with self._lock:
+            work_queue = self._ensure_worker()
+            self._pending += 1
+        work_queue.put((request, future))
+        return future.result()
+
+    def _ensure_worker(self):
+        # A worker started before the process forked (e.g. in a preloading server master) does not run in the child
+        if self._worker is None or self._worker_pid != os.getpid() or not self._worker.is_alive():
+            self._queue = queue.SimpleQueue()
+            self._pending = 0
+            self._worker = threading.Thread(
+                target=self._run, args=(self._queue,), name='retriever-query-batcher', daemon=True
+            )
+            self._worker_pid = os.getpid()
+            self._worker.start()
+        return self._queue
+
+    def _take(self, work_queue, timeout=None):
+        """
+        Take the next queued search, waiting up to timeout seconds (forever for None, not at all for 0)
+        """
+        item = work_queue.get(block=timeout != 0, timeout=timeout or None)
+        with self._lock:
+            self._pending -= 1
+        return item
+
+    def _run(self, work_queue):
+        last_batch_size = 1
+        while True:
+            batch = [self._take(work_queue)]
+            with self._lock:
+                under_load = self._pending > 0 or last_batch_size > 1
+            deadline = time.monotonic() + (self.max_wait if under_load else 0)
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self._take(work_queue, timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            last_batch_size = len(batch)
+
+            requests = [request for request, _ in batch]
+            try:
+                results = self._search_many(requests)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+            self.batches += 1
+            self.searches += len(batch)
+            logger.debug(f"Ran a batch of {len(batch)} searches")
+
@@ -0,0 +1,68 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+# Query embeddings kept per retriever (384 float32 values, 1.5 KB each for MiniLM); 0 turns the cache off
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv('RAG_QUERY_EMBEDDING_CACHE_SIZE', '4096'))
+# Search results kept per retriever, keyed by index version so a reload never serves stale chunks
+SEARCH_RESULT_CACHE_SIZE = int(os.getenv('RAG_SEARCH_RESULT_CACHE_SIZE', '1024'))
+
+
+def normalize_query(text):
+    """
+    Cache key for a query: case and whitespace differences do not change an uncased SBERT model's embedding
+    """
+    return re.sub(r'\s+', ' ', text).strip().casefold()
+
+
+class LRUCache:
+    """
+    Bounded, thread-safe mapping that evicts the least recently used entry and counts hits and misses
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Return the cached value for key, or None on a miss
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+        }
@@ -0,0 +1,149 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+logger = logging.getLogger(__name__)
+
+# Rerank retrieved chunks with a cross-encoder before they are packed into the prompt
+RERANK_ENABLED = os.getenv('RAG_RERANK', 'False') == 'True'
+RERANKER_MODEL = os.getenv('RAG_RERANKER_MODEL', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+# Chunks retrieved for the cross-encoder to score, and how many of the best it keeps for the prompt
+RERANK_CANDIDATES = int(os.getenv('RAG_RERANK_CANDIDATES', '10'))
+RERANK_TOP_K = int(os.getenv('RAG_RERANK_TOP_K', '2'))
+# Longest a request waits for reranking before its chunks are used in retrieval order
+RERANK_TIME_BUDGET_MS = float(os.getenv('RAG_RERANK_TIME_BUDGET_MS', '150'))
+# Requests reranked at once; each cross-encoder call already uses every core through torch
+RERANK_WORKERS = int(os.getenv('RAG_RERANK_WORKERS', '2'))
+# Pairs scored per model call; an abandoned rerank stops at the next batch
+RERANK_BATCH_SIZE = 8
+
+
+class Reranker:
+    """
+    Reorders retrieved chunks by a cross-encoder's query/chunk relevance score, within a time budget.
+    Scoring runs on a small worker pool so a request never waits longer than the budget: when it runs
+    out, or the model fails, the chunks are returned in retrieval order and the scoring is abandoned.
+    """
+
+    def __init__(self, model_name=RERANKER_MODEL, time_budget=RERANK_TIME_BUDGET_MS / 1000, workers=RERANK_WORKERS,
+                 batch_size=RERANK_BATCH_SIZE):
+        self.model_name = model_name
+        self.time_budget = time_budget
+        self.workers = workers
+        self.batch_size = batch_size
+
+        self._model = None
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self.reranked = 0
+        self.fallbacks = 0
+        self.rerank_seconds = 0.0
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+
+                    logger.info(f"Loading cross-encoder {self.model_name}")
+                    self._model = CrossEncoder(self.model_name, device='cpu')
+        return self._model
+
+    def _ensure_executor(self):
+        # Worker threads started before the process forked (e.g. in a preloading server master) do not run in the child
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='retrieval-reranker')
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def score(self, query, contents, cancelled=None):
+        """
+        Cross-encoder relevance score of each content for the query, scored batch_size pairs at a time.
+        Returns None if cancelled is set before every batch has been scored.
+        """
+        scores = []
+        for start in range(0, len(contents), self.batch_size):
+            if cancelled is not None and cancelled.is_set():
+                return None
+            batch = [(query, content) for content in contents[start:start + self.batch_size]]
+            predictions = self.model.predict(batch, batch_size=self.batch_size, show_progress_bar=False)
+            scores.extend(float(score) for score in predictions)
+        return scores
+
+    def rerank(self, query, results, top_k=RERANK_TOP_K):
+        """
+        Return the top_k retrieval results by cross-encoder score, each with a rerank_score, as a dict
+        with the results, whether they were reranked and the seconds spent. If scoring does not finish
+        within the time budget or fails, every result is returned in its original order instead.
+        """
+        started = time.monotonic()
+        if not results:
+            return {'results': [], 'reranked': False, 'seconds': 0.0}
+
+        cancelled = threading.Event()
+        future = self._ensure_executor().submit(self.score, query, [result['content'] for result in results], cancelled)
+        try:
+            scores = future.result(timeout=self.time_budget)
+        except FutureTimeoutError:
+            cancelled.set()
+            scores = None
+            logger.info(
+                f"Reranking {len(results)} chunks exceeded {self.time_budget * 1000:.0f} ms, using retrieval order"
+            )
+        except Exception as e:
+            scores = None
+            logger.warning(f"Reranking failed, using retrieval order: {e}")
+        seconds = time.monotonic() - started
+
+        if scores is None:
+            self.fallbacks += 1
+            return {'results': results, 'reranked': False, 'seconds': seconds}
+
+        self.reranked += 1
+        self.rerank_seconds += seconds
+        order = sorted(range(len(results)), key=lambda i: scores[i], reverse=True)[:top_k]
+        return {
+            'results': [{**results[i], 'rerank_score': scores[i]} for i in order],
+            'reranked': True,
+            'seconds': seconds,
+        }
+
+    def warm_up(self):
+        """
+        Load the cross-encoder and score one pair so the first request is not slow
+        """
+        started = time.monotonic()
+        # Scores in the calling thread so no worker starts in a server master that forks afterwards
+        self.score("warm up", ["warm up"])
+        logger.info(f"Reranker warmed up in {time.monotonic() - started:.2f}s")
+
+    def as_dict(self):
+        return {
+            'model': self.model_name,
+            'time_budget_ms': self.time_budget * 1000,
+            'reranked': self.reranked,
+            'fallbacks': self.fallbacks,
+            'mean_rerank_ms': self.rerank_seconds / self.reranked * 1000 if self.reranked else 0.0,
+        }
+
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker():
+    """
+    Return the process-wide reranker
+    """
+    global _reranker
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                _reranker = Reranker()
+    return _reranker
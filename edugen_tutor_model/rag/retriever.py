@@ -0,0 +1,512 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+
+import faiss
+import numpy as np
+
+from edugen_tutor_model.rag_preprocessing.bm25_index import BM25Index, bm25_index_path
+from edugen_tutor_model.rag_preprocessing.chunk_store import open_chunks
+from edugen_tutor_model.rag_preprocessing.embeddings_indexing import (
+    apply_search_params,
+    index_metadata_path,
+    load_index_metadata,
+    read_index,
+)
+from edugen_tutor_model.rag_preprocessing.ingest import file_hash
+
+from .encoders import ENCODER_BACKEND, ONNX_ENCODER_PATH, load_encoder
+from .query_batcher import QUERY_BATCH_MAX_SIZE, QUERY_BATCH_MAX_WAIT_MS, QueryBatcher
+from .query_cache import QUERY_EMBEDDING_CACHE_SIZE, SEARCH_RESULT_CACHE_SIZE, LRUCache, normalize_query
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# When no chunk matches every filter, the most specific filter is dropped first
+FILTER_RELAXATION_ORDER = ('topic', 'grade', 'subject')
+
+# Reciprocal rank fusion of the dense and BM25 rankings: a chunk scores 1 / (RRF_K + rank) in each
+# ranking it appears in, over the top RRF_CANDIDATES of each. 60 is the constant from the RRF paper.
+RRF_K = 60
+RRF_CANDIDATES = 20
+
+
+def reciprocal_rank_fusion(*rankings, k=RRF_K):
+    """
+    Fuse ranked lists of chunk ids into (chunk id, fused score) pairs, best first
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def normalize_filter_value(value):
+    return str(value).strip().casefold()
+
+
+def file_signature(*paths):
+    """
+    Identify the on-disk state of the given files by size and modification time
+    """
+    signature = []
+    for path in paths:
+        stat = os.stat(path)
+        signature.append((os.path.abspath(path), stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+def content_version(index_path, corpus_path, metadata):
+    """
+    Identify a build of the index and corpus by content, so every host serving it agrees on the version
+    whatever its paths or file times. Indexes written without a checksum in their metadata are hashed here.
+    """
+    digest = hashlib.sha256()
+    digest.update((metadata.get('checksum') or file_hash(index_path)).encode())
+    digest.update(file_hash(corpus_path).encode())
+    return digest.hexdigest()[:12]
+
+
+def selector_search_params(index, ids):
+    """
+    Search parameters restricting a search to the given ids, keeping the index's own nprobe/efSearch
+    """
+    selector = faiss.IDSelectorBatch(ids)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+class RetrieverState:
+    """
+    A loaded FAISS index together with the chunks it was built from.
+    States are never mutated after construction, so a search holding a reference
+    keeps working while a newer state is swapped in.
+    """
+
+    def __init__(self, index, chunks, signature, version, metadata=None, bm25=None):
+        self.index = index
+        self.chunks = chunks
+        # Lexical index over the same chunks; when present, searches fuse its ranking with the dense one
+        self.bm25 = bm25
+        self.metadata = metadata or {}
+        # Inner-product indexes hold normalized vectors, so queries are normalized and scores are cosine
+        self.metric = self.metadata.get('metric', 'l2')
+        self.signature = signature
+
+        # FAISS returns chunk ids: the corpus id column for ID-mapped indexes, row positions for older ones
+        if hasattr(index, 'id_map'):
+            self.indexed_ids = faiss.vector_to_array(index.id_map)
+        else:
+            self.indexed_ids = np.arange(index.ntotal, dtype='int64')
+        self._id_order = np.argsort(chunks.ids, kind='stable')
+        self._sorted_ids = np.asarray(chunks.ids)[self._id_order]
+        self.bm25_indexed = np.isin(bm25.ids, self.indexed_ids) if bm25 is not None else None
+
+        # Metadata codes per normalized filter value; matching ids are computed on first use
+        self.filter_codes = {}
+        for column in FILTER_RELAXATION_ORDER:
+            if column in chunks.columns:
+                values, _ = chunks.columns[column]
+                codes_by_value = {}
+                for code, value in enumerate(values):
+                    codes_by_value.setdefault(normalize_filter_value(value), []).append(code)
+                self.filter_codes[column] = codes_by_value
+        self._filter_ids = {}
+        self.version = version
+        self.loaded_at = time.time()
+
+    def position(self, chunk_id):
+        """
+        Row of a chunk id in the corpus
+        """
+        i = int(np.searchsorted(self._sorted_ids, chunk_id))
+        if i == len(self._sorted_ids) or self._sorted_ids[i] != chunk_id:
+            raise KeyError(f"Chunk {chunk_id} is not in the corpus")
+        return int(self._id_order[i])
+
+    def unresolved_ids(self):
+        """
+        Indexed ids with no corpus row, which means the index and corpus are from different builds
+        """
+        return self.indexed_ids[~np.isin(self.indexed_ids, self._sorted_ids)]
+
+    def content(self, chunk_id):
+        return self.chunks.content(self.position(chunk_id))
+
+    def chunk_metadata(self, chunk_id):
+        return self.chunks.metadata(self.position(chunk_id))
+
+    def filter_ids(self, column, value):
+        """
+        Ids of the indexed chunks whose metadata column has the given normalized value
+        """
+        key = (column, value)
+        ids = self._filter_ids.get(key)
+        if ids is None:
+            _, codes = self.chunks.columns[column]
+            matching_codes = self.filter_codes[column].get(value, [])
+            ids = np.asarray(self.chunks.ids)[np.isin(codes, matching_codes)].astype('int64')
+            ids = np.sort(ids[np.isin(ids, self.indexed_ids)])
+            self._filter_ids[key] = ids
+        return ids
+
+    def bm25_allowed(self, ids):
+        """
+        Mask over the BM25 index of the chunks a search may return: indexed ones, restricted to ids if given
+        """
+        if ids is None:
+            return self.bm25_indexed
+        return self.bm25_indexed & np.isin(self.bm25.ids, ids)
+
+    def candidate_ids(self, **filters):
+        """
+        Ids of the chunks matching the given metadata filters, relaxing the most specific filter
+        until something matches. Returns None when the search should not be restricted.
+        """
+        filters = {
+            column: normalize_filter_value(value)
+            for column, value in filters.items()
+            if value is not None and column in self.filter_codes
+        }
+        while filters:
+            ids = None
+            for column, value in filters.items():
+                matching = self.filter_ids(column, value)
+                ids = matching if ids is None else np.intersect1d(ids, matching)
+            if len(ids):
+                return ids
+            filters.pop(next(column for column in FILTER_RELAXATION_ORDER if column in filters))
+        return None
+
+
+class Retriever:
+    """
+    Long-lived retriever that keeps the SBERT model, FAISS index and corpus resident in memory.
+    The index and corpus are reloaded and swapped in atomically when the files on disk change.
+    With mmap, the index vectors and a chunk store corpus are memory-mapped read-only, so worker
+    processes on a host share one page-cache copy instead of each holding its own.
+    The encoder runs on PyTorch or, with encoder_backend='onnx', on an ONNX Runtime export (see encoders.py).
+    With max_batch_size above 1, searches from concurrent requests are micro-batched (see QueryBatcher).
+    """
+
+    def __init__(self, index_path, corpus_path, model_name=DEFAULT_MODEL_NAME, reload_interval=5.0, mmap=True,
+                 max_batch_size=QUERY_BATCH_MAX_SIZE, max_batch_wait=QUERY_BATCH_MAX_WAIT_MS / 1000,
+                 encoder_backend=ENCODER_BACKEND, encoder_path=ONNX_ENCODER_PATH,
+                 embedding_cache_size=QUERY_EMBEDDING_CACHE_SIZE, result_cache_size=SEARCH_RESULT_CACHE_SIZE):
+        self.index_path = str(index_path)
+        self.corpus_path = str(corpus_path)
+        self.model_name = model_name
+        self.reload_interval = reload_interval
+        self.mmap = mmap
+        self.encoder_backend = encoder_backend
+        self.encoder_path = encoder_path
+        self.embedding_cache = LRUCache(embedding_cache_size)
+        self.result_cache = LRUCache(result_cache_size)
+        self.batcher = QueryBatcher(self.search_many, max_batch_size, max_batch_wait) if max_batch_size > 1 else None
+
+        self._model = None
+        self._state = None
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    logger.info(f"Loading SBERT model {self.model_name} ({self.encoder_backend} backend)")
+                    self._model = load_encoder(self.model_name, self.encoder_backend, self.encoder_path)
+        return self._model
+
+    @property
+    def state(self):
+        state = self._state
+        if state is None:
+            with self._lock:
+                if self._state is None:
+                    self._state = self._load_state()
+                    self._last_check = time.monotonic()
+            state = self._state
+        else:
+            self._maybe_reload()
+            state = self._state
+        return state
+
+    @property
+    def version(self):
+        return self.state.version
+
+    def _signature(self):
+        # The metadata sidecar is written last by every build, so watching it alone never pairs a new index
+        # with the previous corpus. Indexes built before it existed are watched file by file.
+        metadata_path = index_metadata_path(self.index_path)
+        if os.path.exists(metadata_path):
+            return file_signature(metadata_path)
+        paths = [self.index_path, self.corpus_path]
+        if os.path.exists(bm25_index_path(self.corpus_path)):
+            paths.append(bm25_index_path(self.corpus_path))
+        return file_signature(*paths)
+
+    def _load_state(self):
+        signature = self._signature()
+        # Approximate indexes carry their query-time parameters (nprobe, efSearch) in the metadata sidecar
+        metadata = load_index_metadata(self.index_path)
+        index = self._read_index(metadata)
+        apply_search_params(index, metadata.get('search_params', {}))
+        chunks = open_chunks(self.corpus_path)
+
+        # The index is replaced just before its sidecar, so a load in between reads the previous build's metadata
+        if metadata.get('ntotal', index.ntotal) != index.ntotal:
+            raise ValueError(f"FAISS index has {index.ntotal} vectors but its metadata describes {metadata['ntotal']}")
+        # An index pointing past the end of the corpus means the two files are from different builds
+        if index.ntotal > len(chunks):
+            raise ValueError(
+                f"FAISS index has {index.ntotal} vectors but corpus has only {len(chunks)} rows"
+            )
+        if index.ntotal < len(chunks):
+            logger.warning(f"FAISS index has {index.ntotal} vectors for {len(chunks)} corpus rows")
+
+        bm25 = self._read_bm25(chunks)
+        version = content_version(self.index_path, self.corpus_path, metadata)
+        state = RetrieverState(index, chunks, signature, version, metadata, bm25)
+        unresolved = state.unresolved_ids()
+        if len(unresolved):
+            raise ValueError(f"{len(unresolved)} indexed chunk ids are missing from the corpus, e.g. {unresolved[0]}")
+
+        logger.info(
+            f"Loaded {metadata.get('index_type', 'flat')} retrieval index {self.index_path} ({index.ntotal} vectors"
+            f"{', hybrid with BM25' if bm25 is not None else ''})"
+        )
+        return state
+
+    def _read_bm25(self, chunks):
+        path = bm25_index_path(self.corpus_path)
+        if not os.path.exists(path):
+            return None
+        bm25 = BM25Index(path)
+        # A BM25 index from another build would return chunks the corpus does not have
+        if not np.array_equal(np.sort(bm25.ids), np.sort(np.asarray(chunks.ids))):
+            logger.warning(f"BM25 index {path} does not match the corpus, searching dense only")
+            return None
+        return bm25
+
+    def _read_index(self, metadata):
+        if self.mmap:
+            try:
+                return read_index(self.index_path, metadata, mmap=True)
+            except RuntimeError as e:
+                logger.warning(f"Could not memory-map {self.index_path}, loading it into memory: {e}")
+        return read_index(self.index_path)
+
+    def _maybe_reload(self):
+        """
+        Swap in a freshly loaded state if the index or corpus changed on disk.
+        Only one thread checks per interval; a failed load keeps serving the old state.
+        """
+        now = time.monotonic()
+        if now - self._last_check < self.reload_interval:
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+
+        try:
+            self._last_check = now
+            try:
+                signature = self._signature()
+            except OSError as e:
+                logger.warning(f"Retrieval files unavailable, keeping loaded index: {e}")
+                return
+
+            if signature == self._state.signature:
+                return
+
+            try:
+                new_state = self._load_state()
+            except Exception as e:
+                logger.warning(f"Failed to reload retrieval index, keeping version {self._state.version}: {e}")
+                return
+
+            self._state = new_state
+            logger.info(f"Swapped in retrieval index version {new_state.version}")
+        finally:
+            self._lock.release()
+
+    def encode(self, texts, normalize=None):
+        """
+        Encode a list of texts with the resident SBERT model, reusing cached embeddings of repeated texts.
+        Embeddings are L2-normalized by default when the index uses inner product.
+        """
+        if normalize is None:
+            normalize = self.state.metric == 'ip'
+        if not texts:
+            return self.model.encode(texts, normalize_embeddings=normalize)
+
+        # Repeated queries reuse their cached embedding; the rest are encoded together, each distinct one once
+        keys = [(normalize_query(text), normalize) for text in texts]
+        embeddings = [self.embedding_cache.get(key) for key in keys]
+        missing = {}
+        for key, text, embedding in zip(keys, texts, embeddings):
+            if embedding is None:
+                missing.setdefault(key, text)
+        if missing:
+            encoded = self.model.encode(list(missing.values()), normalize_embeddings=normalize)
+            for key, embedding in zip(missing, encoded):
+                embedding = np.asarray(embedding, dtype='float32')
+                embedding.setflags(write=False)
+                missing[key] = embedding
+                self.embedding_cache.put(key, embedding)
+            embeddings = [missing[key] if embedding is None else embedding for key, embedding in zip(keys, embeddings)]
+        return np.stack(embeddings)
+
+    def search(self, query, top_k=5, topic=None, subject=None, grade=None, min_score=None):
+        """
+        Return the top-k chunks for a query as dicts with id, content, score and chunk metadata.
+        The score is the cosine similarity for inner-product indexes and the squared L2 distance otherwise;
+        min_score drops chunks below a cosine similarity and needs an inner-product index.
+        Topic, subject and grade restrict the search to matching chunks through an ID selector;
+        if no chunk matches, the search falls back to the whole index.
+        When the corpus has a BM25 index, the dense and BM25 rankings are fused with reciprocal rank fusion:
+        score is then the fused score, with dense_score and bm25_score alongside, and min_score keeps only
+        chunks whose dense_score reaches it.
+        Concurrent searches are micro-batched into one encode and index search when batching is enabled,
+        and repeated searches against the same index version are answered from an LRU cache.
+        """
+        state = self.state
+        if min_score is not None and state.metric != 'ip':
+            raise ValueError("min_score needs an inner-product index built from normalized embeddings")
+
+        filters = tuple(None if value is None else normalize_filter_value(value) for value in (topic, subject, grade))
+        cache_key = (state.version, normalize_query(query), top_k, filters, min_score)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            return [dict(result) for result in cached]
+
+        request = {
+            'query': query, 'top_k': top_k, 'topic': topic, 'subject': subject, 'grade': grade, 'min_score': min_score,
+        }
+        if self.batcher is None:
+            results = self.search_many([request])[0]
+        else:
+            results = self.batcher.submit(request)
+        # Results are only cached under the version they were searched in
+        if self._state is state:
+            self.result_cache.put(cache_key, [dict(result) for result in results])
+        return results
+
+    def search_many(self, requests):
+        """
+        Run several searches, given as dicts of search() arguments, with one encode call for all queries
+        and one index search per distinct set of filters. Returns the results in request order.
+        """
+        state = self.state
+        if state.metric != 'ip' and any(request.get('min_score') is not None for request in requests):
+            raise ValueError("min_score needs an inner-product index built from normalized embeddings")
+        query_embeddings = self.encode([request['query'] for request in requests])
+
+        groups = {}
+        for i, request in enumerate(requests):
+            filters = (request.get('topic'), request.get('subject'), request.get('grade'))
+            groups.setdefault(filters, []).append(i)
+
+        results = [None] * len(requests)
+        for (topic, subject, grade), positions in groups.items():
+            top_k = max(requests[i].get('top_k', 5) for i in positions)
+            if state.bm25 is not None:
+                top_k = max(top_k, RRF_CANDIDATES)
+            embeddings = query_embeddings[positions]
+            ids = state.candidate_ids(topic=topic, subject=subject, grade=grade)
+            if ids is None:
+                if topic or subject or grade:
+                    logger.debug(f"No chunks tagged topic={topic!r} subject={subject!r} grade={grade!r}, searching all")
+                distances, indices = state.index.search(embeddings, top_k)
+            else:
+                params = selector_search_params(state.index, ids)
+                distances, indices = state.index.search(embeddings, min(top_k, len(ids)), params=params)
+
+            for row, i in enumerate(positions):
+                request = requests[i]
+                min_score = request.get('min_score')
+                dense = [
+                    (int(idx), float(distance)) for distance, idx in zip(distances[row], indices[row])
+                    if idx != -1 and (min_score is None or distance >= min_score)
+                ]
+                if state.bm25 is None:
+                    results[i] = [
+                        self._result(state, chunk_id, score) for chunk_id, score in dense[:request.get('top_k', 5)]
+                    ]
+                else:
+                    results[i] = self._fuse(state, request, dense, ids)
+        return results
+
+    def _result(self, state, chunk_id, score, **extra):
+        return {
+            'id': chunk_id,
+            'content': state.content(chunk_id),
+            'score': score,
+            'metadata': state.chunk_metadata(chunk_id),
+            **extra,
+        }
+
+    def _fuse(self, state, request, dense, ids):
+        """
+        Fuse the dense ranking with a BM25 ranking over the same candidate chunks. The result score is the
+        fused RRF score, with the dense and BM25 scores alongside (None where a chunk was not in that ranking).
+        With min_score, chunks outside the filtered dense ranking are left out.
+        """
+        bm25_ids, bm25_scores = state.bm25.search(request['query'], RRF_CANDIDATES, state.bm25_allowed(ids))
+        dense_scores = dict(dense)
+        lexical_scores = {int(chunk_id): float(score) for chunk_id, score in zip(bm25_ids, bm25_scores)}
+        fused = reciprocal_rank_fusion([chunk_id for chunk_id, _ in dense], list(lexical_scores))
+        if request.get('min_score') is not None:
+            # The dense candidates already passed the cosine floor; chunks only BM25 found have no cosine to check
+            fused = [(chunk_id, score) for chunk_id, score in fused if chunk_id in dense_scores]
+        return [
+            self._result(
+                state, chunk_id, score,
+                dense_score=dense_scores.get(chunk_id),
+                bm25_score=lexical_scores.get(chunk_id),
+            )
+            for chunk_id, score in fused[:request.get('top_k', 5)]
+        ]
+
+    def cache_stats(self):
+        return {
+            'query_embeddings': self.embedding_cache.as_dict(),
+            'search_results': self.result_cache.as_dict(),
+        }
+
+    def warm_up(self):
+        """
+        Load the model, index and corpus and run one query so the first request is not slow
+        """
+        started = time.monotonic()
+        # Bypass the batcher so no worker thread starts in a server master that forks afterwards
+        self.search_many([{'query': "warm up", 'top_k': 1}])
+        logger.info(f"Retriever warmed up in {time.monotonic() - started:.2f}s")
+
+
+_retrievers = {}
+_retrievers_lock = threading.Lock()
+
+
+def get_retriever(index_path, corpus_path, model_name=DEFAULT_MODEL_NAME, mmap=True):
+    """
+    Return the process-wide retriever for the given index and corpus
+    """
+    key = (os.path.abspath(str(index_path)), os.path.abspath(str(corpus_path)), model_name, mmap)
+    retriever = _retrievers.get(key)
+    if retriever is None:
+        with _retrievers_lock:
+            retriever = _retrievers.get(key)
+            if retriever is None:
+                retriever = Retriever(*key[:3], mmap=mmap)
+                _retrievers[key] = retriever
+    return retriever
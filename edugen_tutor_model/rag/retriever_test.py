@@ -1,28 +1,15 @@
-import faiss
-import numpy as np
-import pandas as pd
-from sentence_transformers import SentenceTransformer
+from edugen_tutor_model.rag.retriever import get_retriever
 
 
 def query_faiss(query, index_path, corpus_path, model_name="all-MiniLM-L6-v2", top_k=5):
     """
     Query the FAISS index and return the top-k results
     """
-    # Load the FAISS index and corpus
-    index = faiss.read_index(index_path)
-    corpus = pd.read_csv(corpus_path)
+    # The retriever keeps the index, corpus and model loaded between calls
+    retriever = get_retriever(index_path, corpus_path, model_name)
+    results = retriever.search(query, top_k=top_k)
 
-    # Encode query
-    model = SentenceTransformer(model_name)
-    query_embedding = model.encode([query])
-
-    # Search index
-    distances, indices = index.search(query_embedding, top_k)
-
-    # Retrieve results
-    results = [(corpus.iloc[idx]['content'], distances[0][i]) for i, idx in enumerate(indices[0])]
-
-    return results
+    return [(result['content'], result['score']) for result in results]
 
 
 if __name__ == "__main__":
@@ -30,4 +17,4 @@ if __name__ == "__main__":
     results = query_faiss(query, '../rag_preprocessing/faiss_index', '../rag_preprocessing/corpus.csv')
 
     for idx, (content, score) in enumerate(results):
-        print(f"Rank {idx + 1} | Score: {score} \n Content: {content}\n")
\ No newline at end of file
+        print(f"Rank {idx + 1} | Score: {score} \n Content: {content}\n")
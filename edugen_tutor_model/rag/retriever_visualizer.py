@@ -7,6 +7,8 @@ import pandas as pd
 import faiss
 import seaborn as sns
 
+from edugen_tutor_model.rag_preprocessing.embedding_store import normalize_embeddings
+
 
 def visualize_retrieval(query, index_path, corpus_path, model_name="all-MiniLM-L6-v2", top_k=5):
     """
@@ -23,11 +25,13 @@ def visualize_retrieval(query, index_path, corpus_path, model_name="all-MiniLM-L
     # Get all corpus embeddings for comparison
     corpus_embeddings = index.reconstruct_n(0, index.ntotal)
 
-    # Search index
+    # Search index; inner-product indexes hold normalized vectors, so the query must be normalized too
+    if index.metric_type == faiss.METRIC_INNER_PRODUCT:
+        query_embedding = normalize_embeddings(query_embedding)
     distances, indices = index.search(query_embedding, top_k)
 
-    # Convert distances to similarity scores (1 / (1 + distance))
-    similarities = 1 / (1 + distances[0])
+    # Score the matches by their cosine similarity to the query, whatever metric the index ranks by
+    similarities = normalize_embeddings(corpus_embeddings[indices[0]]) @ normalize_embeddings(query_embedding)[0]
 
     # Create bar plot of similarity scores
     plt.figure(figsize=(12, 6))
@@ -37,9 +41,9 @@ def visualize_retrieval(query, index_path, corpus_path, model_name="all-MiniLM-L
     bars = plt.bar(range(len(similarities)), similarities)
 
     # Customize the plot
-    plt.title('Similarity Scores for Retrieved Content\n(Higher is More Similar)', pad=20)
+    plt.title('Cosine Similarity of Retrieved Content\n(Higher is More Similar)', pad=20)
     plt.xlabel('Retrieved Document Rank')
-    plt.ylabel('Similarity Score')
+    plt.ylabel('Cosine Similarity')
 
     # Add similarity score labels on top of bars
     for i, (bar, score) in enumerate(zip(bars, similarities)):
@@ -0,0 +1,31 @@
+import functools
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# The encoding gpt-4o-mini uses, so chunk and prompt budgets match what the completion API counts
+ENCODING_NAME = "o200k_base"
+
+# Without tiktoken, count words and punctuation marks; close to BPE counts for plain English prose
+_APPROXIMATE_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding():
+    """
+    Return the tiktoken encoding, or None when tiktoken is not installed or its BPE file cannot be loaded
+    """
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(ENCODING_NAME)
+    except Exception as e:
+        logger.warning(f"Counting tokens approximately, tiktoken {ENCODING_NAME} is unavailable: {str(e)}")
+        return None
+
+
+def count_tokens(text):
+    encoding = get_encoding()
+    if encoding is None:
+        return len(_APPROXIMATE_TOKEN_PATTERN.findall(text))
+    return len(encoding.encode(text, disallowed_special=()))
@@ -0,0 +1,183 @@
+import json
+import math
+import mmap
+import os
+import re
+import struct
+
+import numpy as np
+import pandas as pd
+
+# File layout: MAGIC, a little-endian uint32 header length, the JSON header (parameters and the sorted
+# vocabulary), then 8-byte aligned sections: chunk ids (int64), document lengths (uint32), posting
+# offsets per term (uint64, terms + 1), and the postings: document positions (uint32) and term
+# frequencies (uint32). Term t's postings are positions[offsets[t]:offsets[t + 1]].
+MAGIC = b'EDUGENBM1'
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+STOPWORDS = frozenset("""
+a about after all also an and are as at be because been but by can do does for from has have how if in
+into is it its may more most not of on or other our out so some such than that the their them then there
+these they this those through to up was we were what when where which while who why will with you your
+""".split())
+
+
+def bm25_index_path(corpus_path):
+    """
+    Path of the BM25 index built alongside a corpus, e.g. corpus.bm25 next to corpus.chunks
+    """
+    return f"{os.path.splitext(corpus_path)[0]}.bm25"
+
+
+def tokenize(text):
+    """
+    Lowercase word tokens without stopwords; a trailing plural "s" is dropped so "roots" matches "root"
+    """
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def _align(offset):
+    return (offset + 7) // 8 * 8
+
+
+def write_bm25_index(path, corpus, k1=DEFAULT_K1, b=DEFAULT_B):
+    """
+    Build the inverted index for a corpus DataFrame (id and content columns) and write it
+    """
+    ids = np.asarray(corpus['id'] if 'id' in corpus.columns else np.arange(len(corpus)), dtype='int64')
+    postings = {}
+    lengths = np.zeros(len(corpus), dtype='uint32')
+    for position, content in enumerate(corpus['content']):
+        tokens = tokenize(str(content))
+        lengths[position] = len(tokens)
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, count in counts.items():
+            postings.setdefault(token, []).append((position, count))
+
+    terms = sorted(postings)
+    offsets = np.zeros(len(terms) + 1, dtype='uint64')
+    np.cumsum([len(postings[term]) for term in terms], out=offsets[1:])
+    positions = np.fromiter((p for term in terms for p, _ in postings[term]), dtype='uint32', count=int(offsets[-1]))
+    frequencies = np.fromiter((f for term in terms for _, f in postings[term]), dtype='uint32', count=int(offsets[-1]))
+
+    arrays = [ids, lengths, offsets, positions, frequencies]
+    sections = []
+    position = 0
+    for array in arrays:
+        sections.append(position)
+        position = _align(position + array.nbytes)
+
+    header = json.dumps({
+        'count': len(ids),
+        'k1': k1,
+        'b': b,
+        'average_length': float(lengths.mean()) if len(lengths) else 0.0,
+        'terms': terms,
+        'sections': sections,
+    }).encode('utf-8')
+    data_start = _align(len(MAGIC) + 4 + len(header))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        for array, offset in zip(arrays, sections):
+            f.write(b'\0' * (data_start + offset - f.tell()))
+            f.write(array.tobytes())
+    os.replace(tmp_path, path)
+
+
+class BM25Index:
+    """
+    Read-only BM25 index over the corpus chunks, memory-mapped like the chunk store
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a BM25 index file")
+
+        (header_length,) = struct.unpack_from('<I', self._mmap, len(MAGIC))
+        header_start = len(MAGIC) + 4
+        header = json.loads(self._mmap[header_start:header_start + header_length])
+        data_start = _align(header_start + header_length)
+        count = header['count']
+        terms = header['terms']
+        ids_at, lengths_at, offsets_at, positions_at, frequencies_at = (data_start + s for s in header['sections'])
+
+        self.k1 = header['k1']
+        self.b = header['b']
+        self.average_length = header['average_length'] or 1.0
+        self.term_index = {term: i for i, term in enumerate(terms)}
+        self.ids = np.frombuffer(self._mmap, dtype='int64', count=count, offset=ids_at)
+        self._lengths = np.frombuffer(self._mmap, dtype='uint32', count=count, offset=lengths_at)
+        self._offsets = np.frombuffer(self._mmap, dtype='uint64', count=len(terms) + 1, offset=offsets_at)
+        total = int(self._offsets[-1])
+        self._positions = np.frombuffer(self._mmap, dtype='uint32', count=total, offset=positions_at)
+        self._frequencies = np.frombuffer(self._mmap, dtype='uint32', count=total, offset=frequencies_at)
+        # Per-document length normalisation is the same for every query
+        self._norms = (self.k1 * (1 - self.b + self.b * self._lengths / self.average_length)).astype('float32')
+
+    def __len__(self):
+        return len(self.ids)
+
+    def scores(self, query):
+        """
+        BM25 score of every chunk for a query, in index order
+        """
+        scores = np.zeros(len(self.ids), dtype='float32')
+        for token in set(tokenize(query)):
+            term = self.term_index.get(token)
+            if term is None:
+                continue
+            start, end = int(self._offsets[term]), int(self._offsets[term + 1])
+            positions = self._positions[start:end]
+            frequencies = self._frequencies[start:end].astype('float32')
+            idf = math.log(1 + (len(self.ids) - len(positions) + 0.5) / (len(positions) + 0.5))
+            scores[positions] += idf * frequencies * (self.k1 + 1) / (frequencies + self._norms[positions])
+        return scores
+
+    def search(self, query, top_k, allowed=None):
+        """
+        Ids and scores of the top-k chunks containing any query term, best first.
+        allowed is an optional boolean mask over the index restricting which chunks may be returned.
+        """
+        scores = self.scores(query)
+        if allowed is not None:
+            scores[~allowed] = 0
+        matching = np.flatnonzero(scores > 0)
+        if len(matching) > top_k:
+            matching = matching[np.argpartition(-scores[matching], top_k - 1)[:top_k]]
+        order = matching[np.argsort(-scores[matching], kind='stable')]
+        return self.ids[order], scores[order]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from edugen_tutor_model.rag_preprocessing.chunk_store import data_path
+
+    parser = argparse.ArgumentParser(
+        description="Build the BM25 index for a corpus",
+        epilog="Run from the repository root: python -m edugen_tutor_model.rag_preprocessing.bm25_index"
+    )
+    parser.add_argument('--corpus', default=data_path('corpus.csv'))
+    parser.add_argument('--output', help="Default: the corpus path with a .bm25 extension")
+    args = parser.parse_args()
+
+    output = args.output or bm25_index_path(args.corpus)
+    write_bm25_index(output, pd.read_csv(args.corpus, dtype={'grade': str}))
+    print(f"Wrote {output}")
@@ -0,0 +1,188 @@
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+import pandas as pd
+
+# File layout: MAGIC, a little-endian uint32 header length, the JSON header, then 8-byte aligned sections:
+# chunk ids (int64), text offsets (uint64, count + 1), one int32 code array per metadata column, and the
+# UTF-8 text of all chunks back to back. Chunk i's text is text[offsets[i]:offsets[i + 1]], so any chunk
+# can be read straight out of a shared, read-only memory map without parsing the rest of the file.
+MAGIC = b'EDUGENCHK1'
+METADATA_COLUMNS = ('subject', 'topic', 'grade', 'source_page', 'section')
+# Read corpus.csv so metadata values match the chunk store's: grades stay strings, pages stay integers despite gaps
+CSV_DTYPES = {'grade': str, 'source_page': 'Int64'}
+# The preprocessing scripts read and write their default files here rather than in the working directory,
+# since they are run as modules from the repository root (python -m edugen_tutor_model.rag_preprocessing.<script>)
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def data_path(name):
+    return os.path.join(DATA_DIR, name)
+
+
+def _align(offset):
+    return (offset + 7) // 8 * 8
+
+
+def _factorize(series):
+    """
+    Encode a column as int32 codes into a list of distinct values; missing values get code -1
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    values = [value.item() if hasattr(value, 'item') else value for value in uniques]
+    return codes.astype('int32'), values
+
+
+def write_chunk_store(path, corpus):
+    """
+    Write a corpus DataFrame (id, content and optional metadata columns) as a chunk store file
+    """
+    texts = [str(content).encode('utf-8') for content in corpus['content'].fillna('')]
+    offsets = np.zeros(len(texts) + 1, dtype='uint64')
+    np.cumsum([len(text) for text in texts], out=offsets[1:])
+    ids = np.asarray(corpus['id'] if 'id' in corpus.columns else np.arange(len(corpus)), dtype='int64')
+
+    columns = {}
+    code_arrays = []
+    for column in METADATA_COLUMNS:
+        if column in corpus.columns:
+            codes, values = _factorize(corpus[column])
+            columns[column] = values
+            code_arrays.append(codes)
+
+    # Section offsets are relative to the start of the data, which begins 8-byte aligned after the header
+    sections = {'ids': 0, 'offsets': ids.nbytes}
+    position = sections['offsets'] + offsets.nbytes
+    sections['codes'] = {}
+    for column, codes in zip(columns, code_arrays):
+        sections['codes'][column] = position
+        position = _align(position + codes.nbytes)
+    sections['text'] = position
+
+    header = json.dumps({
+        'count': len(texts),
+        'columns': columns,
+        'sections': sections,
+    }).encode('utf-8')
+    data_start = _align(len(MAGIC) + 4 + len(header))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        f.write(b'\0' * (data_start - f.tell()))
+        for array in [ids, offsets, *code_arrays]:
+            f.write(array.tobytes())
+            f.write(b'\0' * (_align(f.tell() - data_start) - (f.tell() - data_start)))
+        for text in texts:
+            f.write(text)
+    os.replace(tmp_path, path)
+
+
+def is_chunk_store(path):
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class ChunkStore:
+    """
+    Read-only view of a chunk store file through a memory map. Processes that open the same file share
+    its pages through the OS page cache, and opening it only parses the header.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a chunk store file")
+
+        (header_length,) = struct.unpack_from('<I', self._mmap, len(MAGIC))
+        header_start = len(MAGIC) + 4
+        header = json.loads(self._mmap[header_start:header_start + header_length])
+        data_start = _align(header_start + header_length)
+        count = header['count']
+        sections = header['sections']
+
+        self.ids = np.frombuffer(self._mmap, dtype='int64', count=count, offset=data_start + sections['ids'])
+        self._offsets = np.frombuffer(
+            self._mmap, dtype='uint64', count=count + 1, offset=data_start + sections['offsets']
+        )
+        self._text_start = data_start + sections['text']
+        self.columns = {
+            column: (values, np.frombuffer(
+                self._mmap, dtype='int32', count=count, offset=data_start + sections['codes'][column]
+            ))
+            for column, values in header['columns'].items()
+        }
+
+    def __len__(self):
+        return len(self.ids)
+
+    def content(self, position):
+        start = self._text_start + int(self._offsets[position])
+        end = self._text_start + int(self._offsets[position + 1])
+        return self._mmap[start:end].decode('utf-8')
+
+    def metadata(self, position):
+        return {
+            column: values[codes[position]] if codes[position] >= 0 else None
+            for column, (values, codes) in self.columns.items()
+        }
+
+
+class InMemoryChunks:
+    """
+    The ChunkStore interface over a corpus.csv loaded into memory
+    """
+
+    def __init__(self, corpus):
+        # An empty chunk reads back from CSV as NaN; the chunk store holds it as an empty string
+        self._contents = corpus['content'].fillna('').astype(str).tolist()
+        self.ids = np.asarray(corpus['id'] if 'id' in corpus.columns else np.arange(len(corpus)), dtype='int64')
+        self.columns = {}
+        for column in METADATA_COLUMNS:
+            if column in corpus.columns:
+                codes, values = _factorize(corpus[column])
+                self.columns[column] = (values, codes)
+
+    @classmethod
+    def from_csv(cls, path):
+        return cls(pd.read_csv(path, dtype=CSV_DTYPES))
+
+    def __len__(self):
+        return len(self._contents)
+
+    def content(self, position):
+        return self._contents[position]
+
+    def metadata(self, position):
+        return {
+            column: values[codes[position]] if codes[position] >= 0 else None
+            for column, (values, codes) in self.columns.items()
+        }
+
+
+def open_chunks(path):
+    """
+    Open a corpus as a memory-mapped chunk store, or load it into memory if it is a CSV
+    """
+    return ChunkStore(path) if is_chunk_store(path) else InMemoryChunks.from_csv(path)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Convert corpus.csv into a memory-mappable chunk store",
+        epilog="Run from the repository root: python -m edugen_tutor_model.rag_preprocessing.chunk_store"
+    )
+    parser.add_argument('--corpus', default=data_path('corpus.csv'))
+    parser.add_argument('--output', default=data_path('corpus.chunks'))
+    args = parser.parse_args()
+
+    write_chunk_store(args.output, pd.read_csv(args.corpus, dtype=CSV_DTYPES))
+    print(f"Wrote {args.output}")
@@ -0,0 +1,155 @@
+import re
+
+from edugen_tutor_model.rag.tokens import count_tokens
+
+# Chunk budgets are counted in o200k_base tokens (see rag/tokens.py), not in the encoder's own units:
+# all-MiniLM-L6-v2 truncates input at 256 WordPiece tokens including [CLS] and [SEP], and WordPiece splits
+# the same text into more pieces than o200k, especially rare scientific terms. 160 leaves a wide margin
+# so a full chunk is still embedded whole.
+DEFAULT_MAX_TOKENS = 160
+DEFAULT_OVERLAP_TOKENS = 30
+
+# Topic headings are full uppercase lines, e.g. "HUMAN CIRCULATORY SYSTEM" or "MACHINES: SLOPES"
+TOPIC_PATTERN = re.compile(r'^[A-Z][A-Z :]*[A-Z]$')
+# Section headings are short capitalised lines without closing punctuation, e.g. "Types of Roots"
+SECTION_MAX_WORDS = 8
+# Bullets ("•", "o") and numbered items start a new block even when the previous line did not end a sentence
+ITEM_PATTERN = re.compile(r'^(?:[•o]\s|\d+\.\s)')
+# A sentence ends at . ! or ? after a word, so item numbers like "1." do not end one
+SENTENCE_PATTERN = re.compile(r'(?<=[^\s\d][.!?])\s+(?=[A-Z(])')
+
+
+def is_section_heading(line):
+    return (
+        line[:1].isupper()
+        and len(line.split()) <= SECTION_MAX_WORDS
+        and not ITEM_PATTERN.match(line)
+        and not line.endswith(('.', ',', ';', ':', '?', '!'))
+    )
+
+
+def iter_sections(pages):
+    """
+    Split (page_number, text) pairs into sections, yielding (topic, section, blocks) for each, where blocks
+    are (text, page_number) pairs: a paragraph, bullet or numbered item with its wrapped lines rejoined.
+    """
+    topic = ''
+    section = None
+    blocks = []
+    # A heading candidate waits for the next line: if that starts in lowercase it was a wrapped line of text
+    candidate = None
+
+    def add_line(line, page_number):
+        if blocks:
+            previous = blocks[-1][0]
+            # A short label such as "• Stem:" stays with the item it introduces
+            is_label = previous.endswith(':') and len(previous.split()) <= SECTION_MAX_WORDS
+            if is_label or (not ITEM_PATTERN.match(line) and not previous.endswith(('.', ':', '!', '?'))):
+                blocks[-1] = (f"{previous} {line}", blocks[-1][1])
+                return
+        blocks.append((line, page_number))
+
+    for page_number, text in pages:
+        for line in (text or '').split('\n'):
+            line = line.strip()
+            if not line:
+                continue
+            if candidate:
+                candidate_line, candidate_page = candidate
+                candidate = None
+                if line[:1].islower():
+                    add_line(candidate_line, candidate_page)
+                    add_line(line, page_number)
+                    continue
+                if blocks:
+                    yield topic, section, blocks
+                    blocks = []
+                section = candidate_line
+
+            if TOPIC_PATTERN.match(line):
+                if blocks:
+                    yield topic, section, blocks
+                    blocks = []
+                topic, section = line, None
+            elif is_section_heading(line):
+                candidate = (line, page_number)
+            else:
+                add_line(line, page_number)
+
+    if blocks:
+        yield topic, section, blocks
+
+
+def split_sentences(text, max_tokens):
+    """
+    Split a block into sentences, breaking any sentence longer than max_tokens between words
+    """
+    for sentence in SENTENCE_PATTERN.split(text):
+        if count_tokens(sentence) <= max_tokens:
+            yield sentence
+            continue
+        piece = []
+        for word in sentence.split():
+            if piece and count_tokens(" ".join(piece + [word])) > max_tokens:
+                yield " ".join(piece)
+                piece = []
+            piece.append(word)
+        if piece:
+            yield " ".join(piece)
+
+
+def pack_sentences(sentences, max_tokens, overlap_tokens):
+    """
+    Greedily pack (sentence, page_number, tokens) triples into chunks of at most max_tokens, starting each
+    chunk after the first with the trailing sentences of the previous one, up to overlap_tokens of them
+    """
+    chunk = []
+    chunk_tokens = 0
+    for sentence in sentences:
+        tokens = sentence[2]
+        if chunk and chunk_tokens + tokens > max_tokens:
+            yield chunk
+            carried = []
+            carried_tokens = 0
+            for previous in reversed(chunk):
+                if carried_tokens + previous[2] > overlap_tokens or carried_tokens + previous[2] + tokens > max_tokens:
+                    break
+                carried.insert(0, previous)
+                carried_tokens += previous[2]
+            chunk, chunk_tokens = carried, carried_tokens
+        chunk.append(sentence)
+        chunk_tokens += tokens
+    if chunk:
+        yield chunk
+
+
+def chunk_pages(pages, subject='Science', grade='6', max_tokens=DEFAULT_MAX_TOKENS,
+                overlap_tokens=DEFAULT_OVERLAP_TOKENS):
+    """
+    Split (page_number, text) pairs into chunks of at most max_tokens that never cross a topic or section
+    heading and only break between sentences, overlapping by up to overlap_tokens. Each chunk starts with its
+    header path (topic, then section) and records it, with the subject, topic, grade and the page it starts
+    on, for filtered retrieval.
+    """
+    if overlap_tokens >= max_tokens:
+        raise ValueError(f"overlap_tokens ({overlap_tokens}) must be smaller than max_tokens ({max_tokens})")
+
+    for topic, section, blocks in iter_sections(pages):
+        header_path = " > ".join(part for part in (topic.title(), section) if part)
+        prefix = f"{header_path}: " if header_path else ""
+        budget = max(max_tokens - count_tokens(prefix), 1)
+
+        sentences = (
+            (sentence, page_number, count_tokens(sentence))
+            for text, page_number in blocks
+            for sentence in split_sentences(text, budget)
+        )
+        for chunk in pack_sentences(sentences, budget, min(overlap_tokens, budget - 1)):
+            yield {
+                'content': prefix + " ".join(sentence for sentence, _, _ in chunk),
+                'subject': subject,
+                'topic': topic.title(),
+                'grade': grade,
+                'source_page': chunk[0][1],
+                'section': header_path,
+            }
@@ -0,0 +1,101 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+# File layout: MAGIC, a little-endian uint32 header length, the JSON header, the vectors, and for int8 the
+# per-vector float32 scales. The header records dtype, shape and whether the vectors are L2-normalized.
+MAGIC = b'EDUGENEMB1'
+STORAGE_DTYPES = ('float32', 'float16', 'int8')
+
+
+def normalize_embeddings(embeddings):
+    """
+    L2-normalize each row so inner product equals cosine similarity
+    """
+    embeddings = np.asarray(embeddings, dtype='float32')
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.where(norms == 0, 1, norms)
+
+
+def quantize_int8(embeddings):
+    """
+    Symmetric per-vector int8 quantization; returns the codes and the scale to multiply them back by
+    """
+    scales = np.abs(embeddings).max(axis=1) / 127
+    scales[scales == 0] = 1
+    codes = np.clip(np.rint(embeddings / scales[:, np.newaxis]), -127, 127).astype('int8')
+    return codes, scales.astype('float32')
+
+
+def save_embeddings(path, embeddings, dtype='float32', normalized=False):
+    """
+    Write embeddings with a self-describing header, stored as float32, float16 or int8
+    """
+    if dtype not in STORAGE_DTYPES:
+        raise ValueError(f"Unknown embedding dtype {dtype!r}, expected one of {', '.join(STORAGE_DTYPES)}")
+
+    embeddings = np.asarray(embeddings, dtype='float32')
+    scales = None
+    if dtype == 'int8':
+        data, scales = quantize_int8(embeddings)
+    else:
+        data = embeddings.astype(dtype)
+
+    header = json.dumps({
+        'dtype': dtype,
+        'shape': list(embeddings.shape),
+        'normalized': normalized,
+    }).encode('utf-8')
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        f.write(np.ascontiguousarray(data).tobytes())
+        if scales is not None:
+            f.write(scales.tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_header(path):
+    """
+    Return the header of an embedding store file and the offset its vectors start at
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an embedding store file")
+        (header_length,) = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(header_length))
+    return header, len(MAGIC) + 4 + header_length
+
+
+def load_embeddings(path):
+    """
+    Load embeddings as float32, from an embedding store file or a plain .npy array
+    """
+    with open(path, 'rb') as f:
+        is_store = f.read(len(MAGIC)) == MAGIC
+    if not is_store:
+        return np.load(path).astype('float32')
+
+    header, offset = read_header(path)
+    rows, dimension = header['shape']
+    data = np.fromfile(path, dtype=header['dtype'], count=rows * dimension, offset=offset).reshape(rows, dimension)
+    if header['dtype'] == 'int8':
+        scales = np.fromfile(path, dtype='float32', count=rows, offset=offset + data.nbytes)
+        return data.astype('float32') * scales[:, np.newaxis]
+    return data.astype('float32')
+
+
+def is_normalized(path):
+    """
+    Whether a stored set of embeddings was L2-normalized when it was encoded
+    """
+    try:
+        header, _ = read_header(path)
+    except ValueError:
+        return False
+    return header['normalized']
@@ -1,36 +1,83 @@
-from sentence_transformers import SentenceTransformer
+import argparse
 import numpy as np
 import pandas as pd
+import os
 
+from edugen_tutor_model.rag.encoders import ENCODER_BACKENDS, load_encoder
+from edugen_tutor_model.rag_preprocessing.bm25_index import bm25_index_path, write_bm25_index
+from edugen_tutor_model.rag_preprocessing.chunk_store import data_path, write_chunk_store
+from edugen_tutor_model.rag_preprocessing.embedding_store import STORAGE_DTYPES, save_embeddings
 
-def encode_corpus(tsv_path, model_name="all-MiniLM-L6-v2"):
+
+def read_chunks(tsv_path):
+    """
+    Load chunk rows from a TSV written by pdf_to_tsv. Older files have no header or metadata columns,
+    just an index and the content.
+    """
+    with open(tsv_path) as f:
+        has_header = f.readline().split('\t')[0].strip() == 'content'
+    if has_header:
+        return pd.read_csv(tsv_path, sep='\t', dtype={'grade': str})
+    return pd.read_csv(tsv_path, sep='\t', header=None, names=['content']).reset_index(drop=True)
+
+
+def encode_corpus(tsv_path, model_name="all-MiniLM-L6-v2", normalize=False, backend='torch', encoder_path=None):
     """
     Encode the content in a TSV file using SBERT, converting it into embeddings.
+    With normalize, the embeddings are L2-normalized for inner-product (cosine) search.
+    The backend is PyTorch or 'onnx' with the directory of an exported encoder.
     """
     # Load the data
-    data = pd.read_csv(tsv_path, sep='\t', header=None, names=['content'])
+    data = read_chunks(tsv_path)
     corpus = data["content"].tolist()
 
     # Load the SBERT model
-    model = SentenceTransformer(model_name)
+    model = load_encoder(model_name, backend, encoder_path)
 
     # Encode the corpus
-    embeddings = model.encode(corpus, show_progress_bar=True)
+    embeddings = model.encode(corpus, show_progress_bar=True, normalize_embeddings=normalize)
 
     return data, embeddings
 
 
 if __name__ == "__main__":
-    tsv_path = 'grade_6_science_notes.tsv'
-    data, embeddings = encode_corpus(tsv_path)
+    parser = argparse.ArgumentParser(
+        description="Encode the chunk TSV into embeddings and write corpus.csv and corpus.chunks",
+        epilog="Run from the repository root: python -m edugen_tutor_model.rag_preprocessing.embeddings_generator"
+    )
+    parser.add_argument('--tsv', default=data_path('grade_6_science_notes.tsv'))
+    parser.add_argument('--output', default=data_path('embeddings.npy'),
+                        help="A .npy file, or any other name for an embedding store file with a header")
+    parser.add_argument('--normalize', action='store_true', help="L2-normalize for cosine/inner-product search (not for .npy output)")
+    parser.add_argument('--dtype', choices=STORAGE_DTYPES, default='float32', help="Embedding store dtype (not for .npy output)")
+    parser.add_argument('--backend', choices=ENCODER_BACKENDS, default='torch', help="Encoder runtime")
+    parser.add_argument('--onnx-path', help="Exported encoder directory for the onnx backend")
+    parser.add_argument('--corpus', default=data_path('corpus.csv'),
+                        help="Corpus CSV to write; the chunk store and BM25 index are written next to it")
+    args = parser.parse_args()
+    # A plain .npy array cannot record normalization or dtype, so the index would be built for the wrong metric
+    if args.output.endswith('.npy') and (args.normalize or args.dtype != 'float32'):
+        parser.error("--normalize and --dtype need an embedding store output, not a .npy file")
+
+    data, embeddings = encode_corpus(args.tsv, normalize=args.normalize, backend=args.backend,
+                                     encoder_path=args.onnx_path)
 
     # Add an explicit index column for unique identification
-    data.reset_index(inplace=True)
+    data.insert(0, 'id', range(len(data)))
 
-    # Save the embeddings to a .npy file
-    np.save('embeddings.npy', embeddings)
+    # Save the embeddings to a .npy file, or to a compact store that records dtype and normalization
+    if args.output.endswith('.npy'):
+        np.save(args.output, embeddings)
+    else:
+        save_embeddings(args.output, embeddings, dtype=args.dtype, normalized=args.normalize)
 
-    # Save the data for reference
-    data.to_csv('corpus.csv', index=False, header=["id", "content"])
+    # Save the data for reference, swapping the file in atomically for running retrievers
+    data.to_csv(f"{args.corpus}.tmp", index=False)
+    os.replace(f"{args.corpus}.tmp", args.corpus)
+    # Memory-mappable copy of the chunks that the retriever serves from
+    chunks_path = f"{os.path.splitext(args.corpus)[0]}.chunks"
+    write_chunk_store(chunks_path, data)
+    # Lexical index over the same chunks for hybrid retrieval
+    write_bm25_index(bm25_index_path(chunks_path), data)
 
     print("Successfully encoded the corpus and saved the embeddings.")
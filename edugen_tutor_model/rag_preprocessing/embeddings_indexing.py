@@ -1,22 +1,228 @@
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+
 import faiss
 import numpy as np
 
+from edugen_tutor_model.rag_preprocessing.chunk_store import data_path
+from edugen_tutor_model.rag_preprocessing.embedding_store import is_normalized, load_embeddings
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ('flat', 'ivf_flat', 'ivf_pq', 'hnsw')
+# l2 ranks by Euclidean distance; ip ranks by inner product, which is cosine similarity for normalized vectors
+METRICS = {'l2': faiss.METRIC_L2, 'ip': faiss.METRIC_INNER_PRODUCT}
+# How a flat index holds its vectors in memory; float16 and int8 use FAISS scalar quantizers
+FLAT_STORAGE = {'float16': faiss.ScalarQuantizer.QT_fp16, 'int8': faiss.ScalarQuantizer.QT_8bit}
+
+# Defaults for the approximate index types; see index_benchmark.py for picking an operating point
+DEFAULT_NPROBE = 16
+DEFAULT_PQ_SUBQUANTIZERS = 48
+DEFAULT_PQ_BITS = 8
+DEFAULT_HNSW_M = 32
+DEFAULT_EF_CONSTRUCTION = 200
+DEFAULT_EF_SEARCH = 64
+
+
+def index_metadata_path(index_path):
+    """
+    Path of the JSON sidecar describing how an index was built and should be searched
+    """
+    return f"{index_path}.meta.json"
+
+
+def load_index_metadata(index_path):
+    """
+    Read the metadata sidecar for an index; indexes built before it existed have none
+    """
+    try:
+        with open(index_metadata_path(index_path)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def apply_search_params(index, search_params):
+    """
+    Set query-time parameters such as nprobe or efSearch on a loaded index
+    """
+    parameter_space = faiss.ParameterSpace()
+    for name, value in search_params.items():
+        parameter_space.set_index_parameter(index, name, value)
+
+
+def default_nlist(num_vectors):
+    # Rule of thumb: about 4 * sqrt(N) inverted lists, each trained on at least 39 points
+    return max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // 39 or 1))
+
+
+def flat_index(dimension, metric='l2'):
+    return faiss.IndexFlatIP(dimension) if metric == 'ip' else faiss.IndexFlatL2(dimension)
+
+
+def build_index(embeddings, index_type='flat', metric='l2', storage='float32', nlist=None, nprobe=DEFAULT_NPROBE,
+                pq_m=DEFAULT_PQ_SUBQUANTIZERS, pq_bits=DEFAULT_PQ_BITS, hnsw_m=DEFAULT_HNSW_M,
+                ef_construction=DEFAULT_EF_CONSTRUCTION, ef_search=DEFAULT_EF_SEARCH, train_size=None, seed=0):
+    """
+    Build a FAISS index of the given type over the embeddings.
+    Returns the index and its metadata (build and search parameters).
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}, expected one of {', '.join(INDEX_TYPES)}")
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric {metric!r}, expected one of {', '.join(METRICS)}")
+    if storage != 'float32' and (index_type != 'flat' or storage not in FLAT_STORAGE):
+        raise ValueError(f"Storage {storage!r} is only supported for flat indexes ({', '.join(FLAT_STORAGE)})")
+
+    embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+    num_vectors, dimension = embeddings.shape
+    build_params = {}
+    search_params = {}
+
+    if index_type == 'flat':
+        if storage == 'float32':
+            index = flat_index(dimension, metric)
+        else:
+            index = faiss.IndexScalarQuantizer(dimension, FLAT_STORAGE[storage], METRICS[metric])
+            index.train(embeddings)
+            build_params = {'storage': storage}
+    elif index_type == 'hnsw':
+        index = faiss.IndexHNSWFlat(dimension, hnsw_m, METRICS[metric])
+        index.hnsw.efConstruction = ef_construction
+        build_params = {'hnsw_m': hnsw_m, 'ef_construction': ef_construction}
+        search_params = {'efSearch': ef_search}
+    else:
+        nlist = nlist or default_nlist(num_vectors)
+        if num_vectors < nlist:
+            raise ValueError(f"{index_type} with nlist={nlist} needs at least {nlist} vectors, got {num_vectors}")
+
+        quantizer = flat_index(dimension, metric)
+        if index_type == 'ivf_flat':
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist, METRICS[metric])
+            build_params = {'nlist': nlist}
+        else:
+            if dimension % pq_m:
+                raise ValueError(f"Embedding dimension {dimension} is not divisible by pq_m={pq_m}")
+            if num_vectors < 2 ** pq_bits:
+                raise ValueError(f"ivf_pq with pq_bits={pq_bits} needs at least {2 ** pq_bits} vectors, got {num_vectors}")
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, pq_bits, METRICS[metric])
+            build_params = {'nlist': nlist, 'pq_m': pq_m, 'pq_bits': pq_bits}
+        search_params = {'nprobe': min(nprobe, nlist)}
+
+        # Train the coarse quantizer (and PQ codebooks) on a sample when the corpus is large
+        training_set = embeddings
+        if train_size and train_size < num_vectors:
+            rng = np.random.default_rng(seed)
+            training_set = embeddings[rng.choice(num_vectors, train_size, replace=False)]
+            build_params['train_size'] = train_size
+        index.train(training_set)
+
+    index.add(embeddings)
+    apply_search_params(index, search_params)
+
+    metadata = {
+        'index_type': index_type,
+        'metric': metric,
+        'dimension': dimension,
+        'ntotal': index.ntotal,
+        'build_params': build_params,
+        'search_params': search_params,
+    }
+    return index, metadata
+
 
-def create_faiss_index(embeddings_path, index_path="faiss_index"):
+def read_index(index_path, metadata=None, mmap=False):
+    """
+    Load an index, optionally memory-mapping its vectors so processes on a host share them through the
+    page cache. Flat and HNSW storage is mapped with IO_FLAG_MMAP_IFC, IVF inverted lists with IO_FLAG_MMAP.
+    """
+    if not mmap:
+        return faiss.read_index(index_path)
+
+    index_type = (metadata or {}).get('index_type', 'flat')
+    if index_type.startswith('ivf') or not hasattr(faiss, 'IO_FLAG_MMAP_IFC'):
+        flags = faiss.IO_FLAG_MMAP
+    else:
+        flags = faiss.IO_FLAG_MMAP_IFC
+    return faiss.read_index(index_path, flags | faiss.IO_FLAG_READ_ONLY)
+
+
+def write_index(index, metadata, index_path):
+    """
+    Save an index and its metadata sidecar, replacing the old files atomically so running retrievers
+    never read a partial index. The sidecar records a checksum of the serialized index and is written last:
+    retrievers reload when it changes, so a build's corpus, chunk store and BM25 index must be written before
+    its index. Returns the written metadata.
+    """
+    data = faiss.serialize_index(index)
+    metadata = {**metadata, 'checksum': hashlib.sha256(data).hexdigest()}
+
+    tmp_path = f"{index_path}.tmp"
+    data.tofile(tmp_path)
+    os.replace(tmp_path, index_path)
+
+    metadata_path = index_metadata_path(index_path)
+    with open(f"{metadata_path}.tmp", 'w') as f:
+        json.dump(metadata, f, indent=2)
+    os.replace(f"{metadata_path}.tmp", metadata_path)
+    return metadata
+
+
+def create_faiss_index(embeddings_path, index_path="faiss_index", index_type='flat', metric=None, **params):
     """
     Create a Faiss index from the embeddings.
+    The metric defaults to inner product for normalized embeddings and L2 otherwise.
     """
     # Load embeddings
-    embeddings = np.load(embeddings_path)
+    embeddings = load_embeddings(embeddings_path)
+    if metric is None:
+        metric = 'ip' if is_normalized(embeddings_path) else 'l2'
+        logger.info(f"Using the {metric} metric: {embeddings_path} is {'' if metric == 'ip' else 'not '}marked normalized")
 
     # Create FAISS index
-    dimension = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dimension)
-    index.add(embeddings)
-
-    # Save the index
-    faiss.write_index(index, index_path)
+    index, metadata = build_index(embeddings, index_type=index_type, metric=metric, **params)
+    return write_index(index, metadata, index_path)
 
 
 if __name__ == "__main__":
-    create_faiss_index('embeddings.npy')
\ No newline at end of file
+    parser = argparse.ArgumentParser(
+        description="Build the FAISS index for the curriculum corpus",
+        epilog="Run from the repository root: python -m edugen_tutor_model.rag_preprocessing.embeddings_indexing"
+    )
+    parser.add_argument('--embeddings', default=data_path('embeddings.npy'))
+    parser.add_argument('--index', default=data_path('faiss_index'))
+    parser.add_argument('--type', choices=INDEX_TYPES, default='flat')
+    parser.add_argument('--metric', choices=list(METRICS), help="Default: ip for normalized embeddings, else l2")
+    parser.add_argument('--storage', choices=['float32', *FLAT_STORAGE], default='float32',
+                        help="In-memory vector storage for flat indexes")
+    parser.add_argument('--nlist', type=int, help="IVF lists (default: about 4 * sqrt(N))")
+    parser.add_argument('--nprobe', type=int, default=DEFAULT_NPROBE)
+    parser.add_argument('--pq-m', type=int, default=DEFAULT_PQ_SUBQUANTIZERS)
+    parser.add_argument('--pq-bits', type=int, default=DEFAULT_PQ_BITS)
+    parser.add_argument('--hnsw-m', type=int, default=DEFAULT_HNSW_M)
+    parser.add_argument('--ef-construction', type=int, default=DEFAULT_EF_CONSTRUCTION)
+    parser.add_argument('--ef-search', type=int, default=DEFAULT_EF_SEARCH)
+    parser.add_argument('--train-size', type=int, help="Train IVF on a random sample of this many vectors")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    metadata = create_faiss_index(
+        args.embeddings,
+        args.index,
+        index_type=args.type,
+        metric=args.metric,
+        storage=args.storage,
+        nlist=args.nlist,
+        nprobe=args.nprobe,
+        pq_m=args.pq_m,
+        pq_bits=args.pq_bits,
+        hnsw_m=args.hnsw_m,
+        ef_construction=args.ef_construction,
+        ef_search=args.ef_search,
+        train_size=args.train_size,
+    )
+    print(f"Built {metadata['index_type']} index with {metadata['ntotal']} vectors")
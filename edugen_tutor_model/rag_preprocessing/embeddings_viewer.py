@@ -1,17 +1,18 @@
-import numpy as np
 import pandas as pd
 import matplotlib
 matplotlib.use('TkAgg')
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from edugen_tutor_model.rag_preprocessing.embedding_store import load_embeddings
+
 
 def analyze_embeddings(embeddings_path, corpus_path=None):
     """
     Analyze embeddings with basic statistics and visualization
     """
     # Load embeddings
-    embeddings = np.load(embeddings_path)
+    embeddings = load_embeddings(embeddings_path)
 
     # Basic statistics
     print("\nEmbedding Statistics:")
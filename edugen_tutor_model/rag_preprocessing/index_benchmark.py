@@ -0,0 +1,122 @@
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from edugen_tutor_model.rag_preprocessing.chunk_store import data_path
+from edugen_tutor_model.rag_preprocessing.embeddings_indexing import apply_search_params, build_index
+
+# Query-time settings swept for each index type
+SWEEPS = {
+    'ivf_flat': ('nprobe', [1, 4, 16, 64, 256]),
+    'ivf_pq': ('nprobe', [1, 4, 16, 64, 256]),
+    'hnsw': ('efSearch', [16, 32, 64, 128, 256]),
+}
+
+
+def synthetic_embeddings(num_vectors, dimension, num_clusters=1000, seed=0):
+    """
+    Clustered unit vectors; uniformly random data would understate how well ANN indexes do on real text embeddings
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((num_clusters, dimension)).astype('float32')
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    vectors = centers[rng.integers(num_clusters, size=num_vectors)]
+    vectors += rng.standard_normal((num_vectors, dimension)).astype('float32') / np.sqrt(dimension)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def recall_at_k(found, expected):
+    hits = sum(len(set(row_found) & set(row_expected)) for row_found, row_expected in zip(found, expected))
+    return hits / expected.size
+
+
+def time_queries(index, queries, k):
+    """
+    Search one query at a time, as the retriever does, and return the results with per-query latencies in ms
+    """
+    results = np.empty((len(queries), k), dtype='int64')
+    latencies = []
+    for i, query in enumerate(queries):
+        started = time.perf_counter()
+        _, indices = index.search(query[np.newaxis], k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results[i] = indices[0]
+    return results, np.array(latencies)
+
+
+def run_benchmark(embeddings, num_queries=1000, k=5, index_types=tuple(SWEEPS), build_params=None, seed=0):
+    """
+    Compare recall@k and latency of each approximate index type against exact flat search.
+    Queries are held-out vectors, so they are not trivially their own nearest neighbour.
+    """
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(embeddings))
+    queries = np.ascontiguousarray(embeddings[order[:num_queries]])
+    database = np.ascontiguousarray(embeddings[order[num_queries:]])
+
+    rows = []
+    started = time.perf_counter()
+    flat, _ = build_index(database, 'flat')
+    flat_build = time.perf_counter() - started
+    expected, latencies = time_queries(flat, queries, k)
+    rows.append(('flat', '-', flat_build, 1.0, latencies))
+
+    for index_type in index_types:
+        started = time.perf_counter()
+        index, metadata = build_index(database, index_type, **(build_params or {}).get(index_type, {}))
+        build_time = time.perf_counter() - started
+
+        name, values = SWEEPS[index_type]
+        for value in values:
+            if name == 'nprobe' and value > metadata['build_params']['nlist']:
+                continue
+            apply_search_params(index, {name: value})
+            found, latencies = time_queries(index, queries, k)
+            rows.append((index_type, f"{name}={value}", build_time, recall_at_k(found, expected), latencies))
+
+    return rows
+
+
+def print_report(rows, k):
+    print(f"{'index':<10}{'setting':<16}{'build s':>10}{f'recall@{k}':>11}{'mean ms':>10}{'p95 ms':>10}")
+    for index_type, setting, build_time, recall, latencies in rows:
+        print(f"{index_type:<10}{setting:<16}{build_time:>10.2f}{recall:>11.3f}"
+              f"{latencies.mean():>10.3f}{np.percentile(latencies, 95):>10.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark recall@k vs latency of ANN index types against flat search",
+        epilog="Run from the repository root: python -m edugen_tutor_model.rag_preprocessing.index_benchmark"
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--embeddings', default=data_path('embeddings.npy'), help="Embeddings .npy file to index")
+    source.add_argument('--synthetic', type=int, metavar='N', help="Use N synthetic clustered vectors instead")
+    parser.add_argument('--dimension', type=int, default=384, help="Dimension of synthetic vectors")
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('-k', type=int, default=5)
+    parser.add_argument('--types', nargs='+', choices=list(SWEEPS), default=list(SWEEPS))
+    parser.add_argument('--nlist', type=int, help="IVF lists (default: about 4 * sqrt(N))")
+    parser.add_argument('--train-size', type=int, help="Train IVF on a random sample of this many vectors")
+    parser.add_argument('--threads', type=int, help="FAISS OpenMP threads (default: all cores)")
+    args = parser.parse_args()
+
+    if args.threads:
+        faiss.omp_set_num_threads(args.threads)
+
+    if args.synthetic:
+        embeddings = synthetic_embeddings(args.synthetic, args.dimension)
+    else:
+        embeddings = np.load(args.embeddings).astype('float32')
+
+    ivf_params = {'nlist': args.nlist, 'train_size': args.train_size}
+    report = run_benchmark(
+        embeddings,
+        num_queries=min(args.queries, len(embeddings) // 10 or 1),
+        k=args.k,
+        index_types=args.types,
+        build_params={'ivf_flat': ivf_params, 'ivf_pq': ivf_params},
+    )
+    print_report(report, args.k)
@@ -0,0 +1,261 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+
+import faiss
+import numpy as np
+import pandas as pd
+
+from edugen_tutor_model.rag.encoders import ENCODER_BACKENDS, load_encoder
+from edugen_tutor_model.rag_preprocessing.bm25_index import bm25_index_path, write_bm25_index
+from edugen_tutor_model.rag_preprocessing.chunk_store import data_path, write_chunk_store
+from edugen_tutor_model.rag_preprocessing.embeddings_generator import read_chunks
+from edugen_tutor_model.rag_preprocessing.embeddings_indexing import FLAT_STORAGE, METRICS, flat_index, write_index
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+DEFAULT_MODEL_NAME = "all-MiniLM-L6-v2"
+CORPUS_COLUMNS = ['id', 'content', 'subject', 'topic', 'grade', 'source_page', 'section', 'source']
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(content):
+    """
+    Stable int64 id for a chunk, derived from its text so unchanged chunks keep their vectors
+    """
+    digest = hashlib.sha256(content.strip().encode('utf-8')).digest()
+    # FAISS reserves -1, so keep ids positive
+    return int.from_bytes(digest[:8], 'big') & 0x7FFFFFFFFFFFFFFF
+
+
+def source_defaults(path):
+    """
+    Guess subject and grade from names like grade_6_science.pdf
+    """
+    match = re.search(r'grade_(\d+)_([a-z_]+)', os.path.basename(path).lower())
+    if not match:
+        return {}
+    return {'grade': match.group(1), 'subject': match.group(2).replace('_', ' ').title()}
+
+
+def read_source_chunks(path, subject=None, grade=None):
+    """
+    Chunk rows for a source file: a PDF is split into token-bounded chunks, a TSV is taken as already chunked
+    """
+    defaults = source_defaults(path)
+    subject = subject or defaults.get('subject')
+    grade = grade or defaults.get('grade')
+
+    if path.lower().endswith('.pdf'):
+        # pdfplumber is only needed when PDFs are ingested
+        from edugen_tutor_model.rag_preprocessing.pdf_to_tsv import extract_chunks
+        rows = extract_chunks(path, subject=subject, grade=grade)
+    else:
+        rows = read_chunks(path).to_dict('records')
+        for row in rows:
+            for column, value in (('subject', subject), ('grade', grade)):
+                if pd.isna(row.get(column)):
+                    row[column] = value
+    return rows
+
+
+def load_manifest(manifest_path):
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_manifest(manifest, manifest_path):
+    with open(f"{manifest_path}.tmp", 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+
+
+class Ingestor:
+    """
+    Content-addressed ingestion into an IndexIDMap2. Each chunk's id is a hash of its text, so re-running
+    ingestion only embeds chunks whose text is new, and removes vectors for chunks no source produces any more.
+    The manifest records every source file's hash and chunk ids, so unchanged files are not even re-read.
+    """
+
+    def __init__(self, index_path, corpus_path, manifest_path, chunks_path=None,
+                 model_name=DEFAULT_MODEL_NAME, normalize=True, storage='float32', encoder_backend='torch',
+                 encoder_path=None):
+        self.index_path = index_path
+        self.corpus_path = corpus_path
+        self.chunks_path = chunks_path
+        self.manifest_path = manifest_path
+        self.model_name = model_name
+        self.normalize = normalize
+        self.storage = storage
+        self.encoder_backend = encoder_backend
+        self.encoder_path = encoder_path
+        self._model = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = load_encoder(self.model_name, self.encoder_backend, self.encoder_path)
+        return self._model
+
+    def _settings(self):
+        return {'model_name': self.model_name, 'normalize': self.normalize, 'storage': self.storage}
+
+    def _new_index(self, dimension):
+        metric = 'ip' if self.normalize else 'l2'
+        if self.storage == 'float32':
+            inner = flat_index(dimension, metric)
+        else:
+            inner = faiss.IndexScalarQuantizer(dimension, FLAT_STORAGE[self.storage], METRICS[metric])
+            # fp16 and 8-bit quantizers over normalized vectors do not depend on the data, so train on a unit range
+            inner.train(np.vstack([np.full(dimension, -1, 'float32'), np.full(dimension, 1, 'float32')]))
+        return faiss.IndexIDMap2(inner)
+
+    def _load_existing(self):
+        """
+        Return the manifest, corpus rows by id and index from the last run, or empty ones if the previous
+        output is missing or was built with a different model or vector settings
+        """
+        manifest = load_manifest(self.manifest_path)
+        if (manifest is None or manifest.get('version') != MANIFEST_VERSION
+                or manifest.get('settings') != self._settings()
+                or not os.path.exists(self.index_path) or not os.path.exists(self.corpus_path)):
+            return {'sources': {}}, {}, None
+
+        index = faiss.read_index(self.index_path)
+        corpus = pd.read_csv(self.corpus_path, dtype={'grade': str})
+        rows = {int(row['id']): row for row in corpus.to_dict('records')}
+        return manifest, rows, index
+
+    def ingest(self, sources, subject=None, grade=None):
+        """
+        Bring the index, corpus and manifest in line with the given source files and return a summary
+        """
+        started = time.monotonic()
+        manifest, rows, index = self._load_existing()
+
+        new_sources = {}
+        current_rows = {}
+        reread = 0
+        for source in sources:
+            key = os.path.abspath(source)
+            digest = file_hash(source)
+            previous = manifest['sources'].get(key)
+            if previous and previous['sha256'] == digest and all(i in rows for i in previous['chunk_ids']):
+                chunk_ids = previous['chunk_ids']
+                for i in chunk_ids:
+                    current_rows.setdefault(i, rows[i])
+            else:
+                reread += 1
+                chunk_ids = []
+                for row in read_source_chunks(source, subject=subject, grade=grade):
+                    i = chunk_id(row['content'])
+                    chunk_ids.append(i)
+                    current_rows.setdefault(i, {**row, 'id': i, 'source': os.path.basename(source)})
+            new_sources[key] = {'sha256': digest, 'chunk_ids': chunk_ids}
+
+        indexed = set(faiss.vector_to_array(index.id_map).tolist()) if index is not None else set()
+        added = [i for i in current_rows if i not in indexed]
+        removed = [i for i in indexed if i not in current_rows]
+
+        if removed:
+            index.remove_ids(np.asarray(removed, dtype='int64'))
+        if added:
+            embeddings = self.model.encode(
+                [current_rows[i]['content'] for i in added],
+                normalize_embeddings=self.normalize,
+                show_progress_bar=len(added) > 100,
+            )
+            embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+            if index is None:
+                index = self._new_index(embeddings.shape[1])
+            index.add_with_ids(embeddings, np.asarray(added, dtype='int64'))
+        if index is None:
+            raise ValueError("No chunks found in the given sources")
+
+        # Corpus rows follow the order vectors were first added, so existing rows keep their positions
+        ordered_ids = faiss.vector_to_array(index.id_map).tolist()
+        corpus = pd.DataFrame([current_rows[i] for i in ordered_ids], columns=CORPUS_COLUMNS)
+        corpus['source_page'] = corpus['source_page'].astype('Int64')
+
+        metadata = {
+            'index_type': 'flat',
+            'metric': 'ip' if self.normalize else 'l2',
+            'dimension': index.d,
+            'ntotal': index.ntotal,
+            'id_map': True,
+            'build_params': {'storage': self.storage} if self.storage != 'float32' else {},
+            'search_params': {},
+        }
+
+        # Write the corpus before the index so a reloading retriever never sees ids it cannot resolve
+        corpus.to_csv(f"{self.corpus_path}.tmp", index=False)
+        os.replace(f"{self.corpus_path}.tmp", self.corpus_path)
+        if self.chunks_path:
+            write_chunk_store(self.chunks_path, corpus)
+        write_bm25_index(bm25_index_path(self.chunks_path or self.corpus_path), corpus)
+        write_index(index, metadata, self.index_path)
+        write_manifest({
+            'version': MANIFEST_VERSION,
+            'settings': self._settings(),
+            'sources': new_sources,
+        }, self.manifest_path)
+
+        summary = {
+            'sources': len(sources),
+            'sources_reread': reread,
+            'chunks': index.ntotal,
+            'added': len(added),
+            'removed': len(removed),
+            'seconds': round(time.monotonic() - started, 2),
+        }
+        logger.info(f"Ingestion finished: {summary}")
+        return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Incrementally ingest curriculum sources into the retrieval index",
+        epilog="Run from the repository root: python -m edugen_tutor_model.rag_preprocessing.ingest"
+    )
+    parser.add_argument('sources', nargs='+', help="PDF notes or chunk TSV files; omitted files are removed")
+    parser.add_argument('--index', default=data_path('faiss_index'))
+    parser.add_argument('--corpus', default=data_path('corpus.csv'))
+    parser.add_argument('--chunks', default=data_path('corpus.chunks'), help="Memory-mappable chunk store to write")
+    parser.add_argument('--manifest', default=data_path('manifest.json'))
+    parser.add_argument('--model', default=DEFAULT_MODEL_NAME)
+    parser.add_argument('--no-normalize', action='store_true', help="Keep raw vectors and search by L2")
+    parser.add_argument('--storage', choices=['float32', *FLAT_STORAGE], default='float32')
+    parser.add_argument('--backend', choices=ENCODER_BACKENDS, default='torch', help="Encoder runtime")
+    parser.add_argument('--onnx-path', help="Exported encoder directory for the onnx backend")
+    parser.add_argument('--subject', help="Subject for sources whose name does not give one")
+    parser.add_argument('--grade', help="Grade for sources whose name does not give one")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    ingestor = Ingestor(
+        args.index,
+        args.corpus,
+        args.manifest,
+        chunks_path=args.chunks,
+        model_name=args.model,
+        normalize=not args.no_normalize,
+        storage=args.storage,
+        encoder_backend=args.backend,
+        encoder_path=args.onnx_path,
+    )
+    print(ingestor.ingest(args.sources, subject=args.subject, grade=args.grade))
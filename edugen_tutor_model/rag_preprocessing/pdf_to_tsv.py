@@ -1,7 +1,17 @@
-import pdfplumber
-import pandas as pd
+import csv
 import os
-import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pdfplumber
+
+from edugen_tutor_model.rag_preprocessing.chunker import DEFAULT_MAX_TOKENS, DEFAULT_OVERLAP_TOKENS, chunk_pages
+
+# Columns of the chunk TSV; everything but content is metadata used to filter retrieval
+CHUNK_COLUMNS = ['content', 'subject', 'topic', 'grade', 'source_page', 'section']
+# Pages each worker extracts per task; small enough to spread one long textbook over several workers
+DEFAULT_PAGES_PER_TASK = 8
 
 # Get current script directory
 script_dir = os.path.dirname(__file__)
@@ -12,43 +22,119 @@ pdf_path = os.path.join(script_dir, '../topical_notes/grade_6_science.pdf')
 # Path to the output TSV file
 tsv_path = os.path.join(script_dir, 'grade_6_science_notes.tsv')
 
-def convert_pdf_to_tsv(pdf_path, tsv_path):
+def page_texts(pdf_path, start=0, stop=None):
     """
-    Extract text from a PDF and save it to a .tsv file.
-    Combines lines based on topics for more meaningful content in each row.
+    Extract the text of pages [start, stop) as (page_number, text) pairs.
+    Each page's parsed layout is released once its text is read, so long PDFs do not pile up in memory.
     """
-    data = []
-    current_topic = []
+    texts = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages[start:stop]:
+            texts.append((page.page_number, page.extract_text()))
+            page.close()
+    return texts
 
-    # Define topic title by checking for full uppercase words
-    header_pattern = re.compile(r'^[A-Z ]+$')
 
+def page_count(pdf_path):
     with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text()
-            if text:
-                # Split text into lines
-                lines = text.split('\n')
-                for line in lines:
-                    # Check if the line is a header (topic title)
-                    if header_pattern.match(line.strip()):
-                        # If there is an existing topic, save it as a row
-                        if current_topic:
-                            data.append([" ".join(current_topic)])
-                            current_topic = []
-                    # Append the line to the current topic
-                    current_topic.append(line.strip())
-
-    # Add the last topic if any
-    if current_topic:
-        data.append([" ".join(current_topic)])
-
-    # Convert the data to a DataFrame
-    df = pd.DataFrame(data)
-
-    # Save the DataFrame to a TSV file
-    df.to_csv(tsv_path, sep='\t', index=True, header=False)
+        return len(pdf.pages)
+
+
+def extract_chunks(pdf_path, subject='Science', grade='6', max_tokens=DEFAULT_MAX_TOKENS,
+                   overlap_tokens=DEFAULT_OVERLAP_TOKENS):
+    """
+    Extract text from a PDF as token-bounded chunks that follow its topic and section headings
+    """
+    return list(chunk_pages(page_texts(pdf_path), subject, grade, max_tokens, overlap_tokens))
+
+
+def write_chunks(chunks, tsv_path):
+    """
+    Stream chunk rows to a TSV with a header row as they are produced, replacing the file atomically.
+    Returns the number of rows written.
+    """
+    rows = 0
+    with open(f"{tsv_path}.tmp", 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CHUNK_COLUMNS, delimiter='\t')
+        writer.writeheader()
+        for chunk in chunks:
+            writer.writerow(chunk)
+            rows += 1
+    os.replace(f"{tsv_path}.tmp", tsv_path)
+    return rows
+
+
+def convert_pdf_to_tsv(pdf_path, tsv_path, subject='Science', grade='6', max_tokens=DEFAULT_MAX_TOKENS,
+                       overlap_tokens=DEFAULT_OVERLAP_TOKENS):
+    """
+    Extract text from a PDF and save it to a .tsv file.
+    Combines lines based on topics and sections for more meaningful content in each row.
+    """
+    write_chunks(chunk_pages(page_texts(pdf_path), subject, grade, max_tokens, overlap_tokens), tsv_path)
     print(f'Successfully converted PDF to .tsv and saved at: {tsv_path}')
 
-# Run the conversion function
-convert_pdf_to_tsv(pdf_path, tsv_path)
+
+def _extract_range(pdf_path, start, stop):
+    started = time.monotonic()
+    texts = page_texts(pdf_path, start, stop)
+    return texts, time.monotonic() - started
+
+
+def convert_pdfs_to_tsv(jobs, workers=None, pages_per_task=DEFAULT_PAGES_PER_TASK, max_tokens=DEFAULT_MAX_TOKENS,
+                        overlap_tokens=DEFAULT_OVERLAP_TOKENS):
+    """
+    Convert many PDFs in a process pool. Each job is a (pdf_path, tsv_path, subject, grade) tuple.
+    Page ranges of every PDF are extracted in parallel, then chunked and streamed to each PDF's TSV
+    in page order while later pages are still being extracted. At most two ranges per worker are in flight,
+    so extracted text waiting to be written does not pile up in memory for large batches.
+    Yields a summary per PDF as each one is written: pages, chunks, seconds of worker time spent
+    extracting it, and wall-clock seconds since the previous PDF was written.
+    """
+    page_counts = [page_count(pdf_path) for pdf_path, _, _, _ in jobs]
+    workers = workers or os.cpu_count() or 1
+    # Page ranges of all PDFs in the order they are written; the window runs across PDF boundaries,
+    # so workers move on to the next PDF while one is written
+    ranges = (
+        (pdf_path, start, start + pages_per_task)
+        for (pdf_path, _, _, _), pages in zip(jobs, page_counts)
+        for start in range(0, pages, pages_per_task)
+    )
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque()
+
+        def submit_next():
+            page_range = next(ranges, None)
+            if page_range is not None:
+                in_flight.append(executor.submit(_extract_range, *page_range))
+
+        for _ in range(workers * 2):
+            submit_next()
+
+        started = time.monotonic()
+        for (pdf_path, tsv_path, subject, grade), pages in zip(jobs, page_counts):
+            extract_seconds = 0.0
+
+            def ordered_pages():
+                nonlocal extract_seconds
+                for _ in range(0, pages, pages_per_task):
+                    texts, seconds = in_flight.popleft().result()
+                    submit_next()
+                    extract_seconds += seconds
+                    yield from texts
+
+            chunks = write_chunks(chunk_pages(ordered_pages(), subject, grade, max_tokens, overlap_tokens), tsv_path)
+            finished = time.monotonic()
+            yield {
+                'pdf_path': pdf_path,
+                'tsv_path': tsv_path,
+                'pages': pages,
+                'chunks': chunks,
+                'extract_seconds': round(extract_seconds, 2),
+                'seconds': round(finished - started, 2),
+            }
+            started = finished
+
+if __name__ == "__main__":
+    # Run the conversion function
+    convert_pdf_to_tsv(pdf_path, tsv_path)
@@ -0,0 +1,13 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Topic, TopicOverview
+
+
+@receiver(post_save, sender=Topic)
+def invalidate_topic_overview(sender, instance, created, **kwargs):
+    """
+    Drop the cached overview when a topic is edited so it is regenerated from the new details
+    """
+    if not created:
+        TopicOverview.objects.filter(topic=instance).delete()
@@ -1,3 +1,1040 @@
-from django.test import TestCase
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import faiss
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import QueryDict
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from edugen_tutor_model.answer_cache import lookup_answer, store_answer
+from edugen_tutor_model.models import CachedAnswer, Chat, Subject, Topic, TopicOverview
+from edugen_tutor_model.overview_cache import get_topic_overview, invalidate_overviews
+from edugen_tutor_model.rag.context_builder import build_context
+from edugen_tutor_model.rag.encoders import OnnxEncoder, cosine_agreement, l2_normalize, mean_pool
+from edugen_tutor_model.rag.query_batcher import QueryBatcher
+from edugen_tutor_model.rag.query_cache import LRUCache, normalize_query
+from edugen_tutor_model.rag.reranker import Reranker
+from edugen_tutor_model.rag.retriever import Retriever, reciprocal_rank_fusion
+from edugen_tutor_model.rag.tokens import count_tokens
+from edugen_tutor_model.rag_preprocessing.bm25_index import BM25Index, bm25_index_path, write_bm25_index
+from edugen_tutor_model.rag_preprocessing.chunk_store import ChunkStore, InMemoryChunks, open_chunks, write_chunk_store
+from edugen_tutor_model.rag_preprocessing.chunker import chunk_pages
+from edugen_tutor_model.rag_preprocessing import ingest
+from edugen_tutor_model.rag_preprocessing.embeddings_indexing import (
+    apply_search_params,
+    build_index,
+    index_metadata_path,
+    load_index_metadata,
+    read_index,
+    write_index,
+)
+from edugen_tutor_model.rag_preprocessing.pdf_to_tsv import convert_pdfs_to_tsv, extract_chunks, write_chunks
+from edugen_tutor_model.views import wants_answer_cache
+
+PAGES = [
+    (1, "PLANTS\nParts of a plant\nPlants are living organisms. They make their own food.\n"
+        "Roots absorb water and minerals from the\nsoil. Stems carry water to the leaves.\n"
+        "Types of Roots\n• Tap Roots:\n1. One main root grows deep.\n"),
+    (2, "• Fibrous Roots:\n1. Many thin roots spread near the surface.\nANIMALS\n"
+        "Insects have six legs. Spiders have eight legs."),
+]
+
+
+class ChunkerTests(SimpleTestCase):
+    def test_chunks_stay_within_budget_and_break_between_sentences(self):
+        chunks = list(chunk_pages(PAGES, max_tokens=20, overlap_tokens=0))
+
+        for chunk in chunks:
+            self.assertLessEqual(count_tokens(chunk['content']), 20)
+            self.assertTrue(chunk['content'].endswith('.'), chunk['content'])
+        self.assertIn("Roots absorb water and minerals from the soil.", " ".join(c['content'] for c in chunks))
+
+    def test_chunks_do_not_cross_headings_and_record_header_path(self):
+        chunks = list(chunk_pages(PAGES, subject='Science', grade='6'))
+
+        self.assertEqual(
+            [(c['topic'], c['section'], c['source_page']) for c in chunks],
+            [
+                ('Plants', 'Plants > Parts of a plant', 1),
+                ('Plants', 'Plants > Types of Roots', 1),
+                ('Animals', 'Animals', 2),
+            ],
+        )
+        self.assertTrue(chunks[1]['content'].startswith('Plants > Types of Roots: • Tap Roots: 1. One main root'))
+        self.assertIn('• Fibrous Roots: 1. Many thin roots', chunks[1]['content'])
+
+    def test_consecutive_chunks_overlap_by_trailing_sentences(self):
+        chunks = list(chunk_pages(PAGES, max_tokens=24, overlap_tokens=12))
+        section = [c['content'] for c in chunks if c['section'] == 'Plants > Parts of a plant']
+
+        self.assertGreater(len(section), 1)
+        for previous, current in zip(section, section[1:]):
+            last_sentence = previous.rsplit('. ', 1)[-1]
+            self.assertIn(last_sentence, current)
+
+    def test_overlap_must_be_smaller_than_chunk(self):
+        with self.assertRaises(ValueError):
+            list(chunk_pages(PAGES, max_tokens=10, overlap_tokens=10))
+
+
+def result(chunk_id, content, section=None):
+    return {'id': chunk_id, 'content': content, 'score': 1.0, 'metadata': {'section': section}}
+
+
+class ContextBuilderTests(SimpleTestCase):
+    def test_packs_ranked_chunks_within_budget(self):
+        results = [
+            result(1, "Plants > Roots: Roots absorb water. Roots anchor the plant.", 'Plants > Roots'),
+            result(2, "Plants > Stems: Stems carry water. Stems hold up leaves.", 'Plants > Stems'),
+        ]
+
+        context = build_context(results, max_tokens=1000)
+
+        self.assertEqual(context['chunk_ids'], [1, 2])
+        self.assertEqual(
+            context['text'],
+            "1. Plants > Roots: Roots absorb water. Roots anchor the plant.\n"
+            "2. Plants > Stems: Stems carry water. Stems hold up leaves.",
+        )
+        self.assertEqual(context['tokens'], count_tokens(context['text']))
+        self.assertFalse(context['truncated'])
+
+    def test_drops_sentences_repeated_by_overlapping_chunks(self):
+        results = [
+            result(1, "Plants > Roots: Roots absorb water. Roots anchor the plant.", 'Plants > Roots'),
+            result(2, "Plants > Roots: Roots anchor the plant. Some roots store food.", 'Plants > Roots'),
+            result(3, "Plants > Roots: Roots absorb water.", 'Plants > Roots'),
+        ]
+
+        context = build_context(results, max_tokens=1000)
+
+        self.assertEqual(context['chunk_ids'], [1, 2])
+        self.assertEqual(context['duplicates'], 1)
+        self.assertEqual(context['text'].splitlines()[1], "2. Plants > Roots: Some roots store food.")
+
+    def test_truncates_at_sentence_boundary(self):
+        results = [
+            result(1, "Roots absorb water. Roots anchor the plant."),
+            result(2, "Stems carry water. Stems hold up leaves. Some stems store food."),
+        ]
+        budget = count_tokens("1. Roots absorb water. Roots anchor the plant.\n2. Stems carry water.") + 1
+
+        context = build_context(results, max_tokens=budget)
+
+        self.assertLessEqual(context['tokens'], budget)
+        self.assertTrue(context['truncated'])
+        self.assertTrue(context['text'].endswith("2. Stems carry water."))
+
+
+class QueryBatcherTests(SimpleTestCase):
+    def test_concurrent_searches_share_batches(self):
+        batch_sizes = []
+        first_batch_running = threading.Event()
+        release_first_batch = threading.Event()
+
+        def search_many(requests):
+            batch_sizes.append(len(requests))
+            if len(batch_sizes) == 1:
+                first_batch_running.set()
+                release_first_batch.wait(5)
+            return [request['query'].upper() for request in requests]
+
+        batcher = QueryBatcher(search_many, max_batch_size=8, max_wait=0.05)
+        with ThreadPoolExecutor(9) as executor:
+            first = executor.submit(batcher.submit, {'query': 'first'})
+            first_batch_running.wait(5)
+            # These queue up while the first batch runs and are then searched together
+            rest = [executor.submit(batcher.submit, {'query': f'q{i}'}) for i in range(8)]
+            while batcher._pending < 8:
+                time.sleep(0.001)
+            release_first_batch.set()
+
+            self.assertEqual(first.result(5), 'FIRST')
+            self.assertEqual([future.result(5) for future in rest], [f'Q{i}' for i in range(8)])
+        self.assertEqual(batch_sizes, [1, 8])
+
+    def test_batch_errors_reach_every_caller(self):
+        def search_many(requests):
+            raise RuntimeError('index unavailable')
+
+        batcher = QueryBatcher(search_many, max_batch_size=4, max_wait=0.01)
+        with self.assertRaisesMessage(RuntimeError, 'index unavailable'):
+            batcher.submit({'query': 'q'})
+
+
+class QueryCacheTests(SimpleTestCase):
+    def test_evicts_least_recently_used_and_counts_hits(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+        self.assertEqual(cache.as_dict(), {'hits': 3, 'misses': 1, 'hit_ratio': 0.75, 'size': 2, 'maxsize': 2})
+
+    def test_queries_differing_in_case_and_spacing_share_a_key(self):
+        self.assertEqual(
+            normalize_query(' Give me an overview of  the topic Plants\n'),
+            normalize_query('give me an overview of the topic plants'),
+        )
+
+
+class HybridSearchTests(SimpleTestCase):
+    def test_bm25_ranks_chunks_by_query_terms(self):
+        corpus = pd.DataFrame({
+            'id': [11, 22, 33],
+            'content': [
+                "Friction slows objects sliding down slopes.",
+                "Plants make food from sunlight in their leaves.",
+                "Roots take in water; leaves lose water.",
+            ],
+        })
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'corpus.bm25')
+            write_bm25_index(path, corpus)
+            index = BM25Index(path)
+
+            ids, scores = index.search("How do plant roots take in water?", top_k=5)
+            self.assertEqual(ids.tolist(), [33, 22])
+            self.assertGreater(scores[0], scores[1])
+
+            ids, _ = index.search("water", top_k=5, allowed=np.array([True, True, False]))
+            self.assertEqual(ids.tolist(), [])
+            del index
+
+    def test_reciprocal_rank_fusion_rewards_agreement(self):
+        fused = reciprocal_rank_fusion(['a', 'b', 'c'], ['b', 'd'], k=60)
+        self.assertEqual([chunk_id for chunk_id, _ in fused], ['b', 'a', 'd', 'c'])
+        self.assertAlmostEqual(fused[0][1], 1 / 62 + 1 / 61)
+
+
+class FakeCrossEncoder:
+    """
+    Scores a pair by how many query words the content contains, optionally after a delay
+    """
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+
+    def predict(self, pairs, **kwargs):
+        time.sleep(self.delay)
+        return [len(set(query.split()) & set(content.split())) for query, content in pairs]
+
+
+class RerankerTests(SimpleTestCase):
+    results = [
+        {'id': 1, 'content': "plants need sunlight"},
+        {'id': 2, 'content': "roots take in water and minerals"},
+        {'id': 3, 'content': "leaves lose water"},
+    ]
+
+    def reranker(self, model, time_budget=1.0):
+        reranker = Reranker(model_name='fake', time_budget=time_budget, workers=1, batch_size=2)
+        reranker._model = model
+        return reranker
+
+    def test_keeps_the_best_scored_chunks(self):
+        reranking = self.reranker(FakeCrossEncoder()).rerank("how do roots take in water", self.results, top_k=2)
+
+        self.assertTrue(reranking['reranked'])
+        self.assertEqual([result['id'] for result in reranking['results']], [2, 3])
+        self.assertEqual(reranking['results'][0]['rerank_score'], 4)
+
+    def test_falls_back_to_retrieval_order_over_budget(self):
+        reranker = self.reranker(FakeCrossEncoder(delay=0.2), time_budget=0.02)
+        started = time.monotonic()
+        reranking = reranker.rerank("how do roots take in water", self.results, top_k=2)
+
+        self.assertLess(time.monotonic() - started, 0.15)
+        self.assertFalse(reranking['reranked'])
+        self.assertEqual(reranking['results'], self.results)
+        self.assertEqual((reranker.reranked, reranker.fallbacks), (0, 1))
+
+    def test_falls_back_when_the_model_fails(self):
+        class BrokenCrossEncoder:
+            def predict(self, pairs, **kwargs):
+                raise RuntimeError('model unavailable')
+
+        reranking = self.reranker(BrokenCrossEncoder()).rerank("water", self.results, top_k=2)
+        self.assertFalse(reranking['reranked'])
+        self.assertEqual(reranking['results'], self.results)
+
+
+def write_retrieval_files(directory, corpus, dimension=4):
+    """
+    Write corpus.csv and an ID-mapped inner-product index of random unit vectors for it
+    """
+    corpus_path = os.path.join(directory, 'corpus.csv')
+    index_path = os.path.join(directory, 'faiss_index')
+    corpus.to_csv(corpus_path, index=False)
+    vectors = np.random.default_rng(0).normal(size=(len(corpus), dimension)).astype('float32')
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+    index.add_with_ids(vectors, np.asarray(corpus['id'], dtype='int64'))
+    write_index(index, {'index_type': 'flat', 'metric': 'ip', 'id_map': True}, index_path)
+    return index_path, corpus_path
+
+
+class StubEncoder:
+    """
+    Encodes a text as a unit vector seeded by its hash, or as the vector given for it, and records what it encoded
+    """
+
+    def __init__(self, dimension=4, vectors=None):
+        self.dimension = dimension
+        self.vectors = vectors or {}
+        self.encoded = []
+
+    def encode(self, texts, normalize_embeddings=False, **kwargs):
+        self.encoded.extend(texts)
+        rows = []
+        for text in texts:
+            vector = self.vectors.get(text)
+            if vector is None:
+                seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'big')
+                vector = np.random.default_rng(seed).normal(size=self.dimension)
+            rows.append(vector / np.linalg.norm(vector))
+        return np.asarray(rows, dtype='float32').reshape(len(texts), self.dimension)
+
+
+class RetrieverStateTests(SimpleTestCase):
+    corpus = pd.DataFrame({
+        'id': [101, 102, 103, 104],
+        'content': ["Plants need light.", "Roots take in water.", "Friction slows objects.", "Levers lift loads."],
+        'subject': ['Science', 'Science', 'Science', 'Science'],
+        'topic': ['Plants', 'Plants', 'Forces', 'Machines'],
+        'grade': ['6', '6', '6', '7'],
+    })
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        index_path, corpus_path = write_retrieval_files(self.tmp.name, self.corpus)
+        self.retriever = Retriever(index_path, corpus_path, reload_interval=0, mmap=False, max_batch_size=1)
+
+    def test_candidate_ids_relax_the_most_specific_filter(self):
+        state = self.retriever.state
+
+        self.assertEqual(state.candidate_ids(topic=' plants ', grade='6').tolist(), [101, 102])
+        # No grade 7 chunk is about plants, so the topic is dropped before the grade
+        self.assertEqual(state.candidate_ids(topic='Plants', grade='7').tolist(), [104])
+        self.assertEqual(state.candidate_ids(topic='Volcanoes', subject='science').tolist(), [101, 102, 103, 104])
+        self.assertIsNone(state.candidate_ids(topic='Volcanoes', subject='History'))
+        self.assertIsNone(state.candidate_ids())
+
+    def test_version_changes_when_the_corpus_changes(self):
+        version = self.retriever.version
+        self.assertEqual(len(version), 12)
+        self.assertEqual(self.retriever.version, version)
+
+        corpus = self.corpus.assign(content=self.corpus['content'] + " Updated.")
+        write_retrieval_files(self.tmp.name, corpus)
+        os.utime(index_metadata_path(self.retriever.index_path), ns=(0, 0))
+        self.assertNotEqual(self.retriever.version, version)
+
+    def test_version_is_the_same_for_the_same_files_elsewhere(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            index_path, corpus_path = write_retrieval_files(tmp, self.corpus)
+            os.utime(corpus_path, ns=(0, 0))
+            copy = Retriever(index_path, corpus_path, reload_interval=0, mmap=False, max_batch_size=1)
+            self.assertEqual(copy.version, self.retriever.version)
+
+
+class RetrieverReloadTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.index_path, self.corpus_path = write_retrieval_files(self.tmp.name, RetrieverStateTests.corpus)
+        self.retriever = Retriever(self.index_path, self.corpus_path, reload_interval=0, mmap=False, max_batch_size=1)
+        self.retriever._model = StubEncoder()
+        self.writes = 0
+
+    def touch(self, path):
+        # Distinct modification times, however coarse the filesystem's clock
+        self.writes += 1
+        os.utime(path, ns=(self.writes, self.writes))
+
+    def rebuild(self, corpus):
+        write_retrieval_files(self.tmp.name, corpus)
+        self.touch(index_metadata_path(self.index_path))
+
+    def test_changed_build_swaps_in_a_new_state(self):
+        old_state = self.retriever.state
+        corpus = pd.DataFrame({'id': [201, 202], 'content': ["Magnets attract iron.", "Sound is a vibration."]})
+
+        self.rebuild(corpus)
+
+        new_state = self.retriever.state
+        self.assertIsNot(new_state, old_state)
+        self.assertNotEqual(new_state.version, old_state.version)
+        self.assertEqual({result['id'] for result in self.retriever.search("magnets", top_k=5)}, {201, 202})
+        # Searches still holding the old state keep reading the old corpus
+        self.assertEqual(old_state.content(101), "Plants need light.")
+
+    def test_failed_reload_keeps_the_old_version(self):
+        state = self.retriever.state
+        # An index with more vectors than the corpus has rows cannot be loaded
+        self.rebuild(RetrieverStateTests.corpus)
+        RetrieverStateTests.corpus.head(2).to_csv(self.corpus_path, index=False)
+        self.touch(index_metadata_path(self.index_path))
+
+        with self.assertLogs('edugen_tutor_model.rag.retriever', 'WARNING') as logs:
+            self.assertIs(self.retriever.state, state)
+        self.assertIn(f"keeping version {state.version}", logs.output[0])
+
+        self.rebuild(RetrieverStateTests.corpus.assign(content="Replaced."))
+        self.assertIsNot(self.retriever.state, state)
+
+    def test_reload_waits_for_the_index_metadata(self):
+        state = self.retriever.state
+        # A build writes its corpus first; the index and then its metadata follow
+        RetrieverStateTests.corpus.assign(content="Rewritten.").to_csv(self.corpus_path, index=False)
+        self.touch(self.corpus_path)
+        self.assertIs(self.retriever.state, state)
+
+        self.touch(index_metadata_path(self.index_path))
+        self.assertEqual(self.retriever.state.content(101), "Rewritten.")
+
+
+class HybridMinScoreTests(SimpleTestCase):
+    def test_min_score_drops_chunks_only_bm25_found(self):
+        corpus = RetrieverStateTests.corpus
+        with tempfile.TemporaryDirectory() as tmp:
+            index_path, corpus_path = write_retrieval_files(tmp, corpus)
+            write_bm25_index(bm25_index_path(corpus_path), corpus)
+            retriever = Retriever(index_path, corpus_path, mmap=False, max_batch_size=1)
+            # The query embeds exactly like chunk 101 but its words only appear in chunk 102
+            query = "roots water"
+            retriever._model = StubEncoder(vectors={query: retriever.state.index.reconstruct(101)})
+
+            results = retriever.search(query, top_k=4)
+            self.assertIn(102, [result['id'] for result in results])
+            self.assertIsNotNone(results[0]['bm25_score'])
+
+            results = retriever.search(query, top_k=4, min_score=0.99)
+            self.assertEqual([result['id'] for result in results], [101])
+            self.assertAlmostEqual(results[0]['dense_score'], 1.0, places=5)
+            del retriever
+
+
+def write_pdf(path, pages):
+    """
+    Write a minimal PDF with a page of Helvetica text lines per entry of pages
+    """
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        shown = b" ".join(b"(%s) Tj T*" % line.encode('latin-1') for line in lines)
+        text = b"BT /F1 12 Tf 72 720 Td 16 TL %s ET" % shown
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(text), text))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> "
+            b"/Contents %d 0 R >>" % len(objects)
+        )
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), len(kids))
+
+    with open(path, 'wb') as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        f.writelines(b"%010d 00000 n \n" % offset for offset in offsets)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+class InlineExecutor:
+    """
+    Runs submitted extractions immediately, tracking how many results are waiting to be collected
+    """
+    instances = []
+
+    def __init__(self, max_workers=None):
+        self.submitted = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        InlineExecutor.instances.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, fn, *args):
+        result = fn(*args)
+        self.submitted += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+        def collect():
+            self.in_flight -= 1
+            return result
+
+        return SimpleNamespace(result=collect)
+
+
+class PdfExtractionTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.jobs = []
+        for name, subject, pages in (('grade_6_science', 'Science', PAGES), ('grade_7_science', 'Science', PAGES * 2)):
+            pdf_path = os.path.join(self.tmp.name, f'{name}.pdf')
+            write_pdf(pdf_path, [text.replace('•', '-').split('\n') for _, text in pages])
+            self.jobs.append((pdf_path, os.path.join(self.tmp.name, f'{name}.tsv'), subject, name[6]))
+
+    def read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def test_parallel_extraction_matches_serial_extraction(self):
+        results = list(convert_pdfs_to_tsv(self.jobs, workers=2, pages_per_task=1, max_tokens=20, overlap_tokens=0))
+
+        self.assertEqual([(result['pages'], result['tsv_path']) for result in results],
+                         [(2, self.jobs[0][1]), (4, self.jobs[1][1])])
+        for (pdf_path, tsv_path, subject, grade), result in zip(self.jobs, results):
+            serial_path = os.path.join(self.tmp.name, 'serial.tsv')
+            serial_chunks = extract_chunks(pdf_path, subject, grade, max_tokens=20, overlap_tokens=0)
+            chunks = write_chunks(serial_chunks, serial_path)
+            self.assertGreater(chunks, 1)
+            self.assertEqual(result['chunks'], chunks)
+            self.assertEqual(self.read(tsv_path), self.read(serial_path))
+
+    def test_page_ranges_in_flight_are_bounded(self):
+        InlineExecutor.instances.clear()
+        with mock.patch('edugen_tutor_model.rag_preprocessing.pdf_to_tsv.ProcessPoolExecutor', InlineExecutor):
+            results = list(convert_pdfs_to_tsv(self.jobs, workers=1, pages_per_task=1))
+
+        executor, = InlineExecutor.instances
+        self.assertEqual(executor.submitted, sum(result['pages'] for result in results))
+        self.assertEqual(executor.peak_in_flight, 2)
+        self.assertEqual(executor.in_flight, 0)
+
+
+class IncrementalIngestionTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.forces = self.write_tsv('grade_6_forces.tsv', ["Friction slows objects.", "Gravity pulls objects down."])
+        self.plants = self.write_tsv('grade_6_plants.tsv', ["Plants need light.", "Roots take in water."])
+
+    def write_tsv(self, name, contents):
+        path = os.path.join(self.tmp.name, name)
+        pd.DataFrame({'content': contents, 'topic': 'Notes', 'source_page': 1}).to_csv(path, sep='\t', index=False)
+        return path
+
+    def ingest(self):
+        ingestor = ingest.Ingestor(
+            os.path.join(self.tmp.name, 'faiss_index'),
+            os.path.join(self.tmp.name, 'corpus.csv'),
+            os.path.join(self.tmp.name, 'manifest.json'),
+            chunks_path=os.path.join(self.tmp.name, 'corpus.chunks'),
+        )
+        ingestor._model = StubEncoder()
+        with mock.patch.object(ingest, 'read_source_chunks', wraps=ingest.read_source_chunks) as read_source_chunks:
+            summary = ingestor.ingest([self.forces, self.plants])
+        return summary, ingestor._model.encoded, [call.args[0] for call in read_source_chunks.call_args_list]
+
+    def test_reingestion_only_embeds_changed_chunks(self):
+        summary, encoded, reread = self.ingest()
+        self.assertEqual((summary['chunks'], summary['added'], summary['removed']), (4, 4, 0))
+        self.assertEqual(len(encoded), 4)
+        self.assertEqual(reread, [self.forces, self.plants])
+
+        self.write_tsv('grade_6_plants.tsv', ["Roots take in water.", "Leaves make food from sunlight."])
+        summary, encoded, reread = self.ingest()
+
+        self.assertEqual(encoded, ["Leaves make food from sunlight."])
+        self.assertEqual(reread, [self.plants])
+        self.assertEqual((summary['sources_reread'], summary['added'], summary['removed']), (1, 1, 1))
+
+        expected = {
+            ingest.chunk_id(content): content
+            for content in ["Friction slows objects.", "Gravity pulls objects down.", "Roots take in water.",
+                            "Leaves make food from sunlight."]
+        }
+        corpus = pd.read_csv(os.path.join(self.tmp.name, 'corpus.csv'), dtype={'grade': str})
+        self.assertEqual(dict(zip(corpus['id'], corpus['content'])), expected)
+        self.assertEqual(set(corpus['subject']), {'Forces', 'Plants'})
+
+        retriever = Retriever(
+            os.path.join(self.tmp.name, 'faiss_index'), os.path.join(self.tmp.name, 'corpus.chunks'),
+            mmap=False, max_batch_size=1,
+        )
+        state = retriever.state
+        self.assertEqual(set(state.indexed_ids.tolist()), set(expected))
+        self.assertEqual(len(state.unresolved_ids()), 0)
+        for chunk_id, content in expected.items():
+            self.assertEqual(state.content(chunk_id), content)
+        with self.assertRaises(KeyError):
+            state.position(ingest.chunk_id("Plants need light."))
+        del state, retriever
+
+
+class ChunkStoreTests(SimpleTestCase):
+    corpus = pd.DataFrame({
+        'id': [7, 3, 9],
+        'content': ["Photosynthèse: plants turn light → sugar 🌱", "Water boils at 100 °C.", ""],
+        'subject': ['Science', None, 'Science'],
+        'topic': ['Plants', 'Plants', np.nan],
+        'grade': ['6', '6', None],
+        'source_page': pd.array([1, None, 3], dtype='Int64'),
+    })
+
+    def test_chunk_store_round_trips_like_the_csv_adapter(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store_path = os.path.join(tmp, 'corpus.chunks')
+            csv_path = os.path.join(tmp, 'corpus.csv')
+            write_chunk_store(store_path, self.corpus)
+            self.corpus.to_csv(csv_path, index=False)
+            store, in_memory = open_chunks(store_path), open_chunks(csv_path)
+
+            self.assertIsInstance(store, ChunkStore)
+            self.assertIsInstance(in_memory, InMemoryChunks)
+            self.assertEqual(len(store), len(in_memory))
+            self.assertEqual(store.ids.tolist(), [7, 3, 9])
+            self.assertEqual(in_memory.ids.tolist(), [7, 3, 9])
+            for position, row in enumerate(self.corpus.to_dict('records')):
+                self.assertEqual(store.content(position), row['content'])
+                self.assertEqual(in_memory.content(position), row['content'])
+                self.assertEqual(repr(store.metadata(position)), repr(in_memory.metadata(position)))
+
+            self.assertEqual(
+                [store.metadata(position) for position in range(3)],
+                [
+                    {'subject': 'Science', 'topic': 'Plants', 'grade': '6', 'source_page': 1},
+                    {'subject': None, 'topic': 'Plants', 'grade': '6', 'source_page': None},
+                    {'subject': 'Science', 'topic': None, 'grade': None, 'source_page': 3},
+                ],
+            )
+            del store
+
+
+class IndexBuildTests(SimpleTestCase):
+    embeddings = np.random.default_rng(0).normal(size=(1000, 16)).astype('float32')
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    queries = embeddings[:50]
+    # Small enough for 1000 vectors; ivf_pq's 4-bit codes need 16 training points per centroid
+    approximate = {
+        'ivf_flat': {'nlist': 8, 'nprobe': 8},
+        'ivf_pq': {'nlist': 4, 'pq_m': 4, 'pq_bits': 4},
+        'hnsw': {'hnsw_m': 8},
+    }
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.index_path = os.path.join(self.tmp.name, 'faiss_index')
+
+    def self_recall(self, index, k=5):
+        # Every query is a stored vector, so its exact nearest neighbour is itself
+        _, ids = index.search(self.queries, k)
+        return np.mean([i in row for i, row in enumerate(ids)])
+
+    def test_approximate_indexes_find_stored_vectors(self):
+        for index_type, params in self.approximate.items():
+            with self.subTest(index_type):
+                index, metadata = build_index(self.embeddings, index_type=index_type, metric='ip', **params)
+
+                self.assertEqual(index.ntotal, len(self.embeddings))
+                self.assertEqual(index.metric_type, faiss.METRIC_INNER_PRODUCT)
+                self.assertEqual((metadata['index_type'], metadata['metric'], metadata['ntotal']),
+                                 (index_type, 'ip', len(self.embeddings)))
+                # Product quantization is lossy; the other types search these settings exhaustively enough
+                self.assertGreaterEqual(self.self_recall(index), 0.8 if index_type == 'ivf_pq' else 1.0)
+
+        _, metadata = build_index(self.embeddings, index_type='ivf_pq', **self.approximate['ivf_pq'])
+        self.assertEqual(metadata['build_params'], {'nlist': 4, 'pq_m': 4, 'pq_bits': 4})
+        self.assertEqual(metadata['search_params'], {'nprobe': 4})
+
+    def test_invalid_builds_are_rejected(self):
+        with self.assertRaises(ValueError):
+            build_index(self.embeddings, index_type='lsh')
+        with self.assertRaises(ValueError):
+            build_index(self.embeddings, index_type='ivf_pq', nlist=4, pq_m=5)
+        with self.assertRaises(ValueError):
+            build_index(self.embeddings[:8], index_type='ivf_flat', nlist=16)
+        with self.assertRaises(ValueError):
+            build_index(self.embeddings, index_type='hnsw', storage='int8')
+
+    def test_metadata_sidecar_round_trips(self):
+        index, metadata = build_index(self.embeddings, index_type='hnsw', metric='ip', hnsw_m=8, ef_search=32)
+
+        written = write_index(index, metadata, self.index_path)
+
+        self.assertEqual(load_index_metadata(self.index_path), written)
+        self.assertEqual({key: value for key, value in written.items() if key != 'checksum'}, metadata)
+        with open(self.index_path, 'rb') as f:
+            self.assertEqual(written['checksum'], hashlib.sha256(f.read()).hexdigest())
+        self.assertEqual(load_index_metadata(os.path.join(self.tmp.name, 'missing')), {})
+
+    def test_memory_mapped_indexes_search_like_loaded_ones(self):
+        for index_type, params in {'flat': {}, **self.approximate}.items():
+            with self.subTest(index_type):
+                # A path per type, so the mapping found below cannot be left over from another type
+                index_path = f"{self.index_path}_{index_type}"
+                index, metadata = build_index(self.embeddings, index_type=index_type, metric='ip', **params)
+                metadata = write_index(index, metadata, index_path)
+                expected = index.search(self.queries, 5)
+
+                mapped = read_index(index_path, metadata, mmap=True)
+                apply_search_params(mapped, metadata['search_params'])
+
+                np.testing.assert_array_equal(mapped.search(self.queries, 5)[1], expected[1])
+                np.testing.assert_allclose(mapped.search(self.queries, 5)[0], expected[0], rtol=1e-6)
+                if os.path.exists('/proc/self/maps'):
+                    with open('/proc/self/maps') as f:
+                        self.assertIn(index_path, f.read())
+
+
+def unit_vector(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@override_settings(
+    ANSWER_CACHE_ENABLED=True, ANSWER_CACHE_SIMILARITY_THRESHOLD=0.92, ANSWER_CACHE_MAX_ENTRIES_PER_TOPIC=2
+)
+class AnswerCacheTests(TestCase):
+    def setUp(self):
+        self.topic = Topic.objects.create(subject=Subject.objects.create(name='Science'), name='Plants')
+
+    def test_only_prompts_above_the_similarity_threshold_hit(self):
+        store_answer(self.topic, "What do plants need?", unit_vector(1, 0, 0), "Light and water")
+
+        self.assertEqual(lookup_answer(self.topic, unit_vector(1, 0.3, 0)), "Light and water")  # cosine 0.958
+        self.assertIsNone(lookup_answer(self.topic, unit_vector(1, 0.5, 0)))  # cosine 0.894
+        other_topic = Topic.objects.create(subject=self.topic.subject, name='Forces')
+        self.assertIsNone(lookup_answer(other_topic, unit_vector(1, 0, 0)))
+        self.assertEqual(CachedAnswer.objects.get(topic=self.topic).hit_count, 1)
+
+    def test_least_recently_used_answers_are_evicted_per_topic(self):
+        store_answer(self.topic, "first", unit_vector(1, 0, 0), "1")
+        store_answer(self.topic, "second", unit_vector(0, 1, 0), "2")
+        # Using the first answer makes the second the least recently used
+        self.assertEqual(lookup_answer(self.topic, unit_vector(1, 0, 0)), "1")
+        store_answer(self.topic, "third", unit_vector(0, 0, 1), "3")
+
+        self.assertEqual(sorted(CachedAnswer.objects.values_list('prompt', flat=True)), ["first", "third"])
+
+
+class OverviewCacheTests(TestCase):
+    def setUp(self):
+        self.topic = Topic.objects.create(subject=Subject.objects.create(name='Science'), name='Plants')
+        self.retriever = SimpleNamespace(version='build-1')
+        patcher = mock.patch('edugen_tutor_model.overview_cache.get_retriever', return_value=self.retriever)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        def generate(name, *args, **kwargs):
+            return f"Overview of {name} from {self.retriever.version}"
+
+        patcher = mock.patch('edugen_tutor_model.overview_cache.generate_topic_overview', side_effect=generate)
+        self.generate = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def overview(self):
+        return get_topic_overview(self.topic, 'faiss_index', 'corpus.chunks')
+
+    def test_overview_is_generated_once_and_then_served_from_the_cache(self):
+        self.assertEqual(self.overview(), "Overview of Plants from build-1")
+        self.assertEqual(self.overview(), "Overview of Plants from build-1")
+        self.assertEqual(self.generate.call_count, 1)
+
+    def test_expired_overview_is_regenerated(self):
+        self.overview()
+        expired = timezone.now() - settings.TOPIC_OVERVIEW_CACHE_TTL - timedelta(minutes=1)
+        TopicOverview.objects.update(generated_at=expired)
+        self.overview()
+        self.assertEqual(self.generate.call_count, 2)
+        self.assertEqual(TopicOverview.objects.count(), 1)
+
+    def test_prompt_version_bump_misses(self):
+        self.overview()
+        with mock.patch('edugen_tutor_model.overview_cache.OVERVIEW_PROMPT_VERSION', 1000):
+            self.overview()
+        self.assertEqual(self.generate.call_count, 2)
+
+    def test_other_corpus_versions_are_kept(self):
+        self.overview()
+        self.retriever.version = 'build-2'
+        self.assertEqual(self.overview(), "Overview of Plants from build-2")
+        # A host still serving the old build keeps hitting its overview
+        self.retriever.version = 'build-1'
+        self.assertEqual(self.overview(), "Overview of Plants from build-1")
+        self.assertEqual(self.generate.call_count, 2)
+        self.assertEqual(sorted(TopicOverview.objects.values_list('corpus_version', flat=True)), ['build-1', 'build-2'])
+
+    def test_invalidated_overview_is_regenerated(self):
+        self.overview()
+        self.assertEqual(invalidate_overviews([self.topic]), 1)
+        self.overview()
+        self.assertEqual(self.generate.call_count, 2)
+
+
+class WantsAnswerCacheTests(SimpleTestCase):
+    def request(self, data=None, query=''):
+        return SimpleNamespace(data=data if data is not None else {}, GET=QueryDict(query))
+
+    @override_settings(ANSWER_CACHE_ENABLED=True)
+    def test_use_cache_is_parsed_as_a_boolean(self):
+        self.assertTrue(wants_answer_cache(self.request()))
+        self.assertTrue(wants_answer_cache(self.request({'useCache': True})))
+        self.assertFalse(wants_answer_cache(self.request({'useCache': False})))
+        self.assertFalse(wants_answer_cache(self.request(QueryDict('useCache=false'))))
+        self.assertTrue(wants_answer_cache(self.request(QueryDict('useCache=True'))))
+        self.assertFalse(wants_answer_cache(self.request(query='useCache=0')))
+        self.assertFalse(wants_answer_cache(self.request({'useCache': 'Off'}, query='useCache=true')))
+
+    @override_settings(ANSWER_CACHE_ENABLED=False)
+    def test_disabled_cache_is_never_used(self):
+        self.assertFalse(wants_answer_cache(self.request({'useCache': True})))
+
+
+def read_events(response):
+    """
+    Parse a server-sent event stream into (event, data) pairs
+    """
+    events = []
+    for block in b''.join(response.streaming_content).decode('utf-8').strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def use_placeholder_rag_files(test):
+    """
+    Point RAG_INDEX_PATH and RAG_CORPUS_PATH at empty files for the test, for views that only check they exist
+    """
+    tmp = tempfile.TemporaryDirectory()
+    test.addCleanup(tmp.cleanup)
+    paths = {}
+    for setting, name in (('RAG_INDEX_PATH', 'faiss_index'), ('RAG_CORPUS_PATH', 'corpus.chunks')):
+        paths[setting] = os.path.join(tmp.name, name)
+        open(paths[setting], 'wb').close()
+    settings_override = override_settings(**paths)
+    settings_override.enable()
+    test.addCleanup(settings_override.disable)
+
+
+@override_settings(ANSWER_CACHE_ENABLED=False)
+class ChatStreamViewTests(TestCase):
+    def setUp(self):
+        use_placeholder_rag_files(self)
+        self.user = get_user_model().objects.create_user(
+            email='student@example.com',
+            password='password',
+            is_active=True
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.topic = Topic.objects.create(subject=Subject.objects.create(name='Science'), name='Plants')
+        self.url = reverse('chat-stream', args=[self.topic.id])
+
+    def stream(self, tokens, data):
+        with mock.patch('edugen_tutor_model.views.stream_response_with_retrieval', return_value=tokens) as generate:
+            response = self.client.post(self.url, data, format='json')
+        return response, generate
+
+    def test_tokens_are_streamed_before_the_saved_chat(self):
+        response, generate = self.stream(iter(["Plants ", "need ", "light."]), {'prompt': 'What do plants need?'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = read_events(response)
+        self.assertEqual(events[:3], [('token', {'token': token}) for token in ["Plants ", "need ", "light."]])
+        self.assertEqual([event for event, _ in events], ['token', 'token', 'token', 'done'])
+
+        chat = Chat.objects.get(user=self.user, topic=self.topic)
+        self.assertEqual((chat.prompt, chat.response), ('What do plants need?', 'Plants need light.'))
+        self.assertEqual(events[3][1]['id'], chat.id)
+        self.assertEqual(events[3][1]['response'], 'Plants need light.')
+        self.assertEqual(generate.call_args.kwargs['topic_name'], 'Plants')
+
+    def test_generation_error_ends_the_stream_with_an_error_event(self):
+        def tokens():
+            yield "Plants "
+            raise RuntimeError('model overloaded')
+
+        with self.assertLogs('edugen_tutor_model.views', 'ERROR'):
+            response, _ = self.stream(tokens(), {'prompt': 'What do plants need?'})
+            events = read_events(response)
+
+        self.assertEqual(events, [
+            ('token', {'token': 'Plants '}),
+            ('error', {'error': 'Error generating response: model overloaded'}),
+        ])
+        self.assertFalse(Chat.objects.exists())
+
+    def test_cached_overview_is_sent_as_one_token(self):
+        with mock.patch('edugen_tutor_model.views.lookup_overview', return_value="All about plants."), \
+                mock.patch('edugen_tutor_model.views.stream_topic_overview') as stream_topic_overview:
+            response = self.client.post(self.url, {'isInitialOverview': True}, format='json')
+            events = read_events(response)
+
+        stream_topic_overview.assert_not_called()
+        self.assertEqual([event for event, _ in events], ['token', 'done'])
+        self.assertEqual(Chat.objects.get(topic=self.topic).response, "All about plants.")
+
+    def test_missing_prompt_is_rejected(self):
+        response, generate = self.stream(iter([]), {})
+
+        self.assertEqual(response.status_code, 400)
+        generate.assert_not_called()
+        self.assertFalse(Chat.objects.exists())
+
+
+@override_settings(ANSWER_CACHE_ENABLED=False)
+class AsyncChatViewTests(TestCase):
+    def setUp(self):
+        use_placeholder_rag_files(self)
+        self.user = get_user_model().objects.create_user(
+            email='student@example.com',
+            password='password',
+            is_active=True
+        )
+        self.topic = Topic.objects.create(subject=Subject.objects.create(name='Science'), name='Plants')
+        self.url = reverse('chat-async', args=[self.topic.id])
+        self.headers = {'Authorization': f"Bearer {AccessToken.for_user(self.user)}"}
+
+    async def post(self, data, headers=None, generate=None):
+        generate = generate or mock.AsyncMock(return_value="Plants need light.")
+        with mock.patch('edugen_tutor_model.views.agenerate_response_with_retrieval', generate):
+            return await self.async_client.post(
+                self.url,
+                data,
+                content_type='application/json',
+                headers=self.headers if headers is None else headers
+            )
+
+    async def test_authenticated_prompt_is_answered_and_saved(self):
+        response = await self.post({'prompt': 'What do plants need?'})
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['response'], "Plants need light.")
+        chat = await Chat.objects.aget(id=body['id'])
+        self.assertEqual((chat.user_id, chat.prompt), (self.user.id, 'What do plants need?'))
+
+    async def test_missing_or_invalid_token_is_rejected(self):
+        for headers in ({}, {'Authorization': 'Bearer not-a-token'}):
+            response = await self.post({'prompt': 'What do plants need?'}, headers=headers)
+            self.assertEqual(response.status_code, 401)
+        self.assertFalse(await Chat.objects.aexists())
+
+    async def test_malformed_json_is_rejected(self):
+        response = await self.post('{"prompt": ')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Request body must be valid JSON'})
+
+    async def test_missing_prompt_and_unknown_topic_are_rejected(self):
+        response = await self.post({})
+        self.assertEqual(response.status_code, 400)
+
+        self.url = reverse('chat-async', args=[self.topic.id + 1])
+        response = await self.post({'prompt': 'What do plants need?'})
+        self.assertEqual(response.status_code, 404)
+
+    async def test_generation_error_is_reported(self):
+        generate = mock.AsyncMock(side_effect=RuntimeError('model overloaded'))
+        with self.assertLogs('edugen_tutor_model.views', 'ERROR'):
+            response = await self.post({'prompt': 'What do plants need?'}, generate=generate)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Error generating response: model overloaded'})
+        self.assertFalse(await Chat.objects.aexists())
+
+
+class StubTokenizer:
+    """
+    One token per character, padded to the longest text in the batch
+    """
+
+    def encode_batch(self, texts):
+        length = max(len(text) for text in texts)
+        return [
+            SimpleNamespace(
+                ids=[ord(char) for char in text] + [0] * (length - len(text)),
+                attention_mask=[1] * len(text) + [0] * (length - len(text)),
+                type_ids=[0] * length,
+            )
+            for text in texts
+        ]
+
+
+class StubSession:
+    """
+    Token embeddings derived from the token ids, recording the inputs of every run
+    """
+
+    def __init__(self):
+        self.runs = []
+
+    def run(self, output_names, feed):
+        self.runs.append(feed)
+        ids = feed['input_ids'].astype('float32')
+        return [np.stack([ids, ids % 7, np.ones_like(ids)], axis=-1)]
+
+
+class OnnxEncoderTests(SimpleTestCase):
+    def encoder(self, normalize=True):
+        encoder = OnnxEncoder.__new__(OnnxEncoder)
+        encoder.config = {'dimension': 3, 'normalize': normalize}
+        encoder.tokenizer = StubTokenizer()
+        encoder.session = StubSession()
+        encoder._input_names = {'input_ids', 'attention_mask'}
+        return encoder
+
+    def test_mean_pool_ignores_padding(self):
+        token_embeddings = np.array([[[1, 2], [3, 4], [100, 100]], [[5, 6], [0, 0], [0, 0]]], dtype='float32')
+        attention_mask = np.array([[1, 1, 0], [1, 0, 0]])
+        np.testing.assert_allclose(mean_pool(token_embeddings, attention_mask), [[2, 3], [5, 6]])
+
+    def test_normalization_and_agreement(self):
+        embeddings = np.array([[3, 4], [0, 0]], dtype='float32')
+        np.testing.assert_allclose(l2_normalize(embeddings), [[0.6, 0.8], [0, 0]])
+        np.testing.assert_allclose(
+            cosine_agreement(np.array([[1, 0], [1, 0]]), np.array([[2, 0], [0, 3]])), [1, 0], atol=1e-7
+        )
+
+    def test_length_sorted_batches_return_rows_in_input_order(self):
+        texts = ["ccccc", "a", "eeeeeeee", "bbb", "dd"]
+        encoder = self.encoder()
+
+        embeddings = encoder.encode(texts, batch_size=2)
+
+        self.assertEqual(embeddings.shape, (5, 3))
+        self.assertEqual(embeddings.dtype, np.float32)
+        # Batches hold texts of similar length and only the inputs the graph declares
+        self.assertEqual([run['input_ids'].shape for run in encoder.session.runs], [(2, 2), (2, 5), (1, 8)])
+        self.assertEqual(set(encoder.session.runs[0]), {'input_ids', 'attention_mask'})
+        for text, embedding in zip(texts, embeddings):
+            np.testing.assert_allclose(embedding, self.encoder().encode(text), rtol=1e-6)
+        np.testing.assert_allclose(np.linalg.norm(embeddings, axis=1), 1, rtol=1e-6)
+
+    def test_unnormalized_output_is_the_mean_token_embedding(self):
+        embedding = self.encoder(normalize=False).encode(["ab"])[0]
+        np.testing.assert_allclose(embedding, [(97 + 98) / 2, (97 % 7 + 98 % 7) / 2, 1])
+        self.assertEqual(self.encoder().encode([]).shape, (0, 3))
@@ -1,5 +1,14 @@
 from django.urls import path
-from .views import SubjectListView, TopicListView, ChatHistoryView, ChatView, TopicDetailView
+from .views import (
+    SubjectListView,
+    TopicListView,
+    ChatHistoryView,
+    ChatView,
+    ChatStreamView,
+    AsyncChatView,
+    TopicDetailView,
+    CacheStatsView,
+)
 
 urlpatterns = [
     path('subjects/', SubjectListView.as_view(), name='subject-list'),
@@ -7,4 +16,7 @@ urlpatterns = [
     path('topics/detail/<int:topic_id>/', TopicDetailView.as_view(), name='topic-detail'),
     path('chat/<int:topic_id>/', ChatHistoryView.as_view(), name='chat-history'),
     path('chat/<int:topic_id>/post/', ChatView.as_view(), name='chat'),
+    path('chat/<int:topic_id>/stream/', ChatStreamView.as_view(), name='chat-stream'),
+    path('chat/<int:topic_id>/async/', AsyncChatView.as_view(), name='chat-async'),
+    path('cache-stats/', CacheStatsView.as_view(), name='cache-stats'),
 ]
\ No newline at end of file
@@ -1,11 +1,42 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
-from .models import Subject, Topic, Chat
-from django.shortcuts import get_object_or_404
-from .rag.combined_generator import generate_response_with_retrieval, generate_topic_overview
+from .models import Subject, Topic, Chat, CachedAnswer
+from .renderers import EventStreamRenderer, format_sse
+from django.db.models import Count, Sum
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, get_object_or_404
+from asgiref.sync import sync_to_async
+from edugen.async_views import AsyncAPIView
+from .answer_cache import embed_prompt, lookup_answer, store_answer, stats as answer_cache_stats
+from .overview_cache import aget_topic_overview, get_topic_overview, lookup_overview, store_overview
+from .rag.combined_generator import (
+    agenerate_response_with_retrieval,
+    generate_response_with_retrieval,
+    stream_response_with_retrieval,
+    stream_topic_overview,
+)
+from .rag.reranker import RERANK_ENABLED, get_reranker
+from .rag.retriever import get_retriever
 import os
 from django.conf import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def wants_answer_cache(request):
+    """
+    Whether a chat request may be answered from the semantic answer cache. useCache comes from the JSON body,
+    form data or query string; the strings "false", "0", "no" and "off" turn the cache off.
+    """
+    value = request.data.get('useCache', request.GET.get('useCache', True))
+    if isinstance(value, str):
+        value = value.strip().lower() not in ('false', '0', 'no', 'off')
+    return settings.ANSWER_CACHE_ENABLED and bool(value)
+
 
 class SubjectListView(APIView):
     def get(self, request):
@@ -60,18 +91,19 @@ class ChatView(APIView):
     def post(self, request, topic_id):
         try:
             user = request.user
-            topic = get_object_or_404(Topic, id=topic_id)
+            topic = get_object_or_404(Topic.objects.select_related('subject'), id=topic_id)
 
             # Log the incoming request data for debugging
             print("Received request data:", request.data)
 
             prompt = request.data.get('prompt', '')
             is_initial_overview = request.data.get('isInitialOverview', False)
+            # Clients can pass useCache=false to always get a freshly generated answer
+            use_cache = wants_answer_cache(request)
 
-            # Use default paths relative to your project
-            BASE_DIR = settings.BASE_DIR
-            faiss_index_path = os.path.join(BASE_DIR, 'edugen_tutor_model', 'rag_preprocessing', 'faiss_index')
-            corpus_path = os.path.join(BASE_DIR, 'edugen_tutor_model', 'rag_preprocessing', 'corpus.csv')
+            # The retriever for these paths is loaded once per worker and kept resident
+            faiss_index_path = settings.RAG_INDEX_PATH
+            corpus_path = settings.RAG_CORPUS_PATH
 
             # Check if files exist
             if not os.path.exists(faiss_index_path) or not os.path.exists(corpus_path):
@@ -88,15 +120,24 @@ class ChatView(APIView):
 
             try:
                 if is_initial_overview:
-                    response = generate_topic_overview(topic.name, faiss_index_path, corpus_path)
+                    response = get_topic_overview(topic, faiss_index_path, corpus_path)
                     prompt = f"Hi, this is my first lesson and I'm super excited to be here, Give me an overview of {topic.name}"
                 else:
-                    response = generate_response_with_retrieval(
-                        prompt,
-                        faiss_index_path,
-                        corpus_path,
-                        topic_name=topic.name
-                    )
+                    response = None
+                    if use_cache:
+                        prompt_embedding = embed_prompt(prompt, faiss_index_path, corpus_path)
+                        response = lookup_answer(topic, prompt_embedding)
+
+                    if response is None:
+                        response = generate_response_with_retrieval(
+                            prompt,
+                            faiss_index_path,
+                            corpus_path,
+                            topic_name=topic.name,
+                            subject_name=topic.subject.name
+                        )
+                        if use_cache:
+                            store_answer(topic, prompt, prompt_embedding, response)
 
                 # Save chat history
                 chat = Chat.objects.create(
@@ -126,6 +167,164 @@ class ChatView(APIView):
             }, status=HTTP_400_BAD_REQUEST)
 
 
+class ChatStreamView(APIView):
+    """
+    Streaming variant of ChatView that sends the response as server-sent events while it is generated.
+    Emits `token` events as text arrives, then a `done` event with the saved chat, or an `error` event.
+    """
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+
+    def post(self, request, topic_id):
+        user = request.user
+        topic = get_object_or_404(Topic.objects.select_related('subject'), id=topic_id)
+
+        prompt = request.data.get('prompt', '')
+        is_initial_overview = request.data.get('isInitialOverview', False)
+        use_cache = wants_answer_cache(request)
+
+        faiss_index_path = settings.RAG_INDEX_PATH
+        corpus_path = settings.RAG_CORPUS_PATH
+
+        if not os.path.exists(faiss_index_path) or not os.path.exists(corpus_path):
+            return Response({
+                'error': 'Required model files not found. Please check server configuration.'
+            }, status=HTTP_400_BAD_REQUEST)
+
+        if not prompt and not is_initial_overview:
+            return Response({
+                'error': 'Prompt is required for non-overview messages.'
+            }, status=HTTP_400_BAD_REQUEST)
+
+        cached_response = None
+        prompt_embedding = None
+        if is_initial_overview:
+            cached_response = lookup_overview(topic, faiss_index_path, corpus_path)
+            if cached_response is None:
+                tokens = stream_topic_overview(
+                    topic.name, faiss_index_path, corpus_path, subject_name=topic.subject.name
+                )
+            prompt = f"Hi, this is my first lesson and I'm super excited to be here, Give me an overview of {topic.name}"
+        else:
+            if use_cache:
+                prompt_embedding = embed_prompt(prompt, faiss_index_path, corpus_path)
+                cached_response = lookup_answer(topic, prompt_embedding)
+            if cached_response is None:
+                tokens = stream_response_with_retrieval(
+                    prompt, faiss_index_path, corpus_path, topic_name=topic.name, subject_name=topic.subject.name
+                )
+
+        if cached_response is not None:
+            tokens = iter([cached_response])
+
+        def event_stream():
+            parts = []
+            try:
+                for token in tokens:
+                    parts.append(token)
+                    yield format_sse('token', {'token': token})
+            except Exception as e:
+                logger.exception(f"Error streaming response for topic {topic.id}: {str(e)}")
+                yield format_sse('error', {'error': f'Error generating response: {str(e)}'})
+                return
+
+            # Save chat history once the full response has been generated
+            response = "".join(parts)
+            if cached_response is None:
+                if is_initial_overview:
+                    store_overview(topic, faiss_index_path, corpus_path, response)
+                elif prompt_embedding is not None:
+                    store_answer(topic, prompt, prompt_embedding, response)
+            chat = Chat.objects.create(
+                user=user,
+                topic=topic,
+                prompt=prompt,
+                response=response
+            )
+            yield format_sse('done', {
+                'id': chat.id,
+                'prompt': prompt,
+                'response': response,
+                'timestamp': chat.timestamp.isoformat()
+            })
+
+        streaming_response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+        streaming_response['Cache-Control'] = 'no-cache'
+        # Stop nginx from buffering the stream
+        streaming_response['X-Accel-Buffering'] = 'no'
+        return streaming_response
+
+
+class AsyncChatView(AsyncAPIView):
+    """
+    Async variant of ChatView for ASGI deployments; the worker is free while the LLM call is awaited
+    """
+    async def post(self, request, topic_id):
+        try:
+            topic = await aget_object_or_404(Topic.objects.select_related('subject'), id=topic_id)
+        except Http404:
+            return JsonResponse({'error': 'Topic not found'}, status=404)
+
+        prompt = request.data.get('prompt', '')
+        is_initial_overview = request.data.get('isInitialOverview', False)
+        use_cache = wants_answer_cache(request)
+
+        faiss_index_path = settings.RAG_INDEX_PATH
+        corpus_path = settings.RAG_CORPUS_PATH
+
+        if not os.path.exists(faiss_index_path) or not os.path.exists(corpus_path):
+            return JsonResponse({
+                'error': 'Required model files not found. Please check server configuration.'
+            }, status=HTTP_400_BAD_REQUEST)
+
+        if not prompt and not is_initial_overview:
+            return JsonResponse({
+                'error': 'Prompt is required for non-overview messages.'
+            }, status=HTTP_400_BAD_REQUEST)
+
+        try:
+            if is_initial_overview:
+                response = await aget_topic_overview(topic, faiss_index_path, corpus_path)
+                prompt = f"Hi, this is my first lesson and I'm super excited to be here, Give me an overview of {topic.name}"
+            else:
+                response = None
+                if use_cache:
+                    prompt_embedding = await sync_to_async(embed_prompt, thread_sensitive=False)(
+                        prompt, faiss_index_path, corpus_path
+                    )
+                    response = await sync_to_async(lookup_answer)(topic, prompt_embedding)
+
+                if response is None:
+                    response = await agenerate_response_with_retrieval(
+                        prompt,
+                        faiss_index_path,
+                        corpus_path,
+                        topic_name=topic.name,
+                        subject_name=topic.subject.name
+                    )
+                    if use_cache:
+                        await sync_to_async(store_answer)(topic, prompt, prompt_embedding, response)
+
+            chat = await Chat.objects.acreate(
+                user=request.user,
+                topic=topic,
+                prompt=prompt,
+                response=response
+            )
+
+            return JsonResponse({
+                'id': chat.id,
+                'prompt': prompt,
+                'response': response,
+                'timestamp': chat.timestamp.isoformat()
+            }, status=HTTP_200_OK)
+
+        except Exception as e:
+            logger.exception(f"Error generating response for topic {topic.id}: {str(e)}")
+            return JsonResponse({
+                'error': f'Error generating response: {str(e)}'
+            }, status=HTTP_400_BAD_REQUEST)
+
+
 class ChatHistoryView(APIView):
     def get(self, request, topic_id):
         user = request.user
@@ -156,4 +355,23 @@ class TopicDetailView(APIView):
             'is_active': topic.is_active,
             'order': topic.order
         }
-        return Response(topic_data, status=HTTP_200_OK)
\ No newline at end of file
+        return Response(topic_data, status=HTTP_200_OK)
+
+
+class CacheStatsView(APIView):
+    """
+    Staff-only view of the tutor caches and reranker: this worker's counters and the stored entries
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        stored = CachedAnswer.objects.aggregate(entries=Count('id'), hits=Sum('hit_count'))
+        return Response({
+            'answer_cache': {
+                'worker': answer_cache_stats.as_dict(),
+                'entries': stored['entries'],
+                'total_hits': stored['hits'] or 0,
+            },
+            'retriever': get_retriever(settings.RAG_INDEX_PATH, settings.RAG_CORPUS_PATH).cache_stats(),
+            'reranker': get_reranker().as_dict() if RERANK_ENABLED else None,
+        }, status=HTTP_200_OK)
@@ -1,3 +1,94 @@
+from datetime import timedelta
+from decimal import Decimal
+
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from assessments.models import Assessment, AssessmentSummary
+from assessments.progress import rebuild_user_progress
+from edugen_tutor_model.models import Subject, Topic
+from .models import CustomUser
+
+
+class UserProfileViewTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email='student@example.com',
+            password='password',
+            first_name='Test',
+            last_name='Student',
+            is_active=True
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_attempted_topic(self, subject, name, assessment_count=7):
+        topic = Topic.objects.create(subject=subject, name=name)
+        now = timezone.now()
+        for i in range(assessment_count):
+            assessment = Assessment.objects.create(
+                topic=topic,
+                user=self.user,
+                status='completed',
+                total_score=Decimal(i * 10),
+            )
+            Assessment.objects.filter(id=assessment.id).update(end_time=now - timedelta(days=assessment_count - i))
+        AssessmentSummary.objects.create(
+            user=self.user,
+            topic=topic,
+            total_attempts=assessment_count,
+            best_score=Decimal(60),
+            last_score=Decimal(60),
+            last_attempt_date=now,
+            average_score=Decimal(30),
+        )
+        return topic
+
+    def get_profile(self):
+        return self.client.get(reverse('user-profile'))
+
+    def test_query_count_does_not_grow_with_topics(self):
+        subject = Subject.objects.create(name='Science')
+        self.create_attempted_topic(subject, 'Plants')
+        rebuild_user_progress(self.user)
+
+        with self.assertNumQueries(2):
+            response = self.get_profile()
+        self.assertEqual(response.status_code, 200)
+
+        for i in range(5):
+            self.create_attempted_topic(subject, f'Topic {i}')
+        Topic.objects.create(subject=subject, name='Unattempted')
+        rebuild_user_progress(self.user)
+
+        with self.assertNumQueries(2):
+            response = self.get_profile()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['topic_performance']), 6)
+        self.assertEqual(len(response.data['unattempted_topics']), 1)
+
+    def test_progress_is_built_on_first_profile_load(self):
+        subject = Subject.objects.create(name='Science')
+        self.create_attempted_topic(subject, 'Plants')
+
+        response = self.get_profile()
+
+        self.assertEqual(response.data['overall_stats'], {'total_assessments': 1, 'average_score': 30.0})
+        with self.assertNumQueries(2):
+            self.get_profile()
+
+    def test_recent_assessments_are_latest_five_per_topic(self):
+        subject = Subject.objects.create(name='Science')
+        self.create_attempted_topic(subject, 'Plants')
+        self.create_attempted_topic(subject, 'Animals', assessment_count=2)
+
+        response = self.get_profile()
 
-# Create your tests here.
+        recent = {
+            performance['topic_name']: [assessment['score'] for assessment in performance['recent_assessments']]
+            for performance in response.data['topic_performance']
+        }
+        self.assertEqual(recent['Plants'], [60.0, 50.0, 40.0, 30.0, 20.0])
+        self.assertEqual(recent['Animals'], [10.0, 0.0])
@@ -7,9 +7,9 @@ from .serializers import UserRegistrationSerializer
 from .utils import send_verification_email
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from assessments.models import Assessment, AssessmentSummary
+from assessments.models import UserProgress
+from assessments.progress import rebuild_user_progress
 from edugen_tutor_model.models import Topic
-from django.db.models import Count, Avg
 from .serializers import UserProfileSerializer, UserProfileUpdateSerializer
 import logging
 from rest_framework.parsers import MultiPartParser, FormParser
@@ -185,53 +185,42 @@ class UserProfileView(APIView):
     def get(self, request):
         user = request.user
 
-        # Get assessment summaries
-        topic_summaries = AssessmentSummary.objects.filter(user=user)
+        # Dashboard figures are maintained as assessments complete; build them once for older accounts
+        progress = UserProgress.objects.filter(user=user).first()
+        if progress is None:
+            progress = rebuild_user_progress(user)
 
-        # Calculate overall statistics
-        overall_stats = topic_summaries.aggregate(
-            total_assessments=Count('total_attempts'),
-            average_score=Avg('average_score')
-        )
+        topics = Topic.objects.values('id', 'name', 'subject__name')
 
-        # Get topic-wise performance
+        # Get topic-wise performance, most recently attempted first
         topic_performance = []
-        for summary in topic_summaries:
-            recent_assessments = Assessment.objects.filter(
-                user=user,
-                topic=summary.topic,
-                status='completed'
-            ).order_by('-end_time')[:5]
+        unattempted_topics = []
+        for topic in topics:
+            if not progress.has_attempted(topic['id']):
+                unattempted_topics.append(topic)
+                continue
 
+            stats = progress.topic_stats[str(topic['id'])]
             topic_performance.append({
-                'topic_id': summary.topic.id,
-                'topic_name': summary.topic.name,
-                'subject_name': summary.topic.subject.name,
-                'total_attempts': summary.total_attempts,
-                'best_score': float(summary.best_score),
-                'average_score': float(summary.average_score),
-                'last_attempt_date': summary.last_attempt_date,
-                'recent_assessments': [{
-                    'id': assessment.id,
-                    'score': float(assessment.total_score),
-                    'date': assessment.end_time
-                } for assessment in recent_assessments]
+                'topic_id': topic['id'],
+                'topic_name': topic['name'],
+                'subject_name': topic['subject__name'],
+                'total_attempts': stats['total_attempts'],
+                'best_score': stats['best_score'],
+                'average_score': stats['average_score'],
+                'last_attempt_date': stats['last_attempt_date'],
+                'recent_assessments': stats['recent_assessments']
             })
-
-        # Get topics with no attempts
-        attempted_topic_ids = topic_summaries.values_list('topic__id', flat=True)
-        unattempted_topics = Topic.objects.exclude(
-            id__in=attempted_topic_ids
-        ).values('id', 'name', 'subject__name')
+        topic_performance.sort(key=lambda performance: performance['last_attempt_date'], reverse=True)
 
         response_data = {
             'user': UserProfileSerializer(user).data,
             'overall_stats': {
-                'total_assessments': overall_stats['total_assessments'] or 0,
-                'average_score': float(overall_stats['average_score'] or 0),
+                'total_assessments': progress.topics_attempted,
+                'average_score': float(progress.average_score),
             },
             'topic_performance': topic_performance,
-            'unattempted_topics': list(unattempted_topics)
+            'unattempted_topics': unattempted_topics
         }
 
         return Response(response_data)